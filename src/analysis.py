@@ -0,0 +1,572 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Per-level, per-step and reaction prompt summaries of many logs at once.
+
+From the command-line, this reads per-frame logs (CSV, or binary written with
+``--log-format binary``) and reaction prompt logs, and saves the summaries as CSV::
+
+    python analysis.py --level-summary levels.csv --step-summary steps.csv
+        --reaction-summary reactions.csv logs/*_log.csv logs/*_reactlog.csv
+
+Each log is read in chunks of rows into NumPy arrays, converting only the columns the
+summaries use, and the summaries are computed with array operations on each chunk.
+The logs are summarized in parallel by a pool of worker processes, one log at a time
+per process. Columns are found by name and converted following the column types in
+logger, so logs saved by older versions without some columns can be summarized too.
+
+Requires NumPy.
+"""
+
+import argparse
+import collections
+import csv
+import functools
+import glob
+import itertools
+import math
+import multiprocessing
+import re
+
+import numpy
+
+import binarylog
+from logger import BINARY_LOG_MAGIC, BINARY_LOG_MISSING, asteroid_log_column_type, csv_escape
+
+# rows of each log converted to arrays at a time
+CHUNK_ROWS = 65536
+
+# per-frame log columns used by the level and step summaries. asteroid_N_* columns are
+# used too, for as many asteroids as the log has
+FRAME_COLUMNS = [
+    'subject_number', 'subject_run', 'total_millis', 'step_number', 'level_millis',
+    'level_name', 'level_attempt', 'level_state', 'targets_collected', 'active_powerup',
+    'cursor_x', 'cursor_y',
+    ]
+
+# reaction prompt log columns used by the reaction prompt summary
+REACTION_COLUMNS = [
+    'subject_number', 'subject_run', 'step_number',
+    'reaction_prompt_sound', 'reaction_prompt_image', 'reaction_prompt_state',
+    'reaction_prompt_millis', 'reaction_prompt_onset_millis', 'reaction_prompt_response_millis',
+    ]
+
+ASTEROID_COLUMN_PATTERN = re.compile(r'^asteroid_(\d+)_(centerx|centery|diameter)$')
+
+# histogram bin edges in game units for distances from the cursor center to the edge
+# of the nearest asteroid. Distance percentiles are accurate to the bin width
+DISTANCE_BIN_WIDTH = 4
+DISTANCE_BIN_EDGES = numpy.arange(-256, 1600 + DISTANCE_BIN_WIDTH, DISTANCE_BIN_WIDTH)
+DISTANCE_PERCENTILES = [5, 25, 50]
+
+
+class StringTable(object):
+    """Numbers each distinct string value of a log, so string columns can be arrays"""
+    def __init__(self):
+        self.strings = ['']
+        self.indices = {'': 0}
+
+    def code(self, value):
+        """Returns the number for string value"""
+        index = self.indices.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.indices[value] = index
+            self.strings.append(value)
+        return index
+
+    def codes(self, values):
+        """Returns int32 array of the numbers of string values"""
+        return numpy.array([self.code(value) for value in values], dtype='int32')
+
+    def matches(self, codes, *values):
+        """Returns bool array of which codes are the number of one of values"""
+        return numpy.isin(codes, [self.indices[v] for v in values if v in self.indices])
+
+
+def is_numeric_column(column):
+    """Returns whether column holds numbers, following the binary log column types"""
+    return asteroid_log_column_type(column) != 'string'
+
+
+def numeric_array(values):
+    """Returns float64 array of CSV cells values, with NaN for blank or unreadable cells"""
+    cells = [value if value else 'nan' for value in values]
+    try:
+        return numpy.array(cells, dtype='float64')
+    except ValueError:
+        result = numpy.empty(len(cells))
+        for i, cell in enumerate(cells):
+            try:
+                result[i] = float(cell)
+            except ValueError:
+                result[i] = numpy.nan
+        return result
+
+
+def csv_chunks(filename, columns, strings, chunk_rows):
+    """
+    Yields a dictionary of arrays for each chunk of rows of CSV log filename.
+
+    Numeric columns are float64 arrays with NaN for missing values, other columns are
+    arrays of strings numbers in strings. Columns that aren't in the log are all missing.
+    """
+    with open(filename, 'r') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        index = {name: i for i, name in enumerate(header)}
+        while True:
+            # a log the game didn't close may end in a partly written row
+            rows = [row for row in itertools.islice(reader, chunk_rows) if len(row) == len(header)]
+            if not rows:
+                return
+            chunk = {}
+            for column in columns:
+                i = index.get(column)
+                if i is None:
+                    values = [''] * len(rows)
+                else:
+                    values = [row[i] for row in rows]
+                if is_numeric_column(column):
+                    chunk[column] = numeric_array(values)
+                else:
+                    chunk[column] = strings.codes(values)
+            yield chunk
+
+
+def binary_chunks(filename, columns, strings, chunk_rows):
+    """Yields a dictionary of arrays for each chunk of rows of binary log filename, like csv_chunks()"""
+    header, records, log_strings = binarylog.load(filename)
+    column_types = {c['name']: c['type'] for c in header['columns']}
+    # string table indices to strings numbers. Index -1 for missing values selects the last
+    string_codes = numpy.array([strings.code(s) for s in log_strings] + [strings.code('')], dtype='int32')
+    for start in range(0, len(records), chunk_rows):
+        chunk_records = records[start:start + chunk_rows]
+        chunk = {}
+        for column in columns:
+            column_type = column_types.get(column)
+            if column_type is None:
+                if is_numeric_column(column):
+                    chunk[column] = numpy.full(len(chunk_records), numpy.nan)
+                else:
+                    chunk[column] = numpy.zeros(len(chunk_records), dtype='int32')
+            elif column_type == 'string':
+                chunk[column] = string_codes[chunk_records[column]]
+            else:
+                values = chunk_records[column].astype('float64')
+                if column_type != 'float64':
+                    values[chunk_records[column] == BINARY_LOG_MISSING[column_type]] = numpy.nan
+                chunk[column] = values
+        yield chunk
+
+
+def log_columns(filename):
+    """Returns (is_binary, column names) of log filename"""
+    with open(filename, 'rb') as f:
+        is_binary = f.read(len(BINARY_LOG_MAGIC)) == BINARY_LOG_MAGIC
+    if is_binary:
+        return True, [c['name'] for c in binarylog.read_header(filename)['columns']]
+    with open(filename, 'r') as f:
+        return False, next(csv.reader(f), [])
+
+
+def read_chunks(filename, columns, strings, chunk_rows=CHUNK_ROWS):
+    """Yields a dictionary of arrays for each chunk of rows of CSV or binary log filename"""
+    is_binary, _ = log_columns(filename)
+    if is_binary:
+        return binary_chunks(filename, columns, strings, chunk_rows)
+    return csv_chunks(filename, columns, strings, chunk_rows)
+
+
+def asteroid_numbers(columns):
+    """Returns sorted asteroid numbers N with all asteroid_N_* columns in columns"""
+    found = collections.defaultdict(set)
+    for column in columns:
+        match = ASTEROID_COLUMN_PATTERN.match(column)
+        if match:
+            found[int(match.group(1))].add(match.group(2))
+    return sorted([n for n, fields in found.items() if len(fields) == 3])
+
+
+def nearest_asteroid_distance(chunk, numbers):
+    """Returns distance from the cursor center to the edge of the nearest asteroid on each row"""
+    if not numbers:
+        return numpy.full(len(chunk['cursor_x']), numpy.nan)
+    centerx = numpy.column_stack([chunk['asteroid_%d_centerx' % n] for n in numbers])
+    centery = numpy.column_stack([chunk['asteroid_%d_centery' % n] for n in numbers])
+    diameter = numpy.column_stack([chunk['asteroid_%d_diameter' % n] for n in numbers])
+    distance = numpy.hypot(centerx - chunk['cursor_x'][:, None], centery - chunk['cursor_y'][:, None])
+    # fmin skips asteroids missing from a row, and is NaN when all are missing
+    return numpy.fmin.reduce(distance - diameter * 0.5, axis=1)
+
+
+def group_max(values, groups, group_count, initial):
+    """Returns maximum of values in each group, ignoring NaN, or initial for none"""
+    result = numpy.full(group_count, initial, dtype='float64')
+    keep = ~numpy.isnan(values)
+    numpy.maximum.at(result, groups[keep], values[keep])
+    return result
+
+
+def group_min(values, groups, group_count, initial):
+    """Returns minimum of values in each group, ignoring NaN, or initial for none"""
+    result = numpy.full(group_count, initial, dtype='float64')
+    keep = ~numpy.isnan(values)
+    numpy.minimum.at(result, groups[keep], values[keep])
+    return result
+
+
+def new_attempt():
+    """Returns totals for one attempt at a level, before any frames are added"""
+    return {
+        'frames': 0,
+        'playing_millis': 0.0,
+        'completion_millis': None,
+        'died': False,
+        'targets_collected': 0.0,
+        'distance_count': 0,
+        'distance_sum': 0.0,
+        'distance_min': float('inf'),
+        'distance_histogram': numpy.zeros(len(DISTANCE_BIN_EDGES) + 1, dtype='int64'),
+        'powerups': collections.Counter(),
+        'powerup_millis': collections.Counter(),
+        }
+
+
+def summarize_frame_log(filename, columns, chunk_rows):
+    """Returns OrderedDict of totals for each attempt at each level in per-frame log filename"""
+    numbers = asteroid_numbers(columns)
+    chunk_columns = FRAME_COLUMNS + ['asteroid_%d_%s' % (n, field)
+                                     for n in numbers for field in ('centerx', 'centery', 'diameter')]
+    strings = StringTable()
+    attempts = collections.OrderedDict()
+    previous_total_millis = numpy.nan
+    previous_powerup = strings.code('')
+    bin_count = len(DISTANCE_BIN_EDGES) + 1
+
+    for chunk in read_chunks(filename, chunk_columns, strings, chunk_rows):
+        # milliseconds since the previous frame, which are counted towards this frame's state
+        total_millis = chunk['total_millis']
+        frame_millis = numpy.diff(total_millis, prepend=previous_total_millis)
+        frame_millis[numpy.isnan(frame_millis) | (frame_millis < 0)] = 0
+        previous_total_millis = total_millis[-1]
+        active_powerup = chunk['active_powerup']
+        powerup_started = active_powerup != numpy.concatenate(([previous_powerup], active_powerup[:-1]))
+        previous_powerup = active_powerup[-1]
+        distance = nearest_asteroid_distance(chunk, numbers)
+
+        in_level = chunk['level_name'] != strings.code('')
+        if not in_level.any():
+            continue
+        keys = numpy.column_stack([
+            chunk['subject_number'], chunk['subject_run'], chunk['step_number'],
+            chunk['level_name'], chunk['level_attempt']])[in_level]
+        keys[numpy.isnan(keys)] = -1
+        unique_keys, groups = numpy.unique(keys, axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+        group_count = len(unique_keys)
+
+        level_state = chunk['level_state'][in_level]
+        level_millis = chunk['level_millis'][in_level]
+        frames = numpy.bincount(groups, minlength=group_count)
+        playing_millis = group_max(level_millis, groups, group_count, 0.0)
+        completed = strings.matches(level_state, 'completed')
+        completion_millis = group_min(
+            numpy.where(completed, level_millis, numpy.nan), groups, group_count, numpy.inf)
+        deaths = numpy.bincount(groups, weights=strings.matches(level_state, 'dead'), minlength=group_count)
+        targets_collected = group_max(chunk['targets_collected'][in_level], groups, group_count, 0.0)
+
+        # distances while playing, with each row's histogram bin numbered within its group
+        distance = numpy.where(strings.matches(level_state, 'playing'), distance[in_level], numpy.nan)
+        measured = ~numpy.isnan(distance)
+        distance_count = numpy.bincount(groups[measured], minlength=group_count)
+        distance_sum = numpy.bincount(groups[measured], weights=distance[measured], minlength=group_count)
+        distance_min = group_min(distance, groups, group_count, float('inf'))
+        bins = groups[measured] * bin_count + numpy.searchsorted(
+            DISTANCE_BIN_EDGES, distance[measured], side='right')
+        distance_histograms = numpy.bincount(bins, minlength=group_count * bin_count).reshape(
+            group_count, bin_count)
+
+        # time with each power-up active, and how many times each was activated
+        active_powerup = active_powerup[in_level]
+        powerup_started = powerup_started[in_level]
+        frame_millis = frame_millis[in_level]
+        powerup_counts = {}
+        for code in numpy.unique(active_powerup):
+            powerup = strings.strings[code]
+            if powerup in ('', 'none'):
+                continue
+            active = active_powerup == code
+            powerup_counts[powerup] = (
+                numpy.bincount(groups[active & powerup_started], minlength=group_count),
+                numpy.bincount(groups[active], weights=frame_millis[active], minlength=group_count))
+
+        for g, key in enumerate(unique_keys):
+            subject_number, subject_run, step_number, level_name, level_attempt = key
+            attempt_key = (strings.strings[int(subject_number)], strings.strings[int(subject_run)],
+                           int(step_number), strings.strings[int(level_name)], int(level_attempt))
+            attempt = attempts.get(attempt_key)
+            if attempt is None:
+                attempt = attempts[attempt_key] = new_attempt()
+            attempt['frames'] += int(frames[g])
+            attempt['playing_millis'] = max(attempt['playing_millis'], playing_millis[g])
+            if completion_millis[g] != numpy.inf and attempt['completion_millis'] is None:
+                attempt['completion_millis'] = completion_millis[g]
+            attempt['died'] = attempt['died'] or deaths[g] > 0
+            attempt['targets_collected'] = max(attempt['targets_collected'], targets_collected[g])
+            attempt['distance_count'] += int(distance_count[g])
+            attempt['distance_sum'] += distance_sum[g]
+            attempt['distance_min'] = min(attempt['distance_min'], distance_min[g])
+            attempt['distance_histogram'] += distance_histograms[g]
+            for powerup, (counts, millis) in powerup_counts.items():
+                if counts[g] or millis[g]:
+                    attempt['powerups'][powerup] += int(counts[g])
+                    attempt['powerup_millis'][powerup] += millis[g]
+    return attempts
+
+
+def summarize_reaction_log(filename, chunk_rows):
+    """
+    Returns OrderedDict of the reaction prompts in reaction log filename for each
+    subject, run, step, prompt sound and prompt image.
+    """
+    strings = StringTable()
+    prompts = collections.OrderedDict()
+    for chunk in read_chunks(filename, REACTION_COLUMNS, strings, chunk_rows):
+        state = chunk['reaction_prompt_state']
+        keys = numpy.column_stack([
+            chunk['subject_number'], chunk['subject_run'], chunk['step_number'],
+            chunk['reaction_prompt_sound'], chunk['reaction_prompt_image']])
+        keys[numpy.isnan(keys)] = -1
+        unique_keys, groups = numpy.unique(keys, axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+        passed = strings.matches(state, 'complete')
+        failed = strings.matches(state, 'failed')
+        timeout = strings.matches(state, 'timeout', 'timeout_step_end')
+        response_millis = chunk['reaction_prompt_response_millis'] - chunk['reaction_prompt_onset_millis']
+        for g, key in enumerate(unique_keys):
+            subject_number, subject_run, step_number, sound, image = key
+            prompt_key = (strings.strings[int(subject_number)], strings.strings[int(subject_run)],
+                          int(step_number), strings.strings[int(sound)], strings.strings[int(image)])
+            prompt = prompts.get(prompt_key)
+            if prompt is None:
+                prompt = prompts[prompt_key] = {
+                    'prompts': 0, 'passed': 0, 'failed': 0, 'timeouts': 0,
+                    'reaction_millis': [], 'response_millis': []}
+            rows = groups == g
+            prompt['prompts'] += int(rows.sum())
+            prompt['passed'] += int((rows & passed).sum())
+            prompt['failed'] += int((rows & failed).sum())
+            prompt['timeouts'] += int((rows & timeout).sum())
+            prompt['reaction_millis'].append(chunk['reaction_prompt_millis'][rows & passed])
+            prompt['response_millis'].append(response_millis[rows & passed])
+    return prompts
+
+
+def summarize_file(filename, chunk_rows=CHUNK_ROWS):
+    """
+    Returns (kind, summary) for per-frame or reaction log filename.
+
+    kind is 'frame' with the totals of summarize_frame_log(), 'reaction' with the prompts
+    of summarize_reaction_log(), or None for other files, such as survey logs.
+    """
+    try:
+        _, columns = log_columns(filename)
+        if 'level_state' in columns and 'cursor_x' in columns:
+            return 'frame', summarize_frame_log(filename, columns, chunk_rows)
+        if 'reaction_prompt_state' in columns:
+            return 'reaction', summarize_reaction_log(filename, chunk_rows)
+        print('Skipping "%s", which is not a per-frame or reaction prompt log' % filename)
+    except (IOError, ValueError) as e:
+        print('Skipping "%s" after error reading it: %s' % (filename, e))
+    return None, None
+
+
+def summarize_files(filenames, processes=None, chunk_rows=CHUNK_ROWS):
+    """
+    Returns list of summarize_file() results for each of filenames.
+
+    The files are summarized in parallel by processes worker processes, or one per CPU
+    when processes is None.
+    """
+    summarize = functools.partial(summarize_file, chunk_rows=chunk_rows)
+    if processes == 1 or len(filenames) <= 1:
+        return [summarize(filename) for filename in filenames]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(summarize, filenames, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def histogram_percentile(histogram, percentile):
+    """Returns approximate percentile of the distances counted in a distance histogram"""
+    total = histogram.sum()
+    if total == 0:
+        return None
+    cumulative = numpy.cumsum(histogram)
+    target = total * percentile / 100.
+    i = int(numpy.searchsorted(cumulative, target))
+    # bin i holds distances from DISTANCE_BIN_EDGES[i-1] up to DISTANCE_BIN_EDGES[i]
+    if i == 0:
+        return float(DISTANCE_BIN_EDGES[0])
+    if i >= len(DISTANCE_BIN_EDGES):
+        return float(DISTANCE_BIN_EDGES[-1])
+    before = cumulative[i - 1]
+    fraction = (target - before) / float(histogram[i])
+    return float(DISTANCE_BIN_EDGES[i - 1] + fraction * DISTANCE_BIN_WIDTH)
+
+
+def merged_totals(attempts, powerups):
+    """Returns summary columns shared by level and step summaries for the totals of attempts"""
+    playing_millis = sum([a['playing_millis'] for a in attempts])
+    targets_collected = sum([a['targets_collected'] for a in attempts])
+    distance_count = sum([a['distance_count'] for a in attempts])
+    histogram = sum([a['distance_histogram'] for a in attempts])
+    row = collections.OrderedDict()
+    row['attempts'] = len(attempts)
+    row['deaths'] = sum([1 for a in attempts if a['died']])
+    row['playing_millis'] = playing_millis
+    row['targets_collected'] = targets_collected
+    row['targets_per_minute'] = targets_collected * 60000. / playing_millis if playing_millis > 0 else None
+    row['nearest_asteroid_mean'] = (
+        sum([a['distance_sum'] for a in attempts]) / distance_count if distance_count else None)
+    row['nearest_asteroid_min'] = (
+        min([a['distance_min'] for a in attempts]) if distance_count else None)
+    for percentile in DISTANCE_PERCENTILES:
+        row['nearest_asteroid_p%02d' % percentile] = histogram_percentile(histogram, percentile)
+    for powerup in powerups:
+        row['%s_powerups' % powerup] = sum([a['powerups'][powerup] for a in attempts])
+        row['%s_powerup_millis' % powerup] = sum([a['powerup_millis'][powerup] for a in attempts])
+    return row
+
+
+def summary_rows(results):
+    """Returns (level_rows, step_rows, reaction_rows) for (filename, summarize_file() result) pairs"""
+    levels = collections.OrderedDict()
+    steps = collections.OrderedDict()
+    reactions = []
+    powerups = set()
+    for filename, (kind, summary) in results:
+        if kind == 'frame':
+            for (subject_number, subject_run, step_number, level_name, _), attempt in summary.items():
+                levels.setdefault((filename, subject_number, subject_run, step_number, level_name), []).append(attempt)
+                steps.setdefault((filename, subject_number, subject_run, step_number), []).append(
+                    (level_name, attempt))
+                powerups.update(attempt['powerups'].keys())
+        elif kind == 'reaction':
+            for key, prompt in summary.items():
+                reactions.append(((filename,) + key, prompt))
+    powerups = sorted(powerups)
+
+    level_rows = []
+    for (filename, subject_number, subject_run, step_number, level_name), attempts in levels.items():
+        row = collections.OrderedDict([
+            ('log_filename', filename), ('subject_number', subject_number),
+            ('subject_run', subject_run), ('step_number', step_number), ('level_name', level_name)])
+        completed = [a['completion_millis'] for a in attempts if a['completion_millis'] is not None]
+        row['completed'] = 'true' if completed else 'false'
+        row['completion_millis'] = completed[0] if completed else None
+        row.update(merged_totals(attempts, powerups))
+        level_rows.append(row)
+
+    step_rows = []
+    for (filename, subject_number, subject_run, step_number), level_attempts in steps.items():
+        attempts = [attempt for _, attempt in level_attempts]
+        completed = [a['completion_millis'] for a in attempts if a['completion_millis'] is not None]
+        row = collections.OrderedDict([
+            ('log_filename', filename), ('subject_number', subject_number),
+            ('subject_run', subject_run), ('step_number', step_number)])
+        row['levels_played'] = len(set([level_name for level_name, _ in level_attempts]))
+        row['levels_completed'] = len(completed)
+        row['mean_completion_millis'] = sum(completed) / len(completed) if completed else None
+        row.update(merged_totals(attempts, powerups))
+        step_rows.append(row)
+
+    reaction_rows = []
+    for (filename, subject_number, subject_run, step_number, sound, image), prompt in reactions:
+        row = collections.OrderedDict([
+            ('log_filename', filename), ('subject_number', subject_number),
+            ('subject_run', subject_run), ('step_number', step_number),
+            ('reaction_prompt_sound', sound), ('reaction_prompt_image', image)])
+        for key in ('prompts', 'passed', 'failed', 'timeouts'):
+            row[key] = prompt[key]
+        for key in ('reaction_millis', 'response_millis'):
+            values = numpy.concatenate(prompt[key])
+            values = values[~numpy.isnan(values)]
+            row[key + '_mean'] = float(values.mean()) if len(values) else None
+            row[key + '_median'] = float(numpy.median(values)) if len(values) else None
+            row[key + '_sd'] = float(values.std(ddof=1)) if len(values) > 1 else None
+        reaction_rows.append(row)
+    return level_rows, step_rows, reaction_rows
+
+
+def analyze(filenames, processes=None, chunk_rows=CHUNK_ROWS):
+    """
+    Returns (level_rows, step_rows, reaction_rows) summarizing the logs filenames.
+
+    Each row is an OrderedDict of summary column to value, with None for missing values.
+    """
+    results = summarize_files(filenames, processes, chunk_rows)
+    return summary_rows(zip(filenames, results))
+
+
+def format_value(value):
+    """Returns CSV cell text for summary value"""
+    if value is None:
+        return ''
+    if isinstance(value, (float, numpy.floating)):
+        if math.isnan(value) or math.isinf(value):
+            return ''
+        value = round(float(value), 3)
+        if value == int(value):
+            return str(int(value))
+    return csv_escape(str(value))
+
+
+def write_summary(filename, rows):
+    """Save summary rows to CSV file filename"""
+    with open(filename, 'w') as out:
+        if not rows:
+            return
+        columns = list(rows[0].keys())
+        out.write(','.join(columns) + '\n')
+        for row in rows:
+            out.write(','.join([format_value(row[column]) for column in columns]) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize Asteroid Impact per-frame and reaction prompt logs.')
+    parser.add_argument('logs', nargs='+',
+                        help='per-frame logs (CSV or binary) and reaction prompt logs. Wildcards are expanded')
+    parser.add_argument('--level-summary', type=str, default=None,
+                        help='CSV file to save one row per level played in each step')
+    parser.add_argument('--step-summary', type=str, default=None,
+                        help='CSV file to save one row per gameplay step')
+    parser.add_argument('--reaction-summary', type=str, default=None,
+                        help='CSV file to save one row per reaction prompt sound and image in each step')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes. Defaults to one per CPU')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='log rows read into arrays at a time')
+    args = parser.parse_args()
+
+    # expand wildcards here too, because the Windows command prompt doesn't
+    filenames = []
+    for pattern in args.logs:
+        filenames.extend(sorted(glob.glob(pattern)) or [pattern])
+    level_rows, step_rows, reaction_rows = analyze(filenames, args.processes, args.chunk_rows)
+    print('Summarized %d logs: %d levels, %d gameplay steps, %d reaction prompt groups' % (
+        len(filenames), len(level_rows), len(step_rows), len(reaction_rows)))
+    for filename, rows in ((args.level_summary, level_rows),
+                           (args.step_summary, step_rows),
+                           (args.reaction_summary, reaction_rows)):
+        if filename:
+            write_summary(filename, rows)
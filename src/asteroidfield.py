@@ -0,0 +1,196 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Batched asteroid physics for Asteroid Impact.
+
+An AsteroidField keeps the movement state of all asteroids in a level in contiguous
+NumPy arrays and advances them all at once each frame, instead of running
+Asteroid.update() once per sprite. The results match Asteroid.update() exactly,
+including pygame's rounding of float positions to integer rectangles, so logs are the
+same with or without NumPy.
+
+While an asteroid is attached to a field, its movement attributes (gameleftfloat, dx,
+speedfactor, gamediameternew_* and so on) are read from and written to the field's
+arrays, so other code such as the slow power-up and the adaptive level transitions keep
+working on the asteroid unchanged.
+
+NumPy is optional. When it isn't installed, NUMPY_AVAILABLE is False and the gameplay
+screens update asteroids one at a time as before.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NUMPY_AVAILABLE = numpy is not None
+
+# asteroid attributes stored in AsteroidField arrays while attached, with array dtype
+FIELD_ATTRIBUTES = [
+    ('gameleftfloat', 'float64'),
+    ('gametopfloat', 'float64'),
+    ('dx', 'float64'),
+    ('dy', 'float64'),
+    ('dxnew', 'float64'),
+    ('dynew', 'float64'),
+    ('speedfactor', 'float64'),
+    ('gamediameter', 'int64'),
+    ('gamediameternew_start_diameter', 'float64'),
+    ('gamediameternew_end_diameter', 'float64'),
+    ('gamediameternew_transition_duration_millis', 'float64'),
+    ('gamediameternew_transition_remaining_millis', 'float64'),
+]
+
+
+class FieldAttribute(object):
+    """
+    Asteroid attribute that lives in the asteroid's AsteroidField while it is attached
+    to one, and in the asteroid's slot of the same name prefixed with '_' otherwise.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.slot = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        field = obj.field
+        if field is None:
+            return getattr(obj, self.slot)
+        return getattr(field, self.name)[obj.field_index].item()
+
+    def __set__(self, obj, value):
+        field = obj.field
+        if field is None:
+            setattr(obj, self.slot, value)
+        else:
+            getattr(field, self.name)[obj.field_index] = value
+
+
+def round_half_away(values):
+    """Round float array to integers the way pygame.Rect attribute assignment does"""
+    truncated = numpy.trunc(values)
+    rounded = numpy.rint(values)
+    halfway = numpy.abs(values - truncated) == 0.5
+    return numpy.where(halfway, truncated + numpy.sign(values), rounded).astype('int64')
+
+
+class AsteroidField(object):
+    """Movement state for a list of asteroids, updated together each frame"""
+
+    def __init__(self, asteroids=()):
+        self.asteroids = []
+        self.set_asteroids(asteroids)
+
+    def set_asteroids(self, asteroids):
+        """
+        Make this field manage exactly the asteroids in the list asteroids.
+
+        Asteroids no longer in the list are detached and go back to updating themselves.
+        """
+        asteroids = list(asteroids)
+        # read current values through the attributes, before any arrays are replaced
+        values = {name: [getattr(a, name) for a in asteroids] for name, dtype in FIELD_ATTRIBUTES}
+        keep = set(id(a) for a in asteroids)
+        for asteroid in self.asteroids:
+            if id(asteroid) not in keep:
+                self.detach(asteroid)
+        for asteroid in asteroids:
+            if asteroid.field is not None and asteroid.field is not self:
+                asteroid.field.detach(asteroid)
+
+        for name, dtype in FIELD_ATTRIBUTES:
+            setattr(self, name, numpy.array(values[name], dtype=dtype).reshape(len(asteroids)))
+        # integer game rectangle, and the play area each asteroid bounces within
+        self.rect_x = numpy.array([a.gamerect.x for a in asteroids], dtype='int64')
+        self.rect_y = numpy.array([a.gamerect.y for a in asteroids], dtype='int64')
+        self.rect_w = numpy.array([a.gamerect.width for a in asteroids], dtype='int64')
+        self.rect_h = numpy.array([a.gamerect.height for a in asteroids], dtype='int64')
+        self.area_left = numpy.array([a.GAME_PLAY_AREA.left for a in asteroids], dtype='int64')
+        self.area_right = numpy.array([a.GAME_PLAY_AREA.right for a in asteroids], dtype='int64')
+        self.area_top = numpy.array([a.GAME_PLAY_AREA.top for a in asteroids], dtype='int64')
+        self.area_bottom = numpy.array([a.GAME_PLAY_AREA.bottom for a in asteroids], dtype='int64')
+
+        self.asteroids = asteroids
+        for i, asteroid in enumerate(asteroids):
+            asteroid.field = self
+            asteroid.field_index = i
+
+    def detach(self, asteroid):
+        """Move asteroid's state out of this field, back onto the asteroid"""
+        if asteroid.field is not self:
+            return
+        values = [(name, getattr(asteroid, name)) for name, dtype in FIELD_ATTRIBUTES]
+        asteroid.field = None
+        asteroid.field_index = -1
+        for name, value in values:
+            setattr(asteroid, name, value)
+
+    def update(self, millis):
+        """Update the position and direction of every asteroid to move, and bounce"""
+        if not self.asteroids:
+            return
+
+        # handle size transitions:
+        transitioning = numpy.flatnonzero(self.gamediameternew_transition_remaining_millis > 0)
+        if len(transitioning):
+            remaining = numpy.maximum(
+                self.gamediameternew_transition_remaining_millis[transitioning] - millis, 0)
+            self.gamediameternew_transition_remaining_millis[transitioning] = remaining
+
+            # same operation order as map_range() so diameters round identically
+            start = self.gamediameternew_start_diameter[transitioning]
+            end = self.gamediameternew_end_diameter[transitioning]
+            duration = self.gamediameternew_transition_duration_millis[transitioning]
+            newdiameter = numpy.round(
+                start + (end - start) * (remaining - duration) / (0 - duration)).astype('int64')
+
+            changed = newdiameter != self.gamediameter[transitioning]
+            resized = transitioning[changed]
+            newdiameter = newdiameter[changed]
+            # resize around center
+            centerx = self.rect_x[resized] + self.rect_w[resized] // 2
+            centery = self.rect_y[resized] + self.rect_h[resized] // 2
+            self.gamediameter[resized] = newdiameter
+            self.rect_w[resized] = newdiameter
+            self.rect_h[resized] = newdiameter
+            self.rect_x[resized] = centerx - newdiameter // 2
+            self.rect_y[resized] = centery - newdiameter // 2
+
+        # when bouncing, change from expected X or Y speed towards
+        # new speed by at most +/-4px/frame
+        abs_dx = numpy.abs(self.dx)
+        abs_dy = numpy.abs(self.dy)
+        adjusted_abs_dx = numpy.minimum(
+            numpy.maximum(numpy.abs(self.dxnew), numpy.maximum(abs_dx - 4, 1)), abs_dx + 4)
+        adjusted_abs_dy = numpy.minimum(
+            numpy.maximum(numpy.abs(self.dynew), numpy.maximum(abs_dy - 4, 1)), abs_dy + 4)
+
+        # bounce by setting sign of x or y speed if off of corresponding side of screen
+        self.dx = numpy.where(self.rect_x < self.area_left, adjusted_abs_dx, self.dx)
+        self.dx = numpy.where(self.rect_x + self.rect_w > self.area_right, -adjusted_abs_dx, self.dx)
+        self.dy = numpy.where(self.rect_y < self.area_top, adjusted_abs_dy, self.dy)
+        self.dy = numpy.where(self.rect_y + self.rect_h > self.area_bottom, -adjusted_abs_dy, self.dy)
+
+        self.gameleftfloat += self.dx * self.speedfactor
+        self.gametopfloat += self.dy * self.speedfactor
+        self.rect_x = round_half_away(self.gameleftfloat)
+        self.rect_y = round_half_away(self.gametopfloat)
+
+        self.write_rects()
+
+    def write_rects(self):
+        """Copy game rectangles to the asteroids"""
+        for asteroid, x, y, w, h in zip(
+                self.asteroids,
+                self.rect_x.tolist(), self.rect_y.tolist(), self.rect_w.tolist(), self.rect_h.tolist()):
+            gamerect = asteroid.gamerect
+            gamerect.topleft = (x, y)
+            gamerect.size = (w, h)
@@ -0,0 +1,192 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Scheduled playing of reaction prompt sounds for Asteroid Impact.
+
+A sound started with ``Sound.play()`` from the frame update starts when that update
+runs, which is up to a frame after the prompt was due. With
+``--audio-schedule-millis``, reaction prompt sounds are instead queued as a
+:class:`Cue` for a target time, a fixed number of milliseconds after the step time the
+prompt was due, and started by an :class:`AudioScheduler` thread that sleeps until
+shortly before the cue is due and busy waits the rest, the same as the FrameScheduler.
+
+The prompt's frame update runs up to a frame after the prompt was due, plus the time
+the update takes, so the delay has to be longer than that for the cue to still be in
+the future when it's scheduled. Delays shorter than MIN_DELAY_MILLIS are warned about
+at startup. A cue scheduled after it was already due is played right away, and counted
+separately in the summary instead of as scheduler lateness.
+
+The thread needs the GIL to wake up and to busy wait, and waits for it up to the thread
+switch interval while the main thread runs Python code. While the scheduler runs, the
+interval is lowered from Python's default 5ms to frametiming.TIMING_SWITCH_INTERVAL
+(0.5ms), so cues usually start less than 0.5ms after they're due. pygame calls that
+hold the GIL for longer, such as scaling an image, can delay a cue further. The summary
+printed on exit gives the largest delay of the session.
+
+Either way, the perf_counter_ns() time each cue's ``play()`` call returned is recorded.
+That's when the sound was handed to the SDL mixer, which mixes it into the next audio
+buffer it fills. pygame doesn't tell when that is, so the sound is heard up to one
+mixer buffer (MIXER_BUFFER_SAMPLES at MIXER_FREQUENCY, 11.6ms) plus the fixed output
+latency of the audio device after the recorded time.
+"""
+
+import heapq
+import threading
+
+from frametiming import perf_counter_ns, start_timing_thread, stop_timing_thread, TIMING_SWITCH_INTERVAL
+import gameinput
+
+# mixer settings for pygame.mixer.pre_init()
+MIXER_FREQUENCY = 22050
+MIXER_BUFFER_SAMPLES = 256
+
+# shortest delay that's reliably longer than a 16ms frame plus its update
+MIN_DELAY_MILLIS = 20
+
+# AudioScheduler playing scheduled cues, or None to play cues right away
+scheduler = None
+
+
+class Cue(object):
+    """Sound scheduled to play at perf_counter_ns() time due_ns"""
+
+    def __init__(self, sound, due_ns):
+        self.sound = sound
+        self.due_ns = due_ns
+        # perf_counter_ns() time play() returned, None until the sound was started
+        self.played_ns = None
+        self.cancelled = False
+        # True when the cue was already due when it was scheduled
+        self.scheduled_late = False
+
+    def play(self):
+        """Start the sound, and record when it was started if a mixer channel played it"""
+        channel = self.sound.play()
+        if channel is not None:
+            self.played_ns = perf_counter_ns()
+
+    def onset_millis(self):
+        """Returns step time in milliseconds the sound was started, or None if it hasn't been"""
+        if self.played_ns is None:
+            return None
+        return gameinput.step_millis_at(self.played_ns)
+
+
+class AudioScheduler(object):
+    """
+    Plays cues on a background thread when they're due.
+
+    Cues are kept in a heap ordered by due time. The thread waits on a condition
+    variable until shortly before the earliest cue is due, so scheduling an earlier cue
+    wakes it up.
+    """
+
+    def __init__(self, delay_millis, spin_millis=1.0):
+        """Start thread that plays cues delay_millis after their scheduled step time"""
+        self.delay_millis = delay_millis
+        self.spin_ns = int(spin_millis * 1e6)
+        # heap of (due_ns, sequence number, Cue)
+        self.cues = []
+        self.sequence = 0
+        self.condition = threading.Condition()
+
+        # cues played, and total and largest nanoseconds after they were due
+        self.played = 0
+        self.total_late_ns = 0
+        self.max_late_ns = 0
+        # cues played right away because they were already due when scheduled
+        self.scheduled_late = 0
+
+        self.running = True
+        start_timing_thread()
+        self.thread = threading.Thread(target=self.run, name='AudioSchedulerThread')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def schedule(self, sound, step_millis):
+        """Returns Cue to play sound delay_millis after step time step_millis"""
+        cue = Cue(sound, gameinput.perf_counter_ns_at(step_millis + self.delay_millis))
+        cue.scheduled_late = cue.due_ns <= perf_counter_ns()
+        with self.condition:
+            heapq.heappush(self.cues, (cue.due_ns, self.sequence, cue))
+            self.sequence += 1
+            self.condition.notify()
+        return cue
+
+    def stop(self):
+        """Stop the thread. Cues not yet played are dropped"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        stop_timing_thread()
+
+    def run(self):
+        """Scheduling thread: play each cue when it's due until stop()"""
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                if not self.cues:
+                    self.condition.wait()
+                    continue
+                due_ns = self.cues[0][0]
+                wait_ns = due_ns - self.spin_ns - perf_counter_ns()
+                if wait_ns > 0:
+                    # woken early when an earlier cue is scheduled
+                    self.condition.wait(wait_ns * 1e-9)
+                    continue
+                cue = heapq.heappop(self.cues)[2]
+
+            if cue.cancelled:
+                continue
+            while perf_counter_ns() < due_ns:
+                pass
+            cue.play()
+            if cue.played_ns is None:
+                continue
+            if cue.scheduled_late:
+                # lateness of the frame update, not of the scheduler
+                self.scheduled_late += 1
+            else:
+                late_ns = cue.played_ns - due_ns
+                self.played += 1
+                self.total_late_ns += late_ns
+                self.max_late_ns = max(self.max_late_ns, late_ns)
+
+    def summary(self):
+        """Returns text summary of how closely cues kept to their schedule"""
+        if self.scheduled_late:
+            late = ('. %d cues were scheduled after they were due and played right away, '
+                    'use a longer --audio-schedule-millis') % self.scheduled_late
+        else:
+            late = ''
+        if self.played == 0:
+            return 'Audio schedule: no cues played on time' + late
+        return ('Audio schedule: %d cues started %.3fms after due on average, %.3fms at most '
+                '(expected under the %.1fms thread switch interval), plus up to %.1fms mixer buffer') % (
+            self.played,
+            self.total_late_ns * 1e-6 / self.played,
+            self.max_late_ns * 1e-6,
+            TIMING_SWITCH_INTERVAL * 1000.,
+            MIXER_BUFFER_SAMPLES * 1000. / MIXER_FREQUENCY) + late
+
+
+def play(sound, step_millis):
+    """
+    Play sound, due at step time step_millis. Returns its Cue.
+
+    With a scheduler, the sound is played on the scheduling thread delay_millis after
+    step_millis. Without one it's played right away.
+    """
+    if scheduler is None:
+        cue = Cue(sound, perf_counter_ns())
+        cue.play()
+        return cue
+    return scheduler.schedule(sound, step_millis)
@@ -0,0 +1,163 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Reader and CSV converter for binary per-frame logs.
+
+Binary logs are written with ``--log-format binary`` (see logger.BinaryRowEncoder).
+From the command-line this converts a binary log to the same CSV the game writes with
+``--log-format csv``::
+
+    python binarylog.py --input log.bin --output log.csv
+
+For analysis, load() decompresses the whole log into a NumPy structured array with
+one field per column, without parsing any text.
+
+Logs written before the rows were compressed (header version 1) have one fixed-size
+record per row instead of compressed blocks, and are read the same way.
+"""
+
+import argparse
+import json
+import math
+import os
+import struct
+import zlib
+
+from logger import (BINARY_LOG_BLOCK_HEADER, BINARY_LOG_MAGIC, BINARY_LOG_MISSING, BINARY_LOG_STRUCT_CODES,
+                    csv_escape)
+
+
+def read_header(filename):
+    """Returns the JSON header of binary log filename as a dictionary"""
+    with open(filename, 'rb') as f:
+        magic = f.read(len(BINARY_LOG_MAGIC))
+        if magic != BINARY_LOG_MAGIC:
+            raise ValueError('"%s" is not an Asteroid Impact binary log' % filename)
+        header_length, = struct.unpack('<Q', f.read(8))
+        return json.loads(f.read(header_length).decode('utf-8'))
+
+
+def read_strings(filename, header):
+    """Returns the string table list for binary log filename"""
+    strings_filename = os.path.join(os.path.dirname(filename), header['strings_filename'])
+    with open(strings_filename, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def numpy_dtype(header):
+    """Returns NumPy structured dtype of one record in log with header"""
+    import numpy
+    codes = {'int16': '<i2', 'int32': '<i4', 'float64': '<f8', 'string': '<i4'}
+    return numpy.dtype([(str(c['name']), codes[c['type']]) for c in header['columns']])
+
+
+def iter_blocks(filename, header):
+    """
+    Yields (row_count, data) for each block of rows in binary log filename with header,
+    where data is the block's values column by column. A block cut short by the game
+    exiting is skipped.
+    """
+    with open(filename, 'rb') as f:
+        f.seek(header['data_offset'])
+        if header.get('version', 1) == 1:
+            # uncompressed fixed-size records
+            record_size = header['record_size']
+            data = f.read()
+            yield len(data) // record_size, data
+            return
+        while True:
+            block_header = f.read(BINARY_LOG_BLOCK_HEADER.size)
+            if len(block_header) < BINARY_LOG_BLOCK_HEADER.size:
+                return
+            row_count, compressed_length = BINARY_LOG_BLOCK_HEADER.unpack(block_header)
+            compressed = f.read(compressed_length)
+            if len(compressed) < compressed_length:
+                return
+            yield row_count, zlib.decompress(compressed)
+
+
+def load(filename):
+    """
+    Returns (header, records, strings) for binary log filename.
+
+    records is a NumPy structured array with one entry per frame and a field per
+    column. String columns hold indices into the list strings. Missing values are
+    header['missing'][type], or NaN for float64 columns. Requires NumPy.
+    """
+    import numpy
+    header = read_header(filename)
+    dtype = numpy_dtype(header)
+    blocks = []
+    for row_count, data in iter_blocks(filename, header):
+        if header.get('version', 1) == 1:
+            blocks.append(numpy.frombuffer(data, dtype=dtype, count=row_count))
+            continue
+        block = numpy.empty(row_count, dtype=dtype)
+        offset = 0
+        for name in dtype.names:
+            column_dtype = dtype.fields[name][0]
+            block[name] = numpy.frombuffer(data, dtype=column_dtype, count=row_count, offset=offset)
+            offset += column_dtype.itemsize * row_count
+        blocks.append(block)
+    records = numpy.concatenate(blocks) if blocks else numpy.empty(0, dtype=dtype)
+    return header, records, read_strings(filename, header)
+
+
+def iter_rows(filename):
+    """
+    Yields a list of values for each row in binary log filename, with None for
+    missing values and strings looked up in the string table. Doesn't need NumPy.
+    """
+    header = read_header(filename)
+    strings = read_strings(filename, header)
+    types = [c['type'] for c in header['columns']]
+    codes = [BINARY_LOG_STRUCT_CODES[t] for t in types]
+    for row_count, data in iter_blocks(filename, header):
+        if header.get('version', 1) == 1:
+            record_struct = struct.Struct('<' + ''.join(codes))
+            rows = record_struct.iter_unpack(data[:row_count * record_struct.size])
+        else:
+            columns = []
+            offset = 0
+            for code in codes:
+                column_struct = struct.Struct('<%d%s' % (row_count, code))
+                columns.append(column_struct.unpack_from(data, offset))
+                offset += column_struct.size
+            rows = zip(*columns)
+        for values in rows:
+            row = []
+            for value, t in zip(values, types):
+                if t == 'float64':
+                    row.append(None if math.isnan(value) else value)
+                elif value == BINARY_LOG_MISSING[t]:
+                    row.append(None)
+                elif t == 'string':
+                    row.append(strings[value])
+                else:
+                    row.append(value)
+            yield row
+
+
+def convert_to_csv(filename, csv_filename):
+    """Write binary log filename as per-frame CSV log csv_filename"""
+    header = read_header(filename)
+    with open(csv_filename, 'w') as out:
+        out.write(','.join([csv_escape(c['name']) for c in header['columns']]) + '\n')
+        for row in iter_rows(filename):
+            out.write(','.join(['' if value is None else csv_escape(str(value)) for value in row]) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert Asteroid Impact binary per-frame log to CSV.')
+    parser.add_argument('--input', type=str, required=True,
+                        help='binary log file written with --log-format binary')
+    parser.add_argument('--output', type=str, required=True,
+                        help='CSV file to write')
+    args = parser.parse_args()
+    convert_to_csv(args.input, args.output)
@@ -0,0 +1,177 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Collision detection for Asteroid Impact.
+
+The gameplay screens keep asteroids, targets and power-ups in a CollisionGrid. The grid
+divides the game play area into square cells and files each sprite under the cells its
+``gamerect`` covers, so finding what overlaps the cursor only has to look at sprites in
+the few cells under the cursor, however many sprites the level has.
+"""
+
+import virtualdisplay
+
+# kinds of sprite kept in a CollisionGrid
+ASTEROID = 'asteroid'
+TARGET = 'target'
+POWERUP = 'powerup'
+
+
+def circularspritesoverlap(a, b):
+    """
+    Returns true if two circular game sprites overlap.
+
+    The sprite overlap is checked using their ``gamerect`` to find the sprite position and diameter.
+    """
+    x1 = a.gamerect.centerx
+    y1 = a.gamerect.centery
+    d1 = a.gamerect.width
+    x2 = b.gamerect.centerx
+    y2 = b.gamerect.centery
+    d2 = b.gamerect.width
+    # x1, y1, d1, x2, y2, d2
+    return ((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1)) < (.25 * (d1 + d2) * (d1 + d2))
+
+
+class Collisions(object):
+    """Sprites found overlapping in one CollisionGrid query, each list in the order they were added"""
+
+    def __init__(self):
+        self.asteroids = []
+        self.targets = []
+        self.powerups = []
+
+
+class CollisionGridEntry(object):
+    """A sprite in a CollisionGrid, with the range of cells it is filed under"""
+
+    def __init__(self, sprite, kind, order, moving):
+        self.sprite = sprite
+        self.kind = kind
+        self.order = order
+        self.moving = moving
+        self.cells = None
+
+
+class CollisionGrid(object):
+    """
+    Uniform grid of cells over the game play area for finding overlapping sprites.
+
+    Sprites that move are re-filed by update() only when they cross into different
+    cells. Sprites outside the play area are filed under the nearest edge cells.
+    """
+
+    def __init__(self, area=virtualdisplay.GAME_PLAY_AREA, cell_size=128):
+        self.area = area
+        self.cell_size = cell_size
+        self.columns = max(1, -(-area.width // cell_size))
+        self.rows = max(1, -(-area.height // cell_size))
+        self.clear()
+
+    def clear(self):
+        """Remove all sprites"""
+        self.cells = [set() for i in range(self.columns * self.rows)]
+        self.entries = {}
+        self.moving_entries = []
+        self.next_order = 0
+
+    def cell_range(self, gamerect):
+        """Returns (left, top, right, bottom) inclusive cell indices covered by gamerect"""
+        # circles are centered on the integer center, so may poke half a unit
+        # outside their gamerect. Pad by one so no overlap is missed.
+        cell_size = self.cell_size
+        left = (gamerect.left - 1 - self.area.left) // cell_size
+        right = (gamerect.right + 1 - self.area.left) // cell_size
+        top = (gamerect.top - 1 - self.area.top) // cell_size
+        bottom = (gamerect.bottom + 1 - self.area.top) // cell_size
+        last_column = self.columns - 1
+        last_row = self.rows - 1
+        return (
+            min(max(left, 0), last_column),
+            min(max(top, 0), last_row),
+            min(max(right, 0), last_column),
+            min(max(bottom, 0), last_row))
+
+    def file_entry(self, entry, cells):
+        """Move entry from the cells it is filed under to cells"""
+        columns = self.columns
+        if entry.cells is not None:
+            left, top, right, bottom = entry.cells
+            for row in range(top, bottom + 1):
+                for column in range(left, right + 1):
+                    self.cells[row * columns + column].discard(entry)
+        entry.cells = cells
+        if cells is not None:
+            left, top, right, bottom = cells
+            for row in range(top, bottom + 1):
+                for column in range(left, right + 1):
+                    self.cells[row * columns + column].add(entry)
+
+    def add(self, sprite, kind, moving=True):
+        """
+        Add sprite of kind ASTEROID, TARGET or POWERUP.
+
+        Use moving=False for sprites that never move, so update() can skip them.
+        """
+        if id(sprite) in self.entries:
+            self.remove(sprite)
+        entry = CollisionGridEntry(sprite, kind, self.next_order, moving)
+        self.next_order += 1
+        self.entries[id(sprite)] = entry
+        if moving:
+            self.moving_entries.append(entry)
+        self.file_entry(entry, self.cell_range(sprite.gamerect))
+
+    def add_list(self, sprites, kind, moving=True):
+        """Add every sprite in sprites, in order"""
+        for sprite in sprites:
+            self.add(sprite, kind, moving)
+
+    def remove(self, sprite):
+        """Remove sprite if present"""
+        entry = self.entries.pop(id(sprite), None)
+        if entry is None:
+            return
+        if entry.moving:
+            self.moving_entries.remove(entry)
+        self.file_entry(entry, None)
+
+    def move(self, sprite):
+        """Re-file sprite after its gamerect changed"""
+        entry = self.entries[id(sprite)]
+        cells = self.cell_range(sprite.gamerect)
+        if cells != entry.cells:
+            self.file_entry(entry, cells)
+
+    def update(self):
+        """Re-file all moving sprites that crossed into different cells"""
+        cell_range = self.cell_range
+        for entry in self.moving_entries:
+            cells = cell_range(entry.sprite.gamerect)
+            if cells != entry.cells:
+                self.file_entry(entry, cells)
+
+    def collisions(self, sprite):
+        """Returns Collisions with every sprite in the grid that overlaps sprite"""
+        left, top, right, bottom = self.cell_range(sprite.gamerect)
+        columns = self.columns
+        candidates = set()
+        for row in range(top, bottom + 1):
+            for column in range(left, right + 1):
+                candidates.update(self.cells[row * columns + column])
+
+        found = Collisions()
+        lists = {
+            ASTEROID: found.asteroids,
+            TARGET: found.targets,
+            POWERUP: found.powerups}
+        for entry in sorted(candidates, key=lambda e: e.order):
+            if entry.sprite is not sprite and circularspritesoverlap(sprite, entry.sprite):
+                lists[entry.kind].append(entry.sprite)
+        return found
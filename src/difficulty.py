@@ -0,0 +1,426 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Estimates how difficult levels are by having scripted bot players play them many times.
+
+Each play is one attempt at a level, simulated headless with the game's own gameplay
+logic, 16ms of game time per update, until the bot collects every crystal, dies, or
+runs out of time. A bot moves the cursor with one of these policies:
+
+ * ``greedy`` heads straight for the crystal
+ * ``avoid`` heads for the crystal, but is pushed away from asteroids near where they
+   are heading (a potential field), unless a shield power-up is active
+ * ``jitter`` heads for the crystal with random noise added to every move
+
+Bots ignore power-ups other than the shield, but pick them up when they happen to cross
+them. Plays differ from each other in where the cursor starts and in how fast the bot
+moves, which are chosen at random for each play. The random choices come from
+``--seed`` so estimates are repeatable. Plays run in parallel in a pool of worker
+processes.
+
+For each level and policy, the estimate is the fraction of plays completed, died, or
+timed out, the deaths per minute played, and the distribution of the time to complete
+the level. From the command-line::
+
+    python difficulty.py levels/standard01.json levels/hardlevels.json --plays 1000 --output difficulty.csv
+
+Level list JSON files are expanded to their levels. To calibrate candidate seeds for
+makestandardlevels.py or the ``"seed"`` of a ``level_templates`` entry, levels can
+be generated with makelevel.make_level() for a range of seeds instead::
+
+    python difficulty.py --level-args '{"target_count": 8, "asteroid_count": 3, "asteroid_speeds": "medium"}'
+        --seeds 1000:1100 --policies avoid --plays 200
+"""
+
+import argparse
+import collections
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+from os import path
+
+import pygame
+
+import gameinput
+from headless import FRAME_MILLIS, VirtualMouse
+from logger import csv_escape
+from makelevel import make_level
+from screens import AsteroidImpactGameplayScreen
+import spritepool
+import virtualdisplay
+
+# the cursor diameter, in game units
+CURSOR_DIAMETER = 32
+
+# time-to-complete percentiles reported
+COMPLETION_PERCENTILES = [10, 50, 90]
+
+
+class BotPolicy(object):
+    """
+    Base class for bot players. Moves the cursor towards the crystal at a speed chosen
+    for each play.
+    """
+
+    def __init__(self, speed=800, speed_variation=0.25, **kwargs):
+        """
+        Create bot moving the cursor speed game units per second, give or take up to
+        speed_variation of that for each play.
+        """
+        self.speed = speed
+        self.speed_variation = speed_variation
+        self.rnd = None
+        self.play_speed = speed
+        self.pos = (0.0, 0.0)
+
+    def start(self, rnd):
+        """Start a play choosing from random.Random rnd. Returns the starting cursor position"""
+        self.rnd = rnd
+        self.play_speed = self.speed * rnd.uniform(1.0 - self.speed_variation, 1.0 + self.speed_variation)
+        area = virtualdisplay.GAME_PLAY_AREA
+        self.pos = (float(rnd.randint(area.left, area.right)), float(rnd.randint(area.top, area.bottom)))
+        return self.pos
+
+    def direction(self, gameplay, target):
+        """Returns (x, y) direction to move the cursor in. The length doesn't matter"""
+        return (target[0] - self.pos[0], target[1] - self.pos[1])
+
+    def move(self, gameplay, millis):
+        """Returns the cursor position after millis of moving in AsteroidImpactGameplayScreen gameplay"""
+        target = gameplay.target.gamerect.center
+        dx, dy = self.direction(gameplay, target)
+        length = math.hypot(dx, dy)
+        step = self.play_speed * millis / 1000.
+        target_distance = math.hypot(target[0] - self.pos[0], target[1] - self.pos[1])
+        if length > 0:
+            step = min(step, target_distance)
+            x = self.pos[0] + dx * step / length
+            y = self.pos[1] + dy * step / length
+            # the cursor's center stays in the play area
+            area = virtualdisplay.GAME_PLAY_AREA
+            self.pos = (min(max(x, area.left), area.right), min(max(y, area.top), area.bottom))
+        return self.pos
+
+
+class GreedyPolicy(BotPolicy):
+    """Heads straight for the crystal"""
+    pass
+
+
+class AvoidPolicy(BotPolicy):
+    """
+    Heads for the crystal in a potential field: attracted to the crystal, and repelled
+    by each asteroid whose edge will be within avoid_distance of the cursor's edge
+    lookahead_updates from now.
+    """
+
+    def __init__(self, avoid_distance=120, avoid_strength=2.0, lookahead_updates=8, **kwargs):
+        BotPolicy.__init__(self, **kwargs)
+        self.avoid_distance = avoid_distance
+        self.avoid_strength = avoid_strength
+        self.lookahead_updates = lookahead_updates
+
+    def direction(self, gameplay, target):
+        dx = target[0] - self.pos[0]
+        dy = target[1] - self.pos[1]
+        target_distance = math.hypot(dx, dy)
+        if target_distance > 0:
+            dx /= target_distance
+            dy /= target_distance
+
+        powerup = gameplay.powerup
+        if powerup.active and powerup.type == 'shield':
+            return (dx, dy)
+
+        for asteroid in gameplay.asteroids:
+            # asteroids move dx, dy game units each update
+            x = asteroid.gamerect.centerx + asteroid.dx * asteroid.speedfactor * self.lookahead_updates
+            y = asteroid.gamerect.centery + asteroid.dy * asteroid.speedfactor * self.lookahead_updates
+            distance = math.hypot(self.pos[0] - x, self.pos[1] - y)
+            clearance = distance - (asteroid.gamediameter + CURSOR_DIAMETER) / 2.
+            if clearance < self.avoid_distance and distance > 0:
+                # grows from 0 at avoid_distance, past avoid_strength when overlapping
+                push = self.avoid_strength * (self.avoid_distance - clearance) / self.avoid_distance
+                dx += push * (self.pos[0] - x) / distance
+                dy += push * (self.pos[1] - y) / distance
+        return (dx, dy)
+
+
+class JitterPolicy(BotPolicy):
+    """Heads for the crystal with random noise of standard deviation jitter added to each move"""
+
+    def __init__(self, jitter=1.0, **kwargs):
+        BotPolicy.__init__(self, **kwargs)
+        self.jitter = jitter
+
+    def direction(self, gameplay, target):
+        dx = target[0] - self.pos[0]
+        dy = target[1] - self.pos[1]
+        target_distance = math.hypot(dx, dy)
+        if target_distance == 0:
+            return (0, 0)
+        return (dx / target_distance + self.rnd.gauss(0, self.jitter),
+                dy / target_distance + self.rnd.gauss(0, self.jitter))
+
+
+POLICIES = collections.OrderedDict([
+    ('greedy', GreedyPolicy),
+    ('avoid', AvoidPolicy),
+    ('jitter', JitterPolicy),
+    ])
+
+# display and mouse of this process, set up on first use
+display = None
+mouse = None
+
+
+def init_display():
+    """Set up pygame in this process to run gameplay without a window or audio"""
+    global display, mouse
+    if display is not None:
+        return
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    # at the game's own resolution, bot positions are exact mouse positions
+    virtualdisplay.set_screensize(virtualdisplay.GAME_AREA.size)
+    pygame.init()
+    # without the mixer, sounds load as NoneSound
+    if pygame.mixer:
+        pygame.mixer.quit()
+    display = pygame.display.set_mode(virtualdisplay.GAME_AREA.size)
+    mouse = VirtualMouse()
+    gameinput.install_virtual_mouse(mouse)
+
+
+def play_level(level, policy, rnd, max_millis):
+    """
+    Play level once with BotPolicy policy, choosing from random.Random rnd.
+
+    Returns (outcome, level_millis, targets_collected) where outcome is 'completed',
+    'dead', or 'timeout' when max_millis of level time passes first.
+    """
+    screenstack = []
+    gameplay = AsteroidImpactGameplayScreen(display, screenstack, [level], None)
+    screenstack.append(gameplay)
+    mouse.set_pos(policy.start(rnd))
+    while gameplay.level_millis < max_millis:
+        mouse.set_pos(policy.move(gameplay, FRAME_MILLIS))
+        logrowdetails = {}
+        gameplay.update_frontmost(FRAME_MILLIS, logrowdetails, [], [], 0, None)
+        if logrowdetails['level_state'] in ('completed', 'dead'):
+            break
+    else:
+        logrowdetails['level_state'] = 'timeout'
+    # for the next play to reuse
+    spritepool.release(gameplay.level_objects)
+    return (logrowdetails['level_state'], gameplay.level_millis, gameplay.target_index)
+
+
+def run_plays(task):
+    """
+    Worker process task: Returns list of play_level() results for plays first_play up
+    to first_play + play_count of task (level, policy_name, policy_settings, first_play,
+    play_count, seed, max_millis)
+    """
+    level, policy_name, policy_settings, first_play, play_count, seed, max_millis = task
+    init_display()
+    policy = POLICIES[policy_name](**policy_settings)
+    results = []
+    # the gameplay screen prints every death and pick-up
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for play in range(first_play, first_play + play_count):
+            # seeded from text, so each play is the same whichever process runs it
+            rnd = random.Random('%d:%s:%s:%d' % (seed, level['level_name'], policy_name, play))
+            results.append(play_level(level, policy, rnd, max_millis))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return results
+
+
+def percentile(sorted_values, percent):
+    """Returns the nearest-rank percent percentile of non-empty sorted list sorted_values"""
+    rank = int(math.ceil(percent / 100. * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize_plays(level_name, policy_name, results):
+    """Returns OrderedDict of difficulty estimates from play_level() results"""
+    plays = len(results)
+    outcomes = collections.Counter([outcome for outcome, _, _ in results])
+    completion_millis = sorted([millis for outcome, millis, _ in results if outcome == 'completed'])
+    # time played counts from the end of the countdown
+    minutes_played = sum([max(millis, 0) for _, millis, _ in results]) / 60000.
+
+    row = collections.OrderedDict()
+    row['level_name'] = level_name
+    row['policy'] = policy_name
+    row['plays'] = plays
+    row['completion_probability'] = outcomes['completed'] / float(plays)
+    row['death_probability'] = outcomes['dead'] / float(plays)
+    row['timeout_probability'] = outcomes['timeout'] / float(plays)
+    row['deaths_per_minute'] = outcomes['dead'] / minutes_played if minutes_played > 0 else None
+    row['mean_targets_collected'] = sum([targets for _, _, targets in results]) / float(plays)
+    if completion_millis:
+        row['completion_millis_mean'] = sum(completion_millis) / float(len(completion_millis))
+    else:
+        row['completion_millis_mean'] = None
+    for percent in COMPLETION_PERCENTILES:
+        row['completion_millis_p%d' % percent] = (
+            percentile(completion_millis, percent) if completion_millis else None)
+    return row
+
+
+def estimate_difficulty(levels, policy_names, plays, policy_settings=None, seed=0,
+                        max_seconds=60.0, processes=None, plays_per_task=25):
+    """
+    Returns list of summarize_plays() rows, one for each of levels and policy_names.
+
+    Each level is played plays times with each policy, in parallel by processes worker
+    processes, or one per CPU when processes is None. Levels are dictionaries like
+    level JSON files, with a 'level_name'. policy_settings are keyword arguments for
+    the BotPolicy classes, which ignore settings they don't use.
+    """
+    policy_settings = policy_settings or {}
+    max_millis = max_seconds * 1000.
+    tasks = []
+    for level in levels:
+        for policy_name in policy_names:
+            for first_play in range(0, plays, plays_per_task):
+                tasks.append((level, policy_name, policy_settings, first_play,
+                              min(plays_per_task, plays - first_play), seed, max_millis))
+
+    if processes == 1:
+        task_results = [run_plays(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            task_results = pool.map(run_plays, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    results = collections.OrderedDict()
+    for task, task_result in zip(tasks, task_results):
+        level, policy_name = task[0], task[1]
+        results.setdefault((level['level_name'], policy_name), []).extend(task_result)
+    return [summarize_plays(level_name, policy_name, level_results)
+            for (level_name, policy_name), level_results in results.items()]
+
+
+def load_levels(filename):
+    """Returns list of levels in level JSON file or level list JSON file filename"""
+    with open(filename) as f:
+        details = json.load(f)
+    if 'levels' not in details:
+        details['level_name'] = filename
+        return [details]
+    # level files are relative to the level list
+    levels = []
+    for levelfile in details['levels']:
+        levels.extend(load_levels(path.join(path.dirname(filename), levelfile)))
+    return levels
+
+
+def format_value(value):
+    """Returns CSV cell text for estimate value"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        value = round(value, 4)
+        if value == int(value):
+            return str(int(value))
+    return csv_escape(str(value))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Estimate Asteroid Impact level difficulty from many plays by bot players.')
+    parser.add_argument('levels', nargs='*',
+                        help='level JSON files or level list JSON files to estimate')
+    parser.add_argument('--level-args', type=str, default=None,
+                        help=('JSON object of makelevel.make_level() arguments, like a level_templates ' +
+                              'entry, to generate levels from with each of --seeds'))
+    parser.add_argument('--seeds', type=str, default=None,
+                        help='range of seeds for --level-args, like 1000:1100 (the end is excluded)')
+    parser.add_argument('--policies', type=str, default=','.join(POLICIES.keys()),
+                        help='comma separated bot policies to play with: %s' % ', '.join(POLICIES.keys()))
+    parser.add_argument('--plays', type=int, default=500,
+                        help='plays of each level with each policy')
+    parser.add_argument('--max-seconds', type=float, default=60.0,
+                        help='seconds of level time after which a play counts as timed out')
+    parser.add_argument('--speed', type=float, default=800,
+                        help='bot cursor speed in game units per second')
+    parser.add_argument('--speed-variation', type=float, default=0.25,
+                        help='fraction the speed varies by between plays')
+    parser.add_argument('--avoid-distance', type=float, default=120,
+                        help='distance in game units at which the avoid policy is pushed away from asteroids')
+    parser.add_argument('--avoid-strength', type=float, default=2.0,
+                        help='how strongly the avoid policy is pushed away from asteroids')
+    parser.add_argument('--jitter', type=float, default=1.0,
+                        help='standard deviation of the jitter policy\'s noise, relative to its movement')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random number seed for starting positions, speeds and noise of bots')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes. Defaults to one per CPU')
+    parser.add_argument('--output', type=str, default=None,
+                        help='CSV file to save one row per level and policy to')
+    args = parser.parse_args()
+
+    levels = []
+    for filename in args.levels:
+        levels.extend(load_levels(filename))
+    if args.level_args:
+        if not args.seeds:
+            print('ERROR: --level-args needs --seeds')
+            sys.exit(1)
+        level_args = json.loads(args.level_args)
+        start, end = [int(s) for s in args.seeds.split(':')]
+        for level_seed in range(start, end):
+            level_args['seed'] = level_seed
+            level = make_level(**level_args)
+            level['level_name'] = 'seed %d' % level_seed
+            levels.append(level)
+    if not levels:
+        print('ERROR: no levels to estimate. Specify level JSON files or --level-args with --seeds')
+        sys.exit(1)
+
+    policy_names = [p.strip() for p in args.policies.split(',') if p.strip()]
+    for policy_name in policy_names:
+        if policy_name not in POLICIES:
+            print('ERROR: unknown bot policy "%s"' % policy_name)
+            sys.exit(1)
+
+    policy_settings = dict(
+        speed=args.speed,
+        speed_variation=args.speed_variation,
+        avoid_distance=args.avoid_distance,
+        avoid_strength=args.avoid_strength,
+        jitter=args.jitter)
+    rows = estimate_difficulty(levels, policy_names, args.plays, policy_settings,
+                               seed=args.seed, max_seconds=args.max_seconds, processes=args.processes)
+
+    for row in rows:
+        print('%s %s: %.1f%% completed, %.1f%% died, %.1f%% timed out. Median completion %s' % (
+            row['level_name'], row['policy'],
+            100 * row['completion_probability'],
+            100 * row['death_probability'],
+            100 * row['timeout_probability'],
+            '-' if row['completion_millis_p50'] is None else '%.2fs' % (row['completion_millis_p50'] / 1000.)))
+    if args.output:
+        with open(args.output, 'w') as out:
+            columns = list(rows[0].keys())
+            out.write(','.join(columns) + '\n')
+            for row in rows:
+                out.write(','.join([format_value(row[column]) for column in columns]) + '\n')
@@ -0,0 +1,115 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Frame pacing for Asteroid Impact.
+
+pygame.time.Clock.tick_busy_loop() keeps a CPU core busy for the whole frame. The
+FrameScheduler instead sleeps until shortly before the next frame is due, then busy
+waits only the last ``spin_millis`` for precision. Frames are due on an absolute
+schedule of whole frame periods from when the scheduler started, so small delays
+don't add up: a frame that starts late is followed by a shorter one.
+
+While sleeping, the scheduler can also poll for input events every millisecond, so
+input is timestamped more precisely than once per frame (see gameinput.poll_events()).
+
+Sleeping only wakes up on time when the operating system timer resolution is fine
+enough. SDL raises it to 1ms on Windows while pygame is initialized.
+"""
+
+import math
+import time
+
+try:
+    from time import perf_counter
+except ImportError:
+    # python 2.7
+    from time import clock as perf_counter
+
+
+class FrameScheduler(object):
+    """
+    Stand-in for pygame.time.Clock that waits for each frame on an absolute schedule.
+
+    Like tick_busy_loop(), tick() returns whole milliseconds since the previous tick.
+    These are counted from the schedule's start, so they add up to the real time passed.
+    """
+
+    def __init__(self, spin_millis=2.0, poll=None, poll_millis=1.0):
+        """
+        Create FrameScheduler that busy waits the last spin_millis before each frame.
+
+        When poll is a function, it is called about every poll_millis while sleeping.
+        """
+        self.spin_seconds = spin_millis * 0.001
+        self.poll = poll
+        self.poll_seconds = poll_millis * 0.001
+        self.start = perf_counter()
+        self.deadline = self.start
+        self.previous_millis = 0
+        self.frame_count = 0
+
+        # seconds the most recent frame started after it was due
+        self.late_seconds = 0.0
+        self.total_late_seconds = 0.0
+        self.max_late_seconds = 0.0
+        # frames that started over 1ms late
+        self.late_frames = 0
+        # scheduled frames skipped because the game fell behind by whole frames
+        self.skipped_frames = 0
+
+    def tick(self, framerate=60):
+        """Wait until the next frame is due. Returns milliseconds since the previous tick"""
+        # same whole-millisecond frame period as pygame.time.Clock
+        period = int(1000.0 / framerate) * 0.001
+        self.deadline += period
+
+        now = perf_counter()
+        if now >= self.deadline:
+            # already late. Skip any frames missed entirely, and keep to the schedule
+            missed = int(math.floor((now - self.deadline) / period))
+            self.skipped_frames += missed
+            self.deadline += missed * period
+        else:
+            spin_start = self.deadline - self.spin_seconds
+            if self.poll is None:
+                if spin_start > now:
+                    time.sleep(spin_start - now)
+            else:
+                while spin_start > now:
+                    time.sleep(min(self.poll_seconds, spin_start - now))
+                    self.poll()
+                    now = perf_counter()
+            now = perf_counter()
+            while now < self.deadline:
+                now = perf_counter()
+
+        self.frame_count += 1
+        self.late_seconds = now - self.deadline
+        self.total_late_seconds += self.late_seconds
+        if self.late_seconds > self.max_late_seconds:
+            self.max_late_seconds = self.late_seconds
+        if self.late_seconds > 0.001:
+            self.late_frames += 1
+
+        elapsed_millis = int((now - self.start) * 1000)
+        millis = elapsed_millis - self.previous_millis
+        self.previous_millis = elapsed_millis
+        return millis
+
+    def summary(self):
+        """Returns text summary of how closely frames kept to the schedule"""
+        if self.frame_count == 0:
+            return 'Frame schedule: no frames'
+        return ('Frame schedule: %d frames started %.3fms late on average, %.3fms at most. '
+                '%d frames over 1ms late, %d scheduled frames skipped') % (
+            self.frame_count,
+            self.total_late_seconds * 1000. / self.frame_count,
+            self.max_late_seconds * 1000.,
+            self.late_frames,
+            self.skipped_frames)
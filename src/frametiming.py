@@ -0,0 +1,213 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Frame timing measurement for Asteroid Impact.
+
+With ``--frame-timing true`` or ``--timing-log-filename``, the game loop measures how
+long each phase of every frame takes (see PHASES) with a high resolution timer. The
+measurements of each frame are kept in a ring buffer of recent frames, written to the
+optional CSV timing log (see logger.TIMING_LOG_COLUMNS), and summarized as histograms
+printed when the game exits.
+"""
+
+import bisect
+import collections
+import sys
+import time
+
+from logger import TimingLogger
+
+try:
+    from time import perf_counter_ns
+except ImportError:
+    # python before 3.7
+    def perf_counter_ns():
+        return int(time.time() * 1e9)
+
+# thread switch interval in seconds while background timing threads run. A thread waking
+# from sleep has to take the GIL back before it can read the clock, and waits up to the
+# switch interval (5ms by default) while the main thread runs Python code
+TIMING_SWITCH_INTERVAL = 0.0005
+
+# timing threads running, and the switch interval from before the first one started
+timing_threads = 0
+saved_switch_interval = None
+
+
+def start_timing_thread():
+    """Lower the thread switch interval to TIMING_SWITCH_INTERVAL for a starting timing thread"""
+    global timing_threads, saved_switch_interval
+    if not hasattr(sys, 'setswitchinterval'):
+        # python 2.7
+        return
+    if timing_threads == 0:
+        saved_switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(TIMING_SWITCH_INTERVAL)
+    timing_threads += 1
+
+
+def stop_timing_thread():
+    """Restore the thread switch interval once the last timing thread stopped"""
+    global timing_threads
+    if timing_threads == 0:
+        return
+    timing_threads -= 1
+    if timing_threads == 0:
+        sys.setswitchinterval(saved_switch_interval)
+
+# phases of a frame, in the order the game loop runs them
+PHASES = ['wait', 'input', 'update', 'log', 'triggers', 'draw', 'flip']
+
+# upper edges of histogram buckets in milliseconds. The last bucket has no upper edge
+HISTOGRAM_BUCKET_MILLIS = [0.5, 1, 2, 4, 8, 16, 20, 25, 33, 50]
+
+
+class NoneFrameTimer(object):
+    """stub frame timer that measures nothing, for when frame timing is off"""
+    def mark(self, phase):
+        pass
+
+    def next_frame(self, total_millis, real_millis, update_count):
+        pass
+
+    def close(self):
+        pass
+
+
+class FrameTimer(object):
+    """
+    Measures the time spent in each phase of each frame.
+
+    The game loop calls mark() at the end of each phase, so the time since the previous
+    mark is added to that phase, and next_frame() when a new frame starts.
+    """
+    def __init__(self, timing_log_filename=None, overwrite_file=False, history_frames=600, frame_scheduler=None):
+        """
+        Create FrameTimer keeping the last history_frames frames, and logging to timing_log_filename.
+
+        When the game loop waits for frames with a framescheduler.FrameScheduler, pass it as
+        frame_scheduler to also record how late each frame started.
+        """
+        self.frame_scheduler = frame_scheduler
+        if timing_log_filename:
+            self.logger = TimingLogger(timing_log_filename, overwrite_file)
+        else:
+            self.logger = None
+        self.phase_keys = {phase: phase + '_ns' for phase in PHASES}
+        # ring buffer of the most recent frames
+        self.history = collections.deque(maxlen=history_frames)
+
+        # histograms, totals and maximums over all frames for each phase and the whole frame
+        self.bucket_edges_ns = [int(m * 1000000) for m in HISTOGRAM_BUCKET_MILLIS]
+        self.histograms = {}
+        self.total_ns = {}
+        self.max_ns = {}
+        for key in list(self.phase_keys.values()) + ['frame_ns']:
+            self.histograms[key] = [0] * (len(self.bucket_edges_ns) + 1)
+            self.total_ns[key] = 0
+            self.max_ns[key] = 0
+        self.frame_count = 0
+        self.catch_up_frames = 0
+        self.catch_up_updates = 0
+
+        self.current = None
+        self.frame_start_ns = self.last_mark_ns = perf_counter_ns()
+        self.closed = False
+
+    def mark(self, phase):
+        """Add the time since the previous mark to phase of the current frame"""
+        now = perf_counter_ns()
+        if self.current is not None:
+            self.current[self.phase_keys[phase]] += now - self.last_mark_ns
+        self.last_mark_ns = now
+
+    def next_frame(self, total_millis, real_millis, update_count):
+        """
+        Finish the current frame and start measuring a new one.
+
+        total_millis is the game time before the new frame's updates, real_millis the
+        frame clock's milliseconds since the previous frame, and update_count the number
+        of game updates the new frame runs.
+        """
+        now = perf_counter_ns()
+        self.finish_frame(now)
+        self.frame_start_ns = self.last_mark_ns = now
+
+        self.current = {key: 0 for key in self.phase_keys.values()}
+        self.current['frame'] = self.frame_count
+        self.current['total_millis'] = total_millis + real_millis
+        self.current['real_millis'] = real_millis
+        self.current['update_count'] = update_count
+        if self.frame_scheduler is not None:
+            self.current['late_ns'] = int(self.frame_scheduler.late_seconds * 1e9)
+        self.frame_count += 1
+        if update_count > 1:
+            self.catch_up_frames += 1
+            self.catch_up_updates += update_count - 1
+
+    def finish_frame(self, now):
+        """Record the current frame, which ends at now"""
+        frame = self.current
+        if frame is None:
+            return
+        self.current = None
+        frame['frame_ns'] = now - self.frame_start_ns
+
+        edges = self.bucket_edges_ns
+        for key, histogram in self.histograms.items():
+            value = frame[key]
+            histogram[bisect.bisect_right(edges, value)] += 1
+            self.total_ns[key] += value
+            if value > self.max_ns[key]:
+                self.max_ns[key] = value
+
+        self.history.append(frame)
+        if self.logger:
+            self.logger.log(frame)
+
+    def close(self):
+        """Finish the last frame, close the timing log and print the timing summary"""
+        if self.closed:
+            return
+        self.closed = True
+        self.finish_frame(perf_counter_ns())
+        if self.logger:
+            self.logger.close()
+        print(self.summary())
+
+    def summary(self):
+        """Returns text summary of frame timing, with a histogram for each phase"""
+        lines = []
+        lines.append('Frame timing over %d frames. %d frames caught up by running %d extra updates' % (
+            self.frame_count, self.catch_up_frames, self.catch_up_updates))
+        if not self.history:
+            return '\n'.join(lines)
+
+        bucket_labels = ['<%gms' % m for m in HISTOGRAM_BUCKET_MILLIS] + ['>=%gms' % HISTOGRAM_BUCKET_MILLIS[-1]]
+        lines.append('%-9s %8s %8s ' % ('phase', 'mean ms', 'max ms') +
+                     ' '.join(['%7s' % label for label in bucket_labels]))
+        recorded_frames = sum(self.histograms['frame_ns'])
+        for key in [self.phase_keys[phase] for phase in PHASES] + ['frame_ns']:
+            lines.append('%-9s %8.3f %8.3f ' % (
+                key[:-3],
+                self.total_ns[key] * 1e-6 / recorded_frames,
+                self.max_ns[key] * 1e-6) +
+                ' '.join(['%7d' % count for count in self.histograms[key]]))
+
+        if self.frame_scheduler is not None:
+            lines.append(self.frame_scheduler.summary())
+
+        lines.append('Slowest of the last %d frames:' % len(self.history))
+        phase_keys = [self.phase_keys[phase] for phase in PHASES]
+        for frame in sorted(self.history, key=lambda f: f['frame_ns'], reverse=True)[:5]:
+            slowest_phase = max(phase_keys, key=lambda key: frame[key])
+            lines.append('  frame %d at %dms: %.3fms, %d updates, most time in %s (%.3fms)' % (
+                frame['frame'], frame['total_millis'], frame['frame_ns'] * 1e-6,
+                frame['update_count'], slowest_phase[:-3], frame[slowest_phase] * 1e-6))
+        return '\n'.join(lines)
@@ -18,6 +18,7 @@ import argparse
 import json
 import os
 import random  # step shuffling
+import time
 from os import path
 
 import pygame
@@ -54,8 +55,16 @@ from screens import (
     BlackScreen,
     ParallelPortTestScreen,
     QuitGame)
+import audioscheduler
+from framescheduler import FrameScheduler
+from frametiming import FrameTimer, NoneFrameTimer, perf_counter_ns
+import gameinput
+import headless
+import preload
+import replay
 import resources
-from sprites import Target
+from sprites import GameObjectSprite, Target
+from triggerinput import ParallelTriggerPoller, SerialTriggerPoller, TriggerInputThread
 import virtualdisplay
 from logger import AsteroidLogger, SurveyLogger, ReactionLogger
 import parallelportwrapper
@@ -111,12 +120,67 @@ parser.add_argument('--survey-log-filename', type=str, default=None,
                     help='File to save log CSV file to with survey response data.')
 parser.add_argument('--reaction-log-filename', type=str, default=None,
                     help='File to save log CSV file to with reaction prompt data.')
+parser.add_argument('--log-format', choices=['csv', 'binary'], default='csv',
+                    help=('Format of per-frame log file. binary is a compressed format ' +
+                          'that can be converted to CSV with binarylog.py'))
+parser.add_argument('--timing-log-filename', type=str, default=None,
+                    help=('File to save CSV log to with the time spent in each phase of each frame. ' +
+                          'Implies --frame-timing true.'))
+parser.add_argument('--frame-timing', choices=['true', 'false'], default='false',
+                    help=('Measure the time spent in each phase of each frame, and print a summary ' +
+                          'with histograms on exit.'))
 parser.add_argument('--log-overwrite', choices=['true', 'false'], default='false',
                     help='Whether to overwrite pre-existing log files.')
+parser.add_argument('--frame-scheduler', choices=['hybrid', 'busy-loop'], default='hybrid',
+                    help=('How to wait for each frame. hybrid sleeps until shortly before the frame is due ' +
+                          'and then busy waits. busy-loop keeps the CPU busy the whole time.'))
+parser.add_argument('--frame-spin-millis', type=float, default=2.0,
+                    help=('Milliseconds to busy wait before each frame with --frame-scheduler hybrid, ' +
+                          'after sleeping.'))
+parser.add_argument('--dirty-rect-rendering', choices=['true', 'false'], default='true',
+                    help=('Only redraw and update the parts of the screen that changed during gameplay. ' +
+                          'Set to false to redraw and flip the whole screen every frame.'))
+parser.add_argument('--preload-assets', choices=['true', 'false'], default='true',
+                    help=('Load the images and sounds all game steps can need before the first step, ' +
+                          'instead of during the frame each is first shown.'))
+parser.add_argument('--image-cache-dir', type=str, default=None,
+                    help=('Directory to save scaled images to, so later runs at the same display size ' +
+                          'load them instead of decoding and scaling the image files again.'))
+parser.add_argument('--image-size-quantum', type=int, default=1,
+                    help=('Round sizes of asteroids, crystals and other game objects down to a multiple of ' +
+                          'this many pixels, so asteroids changing size reuse scaled images of nearby sizes.'))
+parser.add_argument('--image-cache-max-mb', type=float, default=None,
+                    help=('Most megabytes of scaled images to keep in memory per image file, not in total. The ' +
+                          'least recently used sizes are scaled again when needed. Default keeps every size.'))
+parser.add_argument('--audio-schedule-millis', type=float, default=None,
+                    help=('Play reaction prompt sounds on a separate thread this many milliseconds after the ' +
+                          'prompt was due, instead of during the frame update that shows the prompt. Must be ' +
+                          'longer than a frame plus its update, at least 20ms, or sounds play late.'))
 parser.add_argument('--trigger-blink', choices=['true', 'false'], default='false',
                     help='Blink sprite on screen when trigger pulse is received.')
 parser.add_argument('--parallel-test-address', type=str, default=None,
                     help='Launch parallel port test interface with specified parallel port data address.')
+parser.add_argument('--headless', choices=['true', 'false'], default='false',
+                    help=('Run without a window, audio or frame rate limit, advancing 16ms of game ' +
+                          'time per frame as fast as possible. For validating scripts and logs.'))
+parser.add_argument('--headless-input', type=str, default=None,
+                    help=('Scripted input JSON file to use with --headless. When not specified, ' +
+                          'a synthetic player moves the cursor and clicks periodically.'))
+parser.add_argument('--headless-seed', type=int, default=0,
+                    help='Random number seed for the synthetic player used with --headless.')
+parser.add_argument('--headless-max-seconds', type=float, default=None,
+                    help=('Quit a --headless run after this many seconds of game time, for scripts ' +
+                          'with steps that wait on input the headless player never provides.'))
+parser.add_argument('--replay-log', type=str, default=None,
+                    help=('Per-frame log (CSV or binary) of a session to replay headless with the same ' +
+                          'script JSON, re-simulating it from the logged input. Implies --headless true.'))
+parser.add_argument('--replay-verify', choices=['true', 'false'], default='true',
+                    help='Compare each replayed log row with the logged row, and summarize differences.')
+parser.add_argument('--replay-render-dir', type=str, default=None,
+                    help='Directory to save PNG images of replayed frames to.')
+parser.add_argument('--replay-render-millis', type=str, default=None,
+                    help=('Only save replayed frames in these total_millis ranges, like ' +
+                          '"10000:20000,45000:50000". By default all frames are saved.'))
 
 
 class GameModeManager(object):
@@ -142,6 +206,31 @@ class GameModeManager(object):
 
         self.max_asteroid_count = 12
 
+        self.headless = self.args.headless == 'true'
+
+        self.dirty_rect_rendering = self.args.dirty_rect_rendering == 'true'
+
+        # replay of a recorded session, which runs headless
+        self.replay = None
+        if self.args.replay_log:
+            try:
+                self.replay = replay.LogReplay(
+                    self.args.replay_log,
+                    verify=self.args.replay_verify == 'true',
+                    render_dir=self.args.replay_render_dir,
+                    render_segments=(replay.parse_segments(self.args.replay_render_millis)
+                                     if self.args.replay_render_millis else None))
+            except (IOError, ValueError) as e:
+                print('Error: could not replay log "%s":' % self.args.replay_log, e)
+                return
+            self.headless = True
+            # rendered frames are saved whole
+            self.dirty_rect_rendering = False
+            if not self.args.subject_number:
+                self.args.subject_number = self.replay.subject_number
+            if not self.args.subject_run:
+                self.args.subject_run = self.replay.subject_run
+
         if self.args.script_json != None:
 
             with open(self.args.script_json) as f:
@@ -241,17 +330,18 @@ class GameModeManager(object):
                                + '" was not one of the expected values: ' + json.dumps(list(parity_options.keys()))))
                         return
 
-                # try opening serial port
-                try:
-                    print('opening serialport with options:', serialport_options)
-                    self.trigger_serialport = serial.Serial(**serialport_options)
-                    self.trigger_serialport_options = serialport_options
-                except serial.SerialException as e:
-                    print('could not open configured serial port')
-                    print(e)
-                    print('exiting.')
-                    # exit
-                    return
+                # try opening serial port. Replays take their triggers from the log instead
+                if not self.replay:
+                    try:
+                        print('opening serialport with options:', serialport_options)
+                        self.trigger_serialport = serial.Serial(**serialport_options)
+                        self.trigger_serialport_options = serialport_options
+                    except serial.SerialException as e:
+                        print('could not open configured serial port')
+                        print(e)
+                        print('exiting.')
+                        # exit
+                        return
 
             elif trigger_settings['mode'] == 'parallel':
                 self.trigger_mode = 'parallel'
@@ -319,8 +409,6 @@ class GameModeManager(object):
                     print('Invalid script JSON')
                     print('trigger_settings parallel_options trigger_status_value_hex and common_status_value_hex must have different values')
                     return
-
-                self.prev_parallel_trigger_status_value = 0xFF  # an impossible value
             elif trigger_settings['mode'] == 'none':
                 self.trigger_mode = None
             else:
@@ -587,6 +675,15 @@ class GameModeManager(object):
         else:
             print('No shuffling. Step order:', ', '.join(str(s['stepnumber']) for s in self.gamesteps))
 
+        if self.replay:
+            # play steps in the order of the replayed session, which may have been shuffled differently
+            try:
+                self.gamesteps = self.replay.ordered_steps(self.gamesteps)
+            except ValueError as e:
+                print('Error: could not replay log "%s":' % self.args.replay_log, e)
+                return
+            print('Replayed step order:', ', '.join(str(s['stepnumber']) for s in self.gamesteps))
+
         if self.args.parallel_test_address:
             # try to parse parallel port address
             pport_debug_addr = int(self.args.parallel_test_address, 16)
@@ -886,9 +983,18 @@ class GameModeManager(object):
 
         resources.music_volume = self.args.music_volume
         resources.effects_volume = self.args.effects_volume
-
-        if pygame.mixer:
-            pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=256)
+        resources.image_cache_dir = self.args.image_cache_dir
+        resources.image_size_quantum = self.args.image_size_quantum
+        if self.args.image_cache_max_mb is not None:
+            resources.image_cache_max_bytes = int(self.args.image_cache_max_mb * 1024 * 1024)
+
+        if self.headless:
+            # no window and no audio device:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        elif pygame.mixer:
+            pygame.mixer.pre_init(frequency=audioscheduler.MIXER_FREQUENCY, size=-16, channels=2,
+                                  buffer=audioscheduler.MIXER_BUFFER_SAMPLES)
 
         displayflags = pygame.DOUBLEBUF
         if args.display_mode == 'fullscreen':
@@ -901,11 +1007,18 @@ class GameModeManager(object):
                 os.environ['SDL_VIDEO_WINDOW_POS'] = \
                     "%d,%d" % (self.args.window_x, self.args.window_y)
         screensize = (self.args.display_width, self.args.display_height)
+        if self.replay:
+            # at the game's own resolution, logged cursor positions are exact mouse positions
+            screensize = virtualdisplay.GAME_AREA.size
         virtualdisplay.set_screensize(screensize)
 
         pygame.init()
 
-        if not pygame.mixer.get_init():
+        if self.headless:
+            # without the mixer, sounds load as NoneSound and music is skipped
+            if pygame.mixer:
+                pygame.mixer.quit()
+        elif not pygame.mixer.get_init():
             print('Warning, could not initialize mixer. Game will have no sound.')
 
         if self.args.list_modes:
@@ -917,12 +1030,34 @@ class GameModeManager(object):
 
         self.screen = pygame.display.set_mode(screensize, displayflags)
         pygame.display.set_caption('Asteroid Impact')
-        pygame.mouse.set_visible(0)
-        # capture mouse
-        pygame.event.set_grab(True)
+        if self.headless:
+            if self.replay:
+                self.headless_input = self.replay
+            elif self.args.headless_input:
+                self.headless_input = headless.ScriptedInput(self.args.headless_input)
+            else:
+                self.headless_input = headless.SyntheticInput(
+                    seed=self.args.headless_seed,
+                    trigger_key=self.trigger_key if self.trigger_mode == 'keyboard' else None)
+            gameinput.install_virtual_mouse(self.headless_input.mouse)
+        else:
+            self.headless_input = None
+            pygame.mouse.set_visible(0)
+            # capture mouse
+            pygame.event.set_grab(True)
 
         pygame.display.flip()
 
+        if self.args.preload_assets == 'true':
+            manifest = preload.manifest_for_steps(self.gamesteps)
+            seconds, memory_bytes = preload.preload(manifest)
+            print('preloaded %d images and %d sounds in %.2fs using %.1f MB' % (
+                len(manifest.images), len(manifest.sounds), seconds, memory_bytes / 1024. / 1024.))
+        image_disk_cache = resources.get_image_disk_cache()
+        if image_disk_cache is not None:
+            print('image cache "%s": %d scaled images loaded, %d saved' % (
+                image_disk_cache.directory, image_disk_cache.loaded, image_disk_cache.saved))
+
         # Init sequence of steps:
         self.stepindex = 0
         self.init_step()
@@ -933,6 +1068,8 @@ class GameModeManager(object):
         "setup for next game mode step"
         self.step_millis = 0
         self.step_trigger_count = 0
+        # step_millis when the most recent trigger on this step was received
+        self.step_trigger_millis = None
         self.step_max_trigger_count = 2 ** 64
         self.step_max_millis = None
         step = self.gamesteps[self.stepindex]
@@ -1137,30 +1274,73 @@ class GameModeManager(object):
             # exit
             return
 
-        clock = pygame.time.Clock()
+        headless_start_time = None
+        if self.headless:
+            # a replay also replays the logged frame durations
+            clock = self.replay if self.replay else headless.VirtualClock()
+            headless_start_time = time.time()
+            tick = clock.tick
+        elif self.args.frame_scheduler == 'busy-loop':
+            clock = pygame.time.Clock()
+            # more consistent, more cpu
+            tick = clock.tick_busy_loop
+        else:
+            # sleep most of each frame then busy wait for precision
+            # and read input events while sleeping, to timestamp them precisely
+            clock = FrameScheduler(self.args.frame_spin_millis, poll=gameinput.poll_events)
+            tick = clock.tick
 
         if pygame.mixer and pygame.mixer.get_init():
             resources.load_music('through space.ogg')
             resources.unmute_music()
             pygame.mixer.music.play(-1)
+            if self.args.audio_schedule_millis is not None:
+                if self.args.audio_schedule_millis < audioscheduler.MIN_DELAY_MILLIS:
+                    print(('Warning, --audio-schedule-millis %g is shorter than a frame plus its update. ' +
+                           'Prompt sounds will often be scheduled after they were due, and play late. ' +
+                           'Use at least %d.') % (self.args.audio_schedule_millis,
+                                                  audioscheduler.MIN_DELAY_MILLIS))
+                audioscheduler.scheduler = audioscheduler.AudioScheduler(self.args.audio_schedule_millis)
 
         asteroidlogger = AsteroidLogger(self.args.log_filename, self.args.log_overwrite == 'true',
-                                        self.max_asteroid_count)
+                                        self.max_asteroid_count, self.args.log_format)
         surveylogger = SurveyLogger(self.args.survey_log_filename, self.args.log_overwrite == 'true')
         reactionlogger = ReactionLogger(self.args.reaction_log_filename, self.args.log_overwrite == 'true')
         logrowdetails = {}
 
+        if self.args.frame_timing == 'true' or self.args.timing_log_filename:
+            frame_timer = FrameTimer(self.args.timing_log_filename, self.args.log_overwrite == 'true',
+                                     frame_scheduler=clock if isinstance(clock, FrameScheduler) else None)
+        else:
+            frame_timer = NoneFrameTimer()
+
+        # poll serial and parallel port triggers on a background thread, to timestamp them precisely
+        if self.replay:
+            # replays take their triggers from the log
+            trigger_input_thread = None
+        elif self.trigger_mode == 'serial' and self.trigger_serialport != None:
+            trigger_input_thread = TriggerInputThread(
+                SerialTriggerPoller(self.trigger_serialport, self.trigger_serialport_byte_value))
+        elif self.trigger_mode == 'parallel':
+            trigger_input_thread = TriggerInputThread(
+                ParallelTriggerPoller(
+                    self.get_parallel_trigger_status_value,
+                    self.trigger_parallel_port_off_value,
+                    self.trigger_parallel_port_on_value))
+        else:
+            trigger_input_thread = None
+
         self.total_millis = 0
 
         # cheesy 'framerate' display
         # mostly used to indicate if I'm getting 60fps or 30fps
         fps_display_enable = False
-        fps_sprite = Target(diameter=8)
+        fps_sprite = GameObjectSprite(Target(diameter=8))
         fps_sprite.rect.top = 0
         fps_sprite_group = pygame.sprite.Group([fps_sprite])
 
         # trigger blink sprite
-        trigger_blink_sprite = Target(diameter=32)
+        trigger_blink_sprite = GameObjectSprite(Target(diameter=32))
         trigger_blink_sprite.rect.top = 480 - 24
         trigger_blink_sprite.rect.left = 640 - 230
 
@@ -1184,17 +1364,19 @@ class GameModeManager(object):
         else:
             pport_debug_addr = None
 
+        # screens drawn last frame, for dirty rectangle rendering
+        previous_drawn_screens = []
+        previous_trigger_received = False
+
         # Main Loop
         first_update = True
         next_frame_outbound_triggers = []
         while 1:
-            # more consistent, more cpu
-            real_millis = clock.tick_busy_loop(60)
+            real_millis = tick(60)
+            tick_ns = perf_counter_ns()
             trigger_received_this_tick = False
-            # less repeatable, less cpu:
-            # real_millis = clock.tick(60)
 
-            if real_millis >= 25:
+            if real_millis >= 25 and not self.replay:
                 # if we're not getting 60fps, then run update() extra times
                 # find new frame durations that add-up to real_millis:
                 frames = int(round(real_millis * .001 * 60))
@@ -1203,15 +1385,21 @@ class GameModeManager(object):
             else:
                 millis_list = (real_millis,)
 
+            frame_timer.mark('wait')
+            frame_timer.next_frame(self.total_millis, real_millis, len(millis_list))
+
+            frame_millis_remaining = real_millis
             for millis in millis_list:
                 # used to indicate we should quit game after finishing update logic for this frame
                 quitgame = False
                 self.total_millis += millis
                 self.step_millis += millis
+                frame_millis_remaining -= millis
 
                 frame_start_gamescreenstack = self.gamescreenstack[:]
 
-                logrowdetails.clear()
+                # new dict each frame because the logger keeps the previous one to write later
+                logrowdetails = {}
                 logrowdetails['subject_number'] = self.args.subject_number
                 logrowdetails['subject_run'] = self.args.subject_run
                 logrowdetails['step_number'] = self.gamesteps[self.stepindex]['stepnumber']
@@ -1225,7 +1413,17 @@ class GameModeManager(object):
                     first_update = False
                     frame_outbound_triggers.append('step_begin')
 
-                events = pygame.event.get()
+                # game time of catch-up updates runs ahead of the frame clock
+                gameinput.set_frame_tick(tick_ns, self.step_millis + frame_millis_remaining)
+
+                if self.headless_input:
+                    self.headless_input.advance(self.total_millis)
+
+                events = gameinput.get_events()
+                # lower or restore volumes of mixed sounds that ended
+                resources.mixing_groups.handle_events(events)
+                # perf_counter_ns() times of triggers received
+                trigger_timestamps = []
                 # Handle Keyboard triggers
                 for event in events:
                     # check for keyboard trigger
@@ -1233,31 +1431,23 @@ class GameModeManager(object):
                             and self.trigger_key != None
                             and event.type == KEYDOWN
                             and event.key == self.trigger_key):
-                        self.step_trigger_count += 1
-                        trigger_received_this_tick = True
-
-                # Check for serial trigger:
-                if self.trigger_mode == 'serial' and self.trigger_serialport != None:
-                    serial_input = self.trigger_serialport.read()
-                    if serial_input:
-                        for c in serial_input:
-                            if ord(c) == self.trigger_serialport_byte_value:
-                                self.step_trigger_count += 1
-                                trigger_received_this_tick = True
-                        # debug print:
-                        print(">", repr(serial_input))
-                        sys.stdout.flush()
-
-                # check for parallel port trigger
-                if self.trigger_mode == 'parallel':
-                    current_parallel_trigger_status_value = self.get_parallel_trigger_status_value()
-                    if (self.prev_parallel_trigger_status_value == self.trigger_parallel_port_off_value and
-                            current_parallel_trigger_status_value == self.trigger_parallel_port_on_value):
-                        self.step_trigger_count += 1
-                        trigger_received_this_tick = True
-                    self.prev_parallel_trigger_status_value = current_parallel_trigger_status_value
+                        trigger_timestamps.append(event.timestamp_ns)
+
+                # Check for serial or parallel port triggers:
+                if trigger_input_thread:
+                    trigger_timestamps.extend(trigger_input_thread.get_trigger_timestamps())
+                if self.replay:
+                    trigger_timestamps.extend(self.replay.get_trigger_timestamps())
+
+                if trigger_timestamps:
+                    self.step_trigger_count += len(trigger_timestamps)
+                    trigger_received_this_tick = True
+                    self.step_trigger_millis = gameinput.step_millis_at(trigger_timestamps[-1])
 
                 logrowdetails['step_trigger_count'] = self.step_trigger_count
+                if self.step_trigger_millis is not None:
+                    logrowdetails['step_trigger_millis'] = self.step_trigger_millis
+                frame_timer.mark('input')
 
                 try:
                     if len(self.gamescreenstack) > 0:
@@ -1270,6 +1460,7 @@ class GameModeManager(object):
                                                  self.step_trigger_count, reactionlogger)
                 except QuitGame as e:
                     print(e)
+                    self.shutdown(clock, frame_timer, asteroidlogger, trigger_input_thread, headless_start_time)
                     return
 
                 # Handle Global Input Events
@@ -1313,16 +1504,29 @@ class GameModeManager(object):
                     # end this step
                     self.gamescreenstack = []
 
+                # end the step where the replayed log does, after input that isn't logged like survey answers
+                if self.replay and self.replay.step_ends() and len(self.gamescreenstack) > 0:
+                    self.replay.forced_step_ends += 1
+                    self.gamescreenstack = []
+
                 # call .after_close() on any now closed screens:
                 for s in reversed(frame_start_gamescreenstack):
                     if quitgame or s not in self.gamescreenstack:
                         s.after_close(logrowdetails, reactionlogger, surveylogger)
+                frame_timer.mark('update')
 
                 asteroidlogger.log(logrowdetails)
+                if self.replay:
+                    self.replay.verify(logrowdetails)
+                frame_timer.mark('log')
 
-                self.update_outbound_triggers(frame_outbound_triggers)
+                # replays don't send triggers to connected equipment
+                if not self.replay:
+                    self.update_outbound_triggers(frame_outbound_triggers)
+                frame_timer.mark('triggers')
 
                 if len(self.gamescreenstack) == 0:
+                    asteroidlogger.flush()
                     self.stepindex += 1
                     if self.stepindex >= len(self.gamesteps):
                         # all steps completed
@@ -1332,10 +1536,25 @@ class GameModeManager(object):
                         self.init_step()
                         next_frame_outbound_triggers.append('step_begin')
 
+                if (self.headless
+                        and self.args.headless_max_seconds != None
+                        and self.total_millis >= 1000 * self.args.headless_max_seconds):
+                    print('headless run reached --headless-max-seconds. Exiting')
+                    quitgame = True
+                if self.replay and self.replay.finished():
+                    print('replay reached the end of the log. Exiting')
+                    quitgame = True
+                frame_timer.mark('update')
+
                 # game quit is delayed to here so logging happens for final update
                 if quitgame:
+                    self.shutdown(clock, frame_timer, asteroidlogger, trigger_input_thread, headless_start_time)
                     return
 
+            if self.headless and not (self.replay and self.replay.rendering()):
+                # nothing to show, so skip drawing
+                continue
+
             # draw topmost opaque screen and everything above it
             topopaquescreenindex = -1
             for i in range(-1, -1 - len(self.gamescreenstack), -1):
@@ -1343,8 +1562,21 @@ class GameModeManager(object):
                 if self.gamescreenstack[i].opaque:
                     break
 
-            for screenindex in range(topopaquescreenindex, 0, 1):
-                self.gamescreenstack[screenindex].draw()
+            drawn_screens = self.gamescreenstack[topopaquescreenindex:]
+            if (self.dirty_rect_rendering
+                    and len(drawn_screens) == 1
+                    and drawn_screens == previous_drawn_screens
+                    and not fps_display_enable
+                    and not trigger_received_this_tick
+                    and not previous_trigger_received):
+                # same single screen as last frame, so only redraw what changed
+                update_rects = drawn_screens[0].draw_dirty()
+            else:
+                update_rects = None
+                for screenindex in range(topopaquescreenindex, 0, 1):
+                    self.gamescreenstack[screenindex].draw()
+            previous_drawn_screens = drawn_screens
+            previous_trigger_received = trigger_received_this_tick
 
             # cheesy 'no text' FPS display
             fps_sprite.rect.left = real_millis
@@ -1354,8 +1586,35 @@ class GameModeManager(object):
 
             if trigger_received_this_tick:
                 trigger_blink_sprites.draw(self.screen)
+            frame_timer.mark('draw')
 
-            pygame.display.flip()
+            if self.replay:
+                # replayed frames are saved instead of shown
+                self.replay.save_frame(self.screen)
+            else:
+                if update_rects is None:
+                    pygame.display.flip()
+                else:
+                    pygame.display.update(update_rects)
+                gameinput.record_display_flip()
+            frame_timer.mark('flip')
+
+    def shutdown(self, clock, frame_timer, asteroidlogger, trigger_input_thread, headless_start_time):
+        """Close the logs, stop background threads and print summaries, when the game loop quits"""
+        frame_timer.close()
+        asteroidlogger.close()
+        if trigger_input_thread:
+            trigger_input_thread.stop()
+        if audioscheduler.scheduler:
+            audioscheduler.scheduler.stop()
+            print(audioscheduler.scheduler.summary())
+        if self.headless:
+            wall_seconds = time.time() - headless_start_time
+            print('headless run simulated %d frames (%.1fs of game time) in %.1fs' % (
+                clock.frame_count, self.total_millis / 1000., wall_seconds))
+        if self.replay:
+            print(self.replay.summary())
+        print('scaled images: %d hits, %d misses, %d evictions' % resources.image_cache_stats())
 
     def get_parallel_trigger_status_value(self):
         # status byte is at base address + 1
@@ -0,0 +1,115 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Mouse input indirection and input timing for Asteroid Impact.
+
+Game code reads the mouse through these functions instead of calling ``pygame.mouse``
+directly. Normally they forward to pygame, but a virtual input source can be installed
+(see headless.py) so the game can run without a window or a real mouse.
+
+Events are read with get_events(), which stamps each event with the perf_counter_ns()
+time it was first read as ``event.timestamp_ns``. The frame scheduler also calls
+poll_events() while it waits between frames, so key presses and mouse clicks are
+timestamped to within about a millisecond instead of to the frame. step_millis_at()
+converts these timestamps, and the time of the most recent display flip, to step time.
+"""
+
+import pygame
+
+from frametiming import perf_counter_ns
+
+# when not None, an object with get_pos(), set_pos(pos) and get_pressed() methods
+# that replaces the physical mouse
+virtual_mouse = None
+
+
+def install_virtual_mouse(mouse):
+    """Replace the physical mouse with mouse. Pass None to restore the physical mouse."""
+    global virtual_mouse
+    virtual_mouse = mouse
+
+
+def get_mouse_pos():
+    """Return the mouse position in screen coordinates"""
+    if virtual_mouse is not None:
+        return virtual_mouse.get_pos()
+    return pygame.mouse.get_pos()
+
+
+def set_mouse_pos(pos):
+    """Move the mouse to pos in screen coordinates"""
+    if virtual_mouse is not None:
+        virtual_mouse.set_pos(pos)
+    else:
+        pygame.mouse.set_pos(pos)
+
+
+def get_mouse_pressed():
+    """Return (left, middle, right) mouse button states"""
+    if virtual_mouse is not None:
+        return virtual_mouse.get_pressed()
+    return pygame.mouse.get_pressed()
+
+
+# events read by poll_events() that haven't been returned by get_events() yet
+pending_events = []
+
+
+def poll_events():
+    """Read new events from pygame and timestamp them, keeping them for get_events()"""
+    events = pygame.event.get()
+    if events:
+        now = perf_counter_ns()
+        for event in events:
+            # events posted by a log replay already have their recorded time
+            if not hasattr(event, 'timestamp_ns'):
+                event.timestamp_ns = now
+            pending_events.append(event)
+
+
+def get_events():
+    """Return all events since the previous call, each with a timestamp_ns attribute"""
+    poll_events()
+    events = pending_events[:]
+    del pending_events[:]
+    return events
+
+
+# number of times the display was flipped, and perf_counter_ns() time of the most recent flip
+display_flip_count = 0
+display_flip_ns = None
+
+
+def record_display_flip():
+    """Note that the display was just flipped to show a new frame"""
+    global display_flip_count, display_flip_ns
+    display_flip_count += 1
+    display_flip_ns = perf_counter_ns()
+
+
+# perf_counter_ns() time of the current frame's clock tick, and the step time it corresponds to
+frame_tick_ns = 0
+frame_tick_step_millis = 0
+
+
+def set_frame_tick(tick_ns, step_millis):
+    """Set the step time in milliseconds of the current frame's clock tick at perf_counter_ns() tick_ns"""
+    global frame_tick_ns, frame_tick_step_millis
+    frame_tick_ns = tick_ns
+    frame_tick_step_millis = step_millis
+
+
+def step_millis_at(timestamp_ns):
+    """Return the step time in milliseconds, to the microsecond, at perf_counter_ns() timestamp_ns"""
+    return round(frame_tick_step_millis + (timestamp_ns - frame_tick_ns) * 1e-6, 3)
+
+
+def perf_counter_ns_at(step_millis):
+    """Return the perf_counter_ns() time at step time step_millis, the inverse of step_millis_at()"""
+    return frame_tick_ns + int(round((step_millis - frame_tick_step_millis) * 1e6))
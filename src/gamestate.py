@@ -0,0 +1,542 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Simulation state and behavior of the cursor, crystals, asteroids and power-ups.
+
+Game objects only have game coordinates (``gamerect``), visibility and the name of the
+image they are drawn with. They have no screen rectangle or image surface, so updating
+them doesn't do any drawing work, and headless batch runs such as ``difficulty.py`` can
+play levels without them. Each class uses ``__slots__`` to keep objects small and
+attribute access quick.
+
+The gameplay screens update the game objects, and draw them with
+``sprites.GameObjectSprite`` views that copy their state just before drawing.
+"""
+
+import pygame
+
+import gameinput
+import virtualdisplay
+from asteroidfield import FieldAttribute
+from resources import load_sound
+
+
+def map_range(value, from_low, from_high, to_low, to_high):
+    'return value in range [from_low, from_high] mapped to range [to_low, to_high]'
+    return to_low + (to_high - to_low) * (value - from_low) / (from_high - from_low)
+
+
+def clamp_range(value, limit_low, limit_high):
+    'return limit_low if value < limit_low, limit_high if value > limit_high, otherwise value'
+    if (value < limit_low): return limit_low
+    if (limit_high < value): return limit_high
+    return value
+
+
+class GameObject(object):
+    """
+    Game position/size (gamerect) and visibility of something in the game, drawn with
+    image file imagefile (or not drawn when imagefile is None)
+    """
+
+    __slots__ = ('gamerect', 'visible', 'pooled', 'imagefile')
+
+    def __init__(self):
+        self.gamerect = pygame.Rect(0, 0, 1, 1)
+        self.visible = 1
+        self.pooled = False
+        self.imagefile = None
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.gamerect)
+
+    def reset(self):
+        """Restore state to as created, for reuse from a spritepool"""
+        self.visible = 1
+
+    def set_gamerect(self, left, top, width, height):
+        """Move and resize gamerect in place"""
+        self.gamerect.left = left
+        self.gamerect.top = top
+        self.gamerect.width = width
+        self.gamerect.height = height
+
+    def stop_audio(self):
+        # override in derived classes
+        pass
+
+
+class Cursor(GameObject):
+    """The Player's ship is moved around using the mouse cursor"""
+
+    __slots__ = ('gamediameter', 'game_bounds')
+
+    def __init__(self, game_bounds=virtualdisplay.GAME_PLAY_AREA):
+        GameObject.__init__(self)
+        self.imagefile = 'cursor.png'
+        self.reset(game_bounds)
+
+    def reset(self, game_bounds=virtualdisplay.GAME_PLAY_AREA):
+        GameObject.reset(self)
+        self.gamediameter = 32
+        self.set_gamerect(0, 0, self.gamediameter, self.gamediameter)
+        self.game_bounds = game_bounds
+
+    def update(self, millis):
+        """Move the cursor based on the mouse position"""
+        pos = gameinput.get_mouse_pos()
+        game_pos = virtualdisplay.gamepoint_from_screenpoint(pos)
+
+        # if the cursor is outside of the game area, move it back
+        if not self.game_bounds.collidepoint(game_pos):
+            game_pos = (
+                max(
+                    min(game_pos[0], self.game_bounds.right),
+                    self.game_bounds.left),
+                max(
+                    min(game_pos[1], self.game_bounds.bottom),
+                    self.game_bounds.top))
+            pos = virtualdisplay.screenpoint_from_gamepoint(game_pos)
+            gameinput.set_mouse_pos(pos)
+
+        self.gamerect.center = game_pos
+
+
+class Target(GameObject):
+    """Targets (Crystals) don't move, but do play a sound when collected"""
+
+    __slots__ = ('gamediameter', 'pickup_sound')
+
+    def __init__(self, diameter=32, left=20, top=20):
+        GameObject.__init__(self)
+        self.imagefile = 'crystal.png'
+        self.pickup_sound = load_sound('ring_inventory.wav')
+        self.reset(diameter, left, top)
+
+    def reset(self, diameter=32, left=20, top=20):
+        GameObject.reset(self)
+        self.gamediameter = diameter
+        self.set_gamerect(left, top, diameter, diameter)
+
+    def stop_audio(self):
+        self.pickup_sound.stop()
+
+    def pickedup(self):
+        """Play pick up sound"""
+        self.pickup_sound.play()
+
+    def update(self, millis):
+        # hit test done in AsteroidImpactGameplayScreen
+        pass
+
+
+class ScoredTarget(GameObject):
+    """Targets (Crystals) don't move, but do play a sound when collected"""
+
+    __slots__ = (
+        'gamediameter', 'number', 'active', 'flashing', 'flashing_counter',
+        'lifetime_millis_max', 'lifetime_millis_elapsed', 'play_buzzer_on_negative_score',
+        'pickup_sound', 'pickup_sound_negative')
+
+    def __init__(self,
+                 diameter=32,
+                 left=20,
+                 top=20,
+                 imagefile='crystal.png',
+                 number='x',
+                 # None or milliseconds until crystal disappears on its own:
+                 lifetime_millis_max=None,
+                 play_buzzer_on_negative_score=True):
+        # todo: options for start/fadeout/end times
+        # todo: option for scoring-number
+        GameObject.__init__(self)
+        self.pickup_sound = load_sound('ring_inventory.wav')
+        self.pickup_sound_negative = load_sound('prompt_error.wav')
+        self.reset(diameter, left, top, imagefile, number, lifetime_millis_max, play_buzzer_on_negative_score)
+
+    def reset(self,
+              diameter=32,
+              left=20,
+              top=20,
+              imagefile='crystal.png',
+              number='x',
+              lifetime_millis_max=None,
+              play_buzzer_on_negative_score=True):
+        GameObject.reset(self)
+        self.gamediameter = diameter
+        self.set_gamerect(left, top, diameter, diameter)
+        self.imagefile = imagefile
+        self.number = number
+        self.visible = 0
+        self.active = False
+        self.flashing = False
+        self.flashing_counter = 0
+
+        # max time this crystal remains active
+        self.lifetime_millis_max = lifetime_millis_max
+        # current elapsed millis this crystal has been active
+        self.lifetime_millis_elapsed = 0
+
+        self.play_buzzer_on_negative_score = play_buzzer_on_negative_score
+
+    def activate(self, life_multiplier=1):
+        self.active = True
+        self.visible = 1
+        self.lifetime_millis_elapsed = 0
+        if life_multiplier > 1 and self.lifetime_millis_max != None:
+            # make this one appearance last n times as long by offsetting start of life
+            self.lifetime_millis_elapsed -= int((life_multiplier - 1) * self.lifetime_millis_max)
+        self.flashing = False
+        self.flashing_counter = 0
+
+    def deactivate(self):
+        self.active = False
+        self.visible = 0
+
+    def stop_audio(self):
+        self.pickup_sound.stop()
+        self.pickup_sound_negative.stop()
+
+    def pickedup(self, score=1):
+        """Play pick up sound"""
+        if self.play_buzzer_on_negative_score and score < 0:
+            self.pickup_sound_negative.play()
+        else:
+            self.pickup_sound.play()
+        self.deactivate()
+
+    def update(self, millis):
+        # hit test done in AsteroidImpactGameplayScreen
+        if self.active:
+            self.lifetime_millis_elapsed += millis
+
+            # start flashing before end of self.lifetime_millis_max
+            if (not self.flashing
+                    and self.lifetime_millis_max != None
+                    and self.lifetime_millis_max < self.lifetime_millis_elapsed + 2000):
+                self.flashing = True
+
+            if self.flashing:
+                self.flashing_counter = (self.flashing_counter + 1) % 8
+                self.visible = 1 if self.flashing_counter < 4 else 0
+            elif self.active:
+                self.flashing_counter = 0
+                self.visible = 1
+
+            if self.lifetime_millis_max != None and self.lifetime_millis_elapsed > self.lifetime_millis_max:
+                # deactivate myself
+                self.deactivate()
+
+
+class Asteroid(GameObject):
+    """Asteroids move in straight lines, bouncing off the edges of the game play area"""
+
+    # movement state, kept in the field's arrays while attached to one, and in the
+    # underscore-prefixed slots otherwise
+    gameleftfloat = FieldAttribute('gameleftfloat')
+    gametopfloat = FieldAttribute('gametopfloat')
+    dx = FieldAttribute('dx')
+    dy = FieldAttribute('dy')
+    dxnew = FieldAttribute('dxnew')
+    dynew = FieldAttribute('dynew')
+    speedfactor = FieldAttribute('speedfactor')
+    gamediameter = FieldAttribute('gamediameter')
+    gamediameternew_start_diameter = FieldAttribute('gamediameternew_start_diameter')
+    gamediameternew_end_diameter = FieldAttribute('gamediameternew_end_diameter')
+    gamediameternew_transition_duration_millis = FieldAttribute('gamediameternew_transition_duration_millis')
+    gamediameternew_transition_remaining_millis = FieldAttribute('gamediameternew_transition_remaining_millis')
+
+    __slots__ = (
+        # AsteroidField this asteroid's movement is stored in and updated by, if any
+        'field', 'field_index', 'GAME_PLAY_AREA',
+        '_gameleftfloat', '_gametopfloat', '_dx', '_dy', '_dxnew', '_dynew', '_speedfactor',
+        '_gamediameter', '_gamediameternew_start_diameter', '_gamediameternew_end_diameter',
+        '_gamediameternew_transition_duration_millis', '_gamediameternew_transition_remaining_millis')
+
+    def __init__(self, diameter=200, dx=4, dy=10, left=20, top=20, area=None):
+        GameObject.__init__(self)
+        self.imagefile = 'asteroid.png'
+        self.field = None
+        self.field_index = -1
+        self.reset(diameter, dx, dy, left, top, area)
+
+    def reset(self, diameter=200, dx=4, dy=10, left=20, top=20, area=None):
+        GameObject.reset(self)
+        if self.field is not None:
+            # released by a level that has ended. Its state goes back on the asteroid
+            self.field.detach(self)
+        self.gamediameter = diameter
+        self.set_gamerect(left, top, diameter, diameter)
+
+        if area:
+            self.GAME_PLAY_AREA = area
+        else:
+            self.GAME_PLAY_AREA = virtualdisplay.GAME_PLAY_AREA
+        # rect uses integer positions but I need to handle fractional pixel/frame speeds.
+        # store float x/y positions here:
+        self.gametopfloat = float(top)
+        self.gameleftfloat = float(left)
+        self.dx = dx
+        self.dy = dy
+        self.speedfactor = 1.0
+        self.gamediameternew_start_diameter = diameter
+        self.gamediameternew_end_diameter = diameter
+        self.gamediameternew_transition_duration_millis = 0
+        self.gamediameternew_transition_remaining_millis = 0
+        self.dxnew = self.dx
+        self.dynew = self.dy
+
+    def copy_from(self, asteroid):
+        self.gamediameter = asteroid.gamediameter
+        self.gamerect = asteroid.gamerect.copy()
+        self.GAME_PLAY_AREA = asteroid.GAME_PLAY_AREA
+        self.gametopfloat = asteroid.gametopfloat
+        self.gameleftfloat = asteroid.gameleftfloat
+        self.dx = asteroid.dx
+        self.dy = asteroid.dy
+        self.gamediameternew_start_diameter = asteroid.gamediameter
+        self.gamediameternew_end_diameter = asteroid.gamediameter
+        self.gamediameternew_transition_duration_millis = 0
+        self.gamediameternew_transition_remaining_millis = 0
+        self.dxnew = self.dx
+        self.dynew = self.dy
+
+    def update(self, millis):
+        """Update the position and direction of the Asteroid to move, and bounce"""
+        if self.field is not None:
+            # the field updates all of its asteroids at once
+            return
+
+        # handle size transition:
+        if (self.gamediameternew_transition_remaining_millis > 0):
+            self.gamediameternew_transition_remaining_millis -= millis
+            if (self.gamediameternew_transition_remaining_millis < 0):
+                self.gamediameternew_transition_remaining_millis = 0
+
+            # Transition diameter
+            newdiameter = int(round(
+                map_range(self.gamediameternew_transition_remaining_millis,
+                          self.gamediameternew_transition_duration_millis,
+                          0,
+                          self.gamediameternew_start_diameter,
+                          self.gamediameternew_end_diameter)))
+
+            center = self.gamerect.center
+            if (newdiameter != self.gamediameter):
+                self.gamediameter = newdiameter
+                self.gamerect.size = (newdiameter, newdiameter)
+                self.gamerect.center = center
+
+        # when bouncing, change from expected X or Y speed towards
+        # new speed by at most +/-4px/frame
+        adjusted_abs_dx = clamp_range(abs(self.dxnew), max(abs(self.dx) - 4, 1), abs(self.dx) + 4)
+        adjusted_abs_dy = clamp_range(abs(self.dynew), max(abs(self.dy) - 4, 1), abs(self.dy) + 4)
+
+        # bounce by setting sign of x or y speed if off of corresponding side of screen
+        if self.gamerect.left < self.GAME_PLAY_AREA.left:
+            self.dx = adjusted_abs_dx
+        if self.gamerect.right > self.GAME_PLAY_AREA.right:
+            self.dx = -adjusted_abs_dx
+        if self.gamerect.top < self.GAME_PLAY_AREA.top:
+            self.dy = adjusted_abs_dy
+        if self.gamerect.bottom > self.GAME_PLAY_AREA.bottom:
+            self.dy = -adjusted_abs_dy
+
+        self.gameleftfloat += self.dx * self.speedfactor
+        self.gametopfloat += self.dy * self.speedfactor
+        self.gamerect.left = self.gameleftfloat
+        self.gamerect.top = self.gametopfloat
+
+
+class BasePowerup(GameObject):
+    """Base class for power-ups so they share common expiration behavior"""
+
+    __slots__ = ('gamediameter', 'maxduration', 'active', 'duration', 'used', 'oldgamerect', 'type')
+
+    def __init__(self, diameter=16, left=50, top=50, maxduration=5.0):
+        GameObject.__init__(self)
+        BasePowerup.reset(self, diameter, left, top, maxduration)
+
+    def reset(self, diameter=16, left=50, top=50, maxduration=5.0):
+        GameObject.reset(self)
+        self.gamediameter = diameter
+        self.set_gamerect(left, top, diameter, diameter)
+
+        self.maxduration = maxduration  # seconds
+        self.active = False
+        self.duration = 0
+
+        self.used = False
+
+    def update(self, millis, frame_outbound_triggers, cursor, asteroids):
+        """Deactivate power-up if duration has expired"""
+        if self.active:
+            self.duration += millis / 1000.
+
+            if self.duration > self.maxduration:
+                # deactivate:
+                self.deactivate(cursor, asteroids, frame_outbound_triggers)
+
+    def activate(self, cursor, asteroids, frame_outbound_triggers, *args):
+        """Activate power-up because it was picked up"""
+        self.oldgamerect = self.gamerect.copy()
+        self.active = True
+        self.duration = 0
+        self.used = False
+
+    def deactivate(self, cursor, asteroids, frame_outbound_triggers):
+        """Deactivate power-up, hiding it until it's the available power-up again"""
+        self.active = False
+        self.gamerect = self.oldgamerect
+        self.used = True
+        self.visible = 0
+
+
+class SlowPowerup(BasePowerup):
+    """While active, the SlowPowerup slows the asteroids to a crawl"""
+
+    __slots__ = ('sound_begin', 'sound_end', 'sound_end_duration', 'sound_end_started', 'speedfactor')
+
+    def __init__(self, diameter=32, left=100, top=100):
+        BasePowerup.__init__(self, diameter=diameter, left=left, top=top, maxduration=5.0)
+        self.type = 'slow'
+        self.imagefile = 'clock.png'
+
+        self.sound_begin = load_sound('slow start.wav')
+        self.sound_end = load_sound('slow end.wav')
+        # these let me start the ending sound to end overlapping when the effect ends:
+        self.sound_end_duration = self.sound_end.get_length() - 0.5
+
+        self.speedfactor = 0.25
+        self.reset(diameter, left, top)
+
+    def reset(self, diameter=32, left=100, top=100):
+        BasePowerup.reset(self, diameter=diameter, left=left, top=top, maxduration=5.0)
+        self.sound_end_started = False
+
+    def stop_audio(self):
+        self.sound_end.stop()
+        self.sound_begin.stop()
+
+    def update(self, millis, frame_outbound_triggers, cursor, asteroids):
+        """ Play effect end sound if due"""
+        BasePowerup.update(self, millis, frame_outbound_triggers, cursor, asteroids)
+
+        if self.active:
+            # start the end effect sound to end when powerup ends:
+            if (self.maxduration - self.duration < self.sound_end_duration
+                    and not self.sound_end_started):
+                self.sound_end_started = True
+                self.sound_end.play()
+            for asteroid in asteroids:
+                asteroid.speedfactor = self.speedfactor
+
+    def activate(self, cursor, asteroids, frame_outbound_triggers, *args):
+        """Play start sound. Slow asteroids to a crawl"""
+        BasePowerup.activate(self, cursor, asteroids, frame_outbound_triggers, *args)
+
+        # adjust speed of asteroids
+        for asteroid in asteroids:
+            asteroid.speedfactor = self.speedfactor
+
+        # disappear offscreen
+        self.gamerect.top = -10000
+        self.gamerect.left = -10000
+
+        self.sound_begin.play()
+
+        self.sound_end_started = False
+
+        frame_outbound_triggers.append('game_slow_activate')
+
+    def deactivate(self, cursor, asteroids, frame_outbound_triggers, *args):
+        """Restore normal speed of asteroids"""
+        BasePowerup.deactivate(self, cursor, asteroids, frame_outbound_triggers, *args)
+
+        # restore speed of asteroids
+        for asteroid in asteroids:
+            asteroid.speedfactor = 1.0
+
+
+class ShieldPowerup(BasePowerup):
+    """
+    While active, the ShieldPowerup prevents the player from dying due to
+    collisions with asteroids.
+    """
+
+    __slots__ = ('sound_begin', 'sound_end', 'sound_end_duration', 'sound_end_started')
+
+    def __init__(self, diameter=32, left=80, top=80):
+        BasePowerup.__init__(self, diameter=diameter, left=left, top=top, maxduration=5.0)
+        self.type = 'shield'
+        self.imagefile = 'shield.png'
+
+        self.sound_begin = load_sound('shield start.wav')
+        self.sound_end = load_sound('shield end.wav')
+        # these let me start the ending sound to end overlapping when the effect ends:
+        self.sound_end_duration = self.sound_end.get_length() - 1.0
+        self.reset(diameter, left, top)
+
+    def reset(self, diameter=32, left=80, top=80):
+        BasePowerup.reset(self, diameter=diameter, left=left, top=top, maxduration=5.0)
+        self.sound_end_started = False
+
+    def stop_audio(self):
+        self.sound_begin.stop()
+        self.sound_end.stop()
+
+    def activate(self, cursor, asteroids, frame_outbound_triggers, *args):
+        """Play activation sound"""
+        BasePowerup.activate(self, cursor, asteroids, frame_outbound_triggers, *args)
+
+        self.sound_begin.play()
+
+        self.sound_end_started = False
+
+        frame_outbound_triggers.append('game_shield_activate')
+
+    def update(self, millis, frame_outbound_triggers, cursor, asteroids):
+        """Follow cursor. Play effect end sound if due"""
+        BasePowerup.update(self, millis, frame_outbound_triggers, cursor, asteroids)
+        if self.active:
+            # follow on top of cursor:
+            self.gamerect.center = cursor.gamerect.center
+
+            # "ignore collisions" logic happens in Game Screen
+
+            # start the end effect sound to end when powerup ends:
+            if (self.maxduration - self.duration < self.sound_end_duration
+                    and not self.sound_end_started):
+                self.sound_end_started = True
+                self.sound_end.play()
+
+
+class NonePowerup(BasePowerup):
+    """This power-up has no effect except delaying the next power-up from spawning"""
+
+    __slots__ = ()
+
+    def __init__(self, duration=10.0):
+        BasePowerup.__init__(self)
+        self.type = 'none'
+        self.reset(duration)
+
+    def reset(self, duration=10.0):
+        # configure as a circle completely covering the screen so I get picked up
+        # as soon as available
+        diameter = 10 * virtualdisplay.GAME_PLAY_AREA.width
+        self.set_gamerect(0, 0, diameter, diameter)
+        self.gamerect.centerx = virtualdisplay.GAME_PLAY_AREA.width // 2
+        self.gamerect.centery = virtualdisplay.GAME_PLAY_AREA.height // 2
+        BasePowerup.reset(
+            self,
+            diameter=diameter,
+            left=self.gamerect.left,
+            top=self.gamerect.top,
+            maxduration=duration)
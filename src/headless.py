@@ -0,0 +1,220 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Headless simulation support for Asteroid Impact.
+
+With ``--headless true`` the game runs without a window, without audio and without
+waiting for real time to pass. Every frame advances a fixed 16ms of game time, so a
+whole script runs as fast as the CPU allows and writes the same per-frame log as an
+interactive run.
+
+Input comes from either a scripted input JSON file (``--headless-input``) or a
+synthetic player that wanders the cursor around and clicks periodically.
+
+Scripted input JSON is a list of events (or an object with an ``"events"`` list).
+Each event has a ``"millis"`` time since the game started, and a ``"type"``:
+
+ * ``"mousemove"`` with ``"pos": [x, y]`` in game coordinates
+ * ``"mousedown"`` / ``"mouseup"`` with optional ``"button"`` (1 left, 2 middle, 3 right)
+ * ``"keydown"`` / ``"keyup"`` with ``"key"`` like ``"K_5"``
+
+Example::
+
+    [
+        {"millis": 500, "type": "mousedown", "button": 1},
+        {"millis": 600, "type": "mouseup", "button": 1},
+        {"millis": 1000, "type": "mousemove", "pos": [640, 400]},
+        {"millis": 2000, "type": "keydown", "key": "K_5"}
+    ]
+"""
+
+import json
+import random
+
+import pygame
+
+import virtualdisplay
+
+# game time that passes every headless frame
+FRAME_MILLIS = 16
+
+
+class VirtualClock(object):
+    """
+    Stand-in for pygame.time.Clock that reports a fixed frame duration immediately
+    instead of waiting for real time to pass.
+    """
+
+    def __init__(self, frame_millis=FRAME_MILLIS):
+        self.frame_millis = frame_millis
+        self.frame_count = 0
+
+    def tick_busy_loop(self, framerate=0):
+        """Advance one frame without waiting. Returns the frame duration in milliseconds"""
+        self.frame_count += 1
+        return self.frame_millis
+
+    def tick(self, framerate=0):
+        """Advance one frame without waiting. Returns the frame duration in milliseconds"""
+        return self.tick_busy_loop(framerate)
+
+    def get_time(self):
+        return self.frame_millis
+
+
+class VirtualMouse(object):
+    """Mouse position and button state that is set by headless input instead of hardware"""
+
+    def __init__(self):
+        self.pos = (virtualdisplay.screenarea.centerx, virtualdisplay.screenarea.centery)
+        self.pressed = [False, False, False]
+
+    def get_pos(self):
+        return self.pos
+
+    def set_pos(self, pos):
+        self.pos = (int(pos[0]), int(pos[1]))
+
+    def get_pressed(self):
+        return tuple(self.pressed)
+
+
+class HeadlessInput(object):
+    """
+    Base class for headless input sources.
+
+    advance() is called once per frame before events are read, and posts any events
+    due by that time to the pygame event queue.
+    """
+
+    def __init__(self):
+        self.mouse = VirtualMouse()
+
+    def advance(self, total_millis):
+        pass
+
+    def move_mouse(self, gamepos):
+        """Move the virtual mouse to gamepos and post a MOUSEMOTION event"""
+        oldpos = self.mouse.get_pos()
+        self.mouse.set_pos(virtualdisplay.screenpoint_from_gamepoint(gamepos))
+        newpos = self.mouse.get_pos()
+        pygame.event.post(pygame.event.Event(
+            pygame.MOUSEMOTION,
+            pos=newpos,
+            rel=(newpos[0] - oldpos[0], newpos[1] - oldpos[1]),
+            buttons=self.mouse.get_pressed()))
+
+    def press_mouse(self, button, down):
+        """Change virtual mouse button state and post the matching button event"""
+        if 1 <= button <= 3:
+            self.mouse.pressed[button - 1] = down
+        pygame.event.post(pygame.event.Event(
+            pygame.MOUSEBUTTONDOWN if down else pygame.MOUSEBUTTONUP,
+            pos=self.mouse.get_pos(),
+            button=button))
+
+    def press_key(self, key, down):
+        """Post a key event for the pygame key constant key"""
+        pygame.event.post(pygame.event.Event(
+            pygame.KEYDOWN if down else pygame.KEYUP,
+            key=key,
+            mod=0,
+            unicode='',
+            scancode=0))
+
+
+class ScriptedInput(HeadlessInput):
+    """Replays input events from a scripted input JSON file"""
+
+    def __init__(self, filename):
+        HeadlessInput.__init__(self)
+        with open(filename) as f:
+            script = json.load(f)
+        if isinstance(script, dict):
+            script = script['events']
+
+        self.events = []
+        for entry in script:
+            eventtype = entry['type']
+            if eventtype not in ('mousemove', 'mousedown', 'mouseup', 'keydown', 'keyup'):
+                raise ValueError('headless input event type of "%s" is not recognized' % eventtype)
+            if eventtype in ('keydown', 'keyup'):
+                if getattr(pygame, entry['key'], None) is None:
+                    raise ValueError('headless input key of "%s" is not recognized' % entry['key'])
+            self.events.append(entry)
+        # stable sort keeps same-time events in file order
+        self.events.sort(key=lambda e: float(e['millis']))
+        self.next_event_index = 0
+
+    def advance(self, total_millis):
+        while (self.next_event_index < len(self.events)
+               and float(self.events[self.next_event_index]['millis']) <= total_millis):
+            entry = self.events[self.next_event_index]
+            self.next_event_index += 1
+            eventtype = entry['type']
+            if eventtype == 'mousemove':
+                self.move_mouse(entry['pos'])
+            elif eventtype == 'mousedown' or eventtype == 'mouseup':
+                self.press_mouse(int(entry.get('button', 1)), eventtype == 'mousedown')
+            else:
+                self.press_key(getattr(pygame, entry['key']), eventtype == 'keydown')
+
+
+class SyntheticInput(HeadlessInput):
+    """
+    Generates repeatable input from a random seed: the cursor drifts towards random points
+    in the game play area, the left mouse button is clicked periodically (to get past
+    click-to-continue screens), and the trigger key is pressed periodically when the
+    script uses keyboard triggers.
+    """
+
+    def __init__(self, seed=0, cursor_speed=12, click_interval_millis=1000,
+                 trigger_key=None, trigger_interval_millis=2000):
+        HeadlessInput.__init__(self)
+        self.rnd = random.Random(seed)
+        self.cursor_speed = cursor_speed
+        self.click_interval_millis = click_interval_millis
+        self.trigger_key = trigger_key
+        self.trigger_interval_millis = trigger_interval_millis
+        self.gamepos = virtualdisplay.gamepoint_from_screenpoint(self.mouse.get_pos())
+        self.destination = self.gamepos
+        self.last_total_millis = 0
+        self.mouse_down = False
+
+    def advance(self, total_millis):
+        # cursor drifts towards destination, picking a new one on arrival
+        dx = self.destination[0] - self.gamepos[0]
+        dy = self.destination[1] - self.gamepos[1]
+        distance = (dx * dx + dy * dy) ** 0.5
+        if distance <= self.cursor_speed:
+            self.gamepos = self.destination
+            self.destination = (
+                self.rnd.randint(virtualdisplay.GAME_PLAY_AREA.left, virtualdisplay.GAME_PLAY_AREA.right),
+                self.rnd.randint(virtualdisplay.GAME_PLAY_AREA.top, virtualdisplay.GAME_PLAY_AREA.bottom))
+        else:
+            self.gamepos = (
+                self.gamepos[0] + dx * self.cursor_speed / distance,
+                self.gamepos[1] + dy * self.cursor_speed / distance)
+        self.move_mouse(self.gamepos)
+
+        if self.mouse_down:
+            self.mouse_down = False
+            self.press_mouse(1, False)
+        if (self.click_interval_millis
+                and total_millis // self.click_interval_millis != self.last_total_millis // self.click_interval_millis):
+            self.mouse_down = True
+            self.press_mouse(1, True)
+
+        if (self.trigger_key is not None
+                and self.trigger_interval_millis
+                and total_millis // self.trigger_interval_millis != self.last_total_millis // self.trigger_interval_millis):
+            self.press_key(self.trigger_key, True)
+            self.press_key(self.trigger_key, False)
+
+        self.last_total_millis = total_millis
@@ -8,7 +8,284 @@
 # work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>. 
 """CSV logger for AsteroidImpact game"""
 
+import atexit
+import json
 import os
+import struct
+import threading
+import zlib
+try:
+    import queue
+except ImportError:
+    # python 2.7
+    import Queue as queue
+
+# per-frame log columns, followed by asteroid_N_centerx, asteroid_N_centery and
+# asteroid_N_diameter for each asteroid. See asteroid_log_columns()
+ASTEROID_LOG_COLUMNS = [
+    # Number for this research participant (subject).
+    # This is specified on the command-line
+    'subject_number',
+    # Run number for this subject (specified on command-line)
+    'subject_run',
+    # milliseconds since application start
+    'total_millis',
+    # number of step in sequence, for example 1 for instructions then 2 for game
+    'step_number',
+    # milliseconds elapsed during this step. This resets to 0 on step change
+    'step_millis',
+    # of times trigger over serial or keyboard has been received on this step
+    'step_trigger_count',
+    # step_millis when the most recent trigger on this step was received, accurate
+    # to about 1.5ms for port triggers. Blank until the first trigger on this step
+    'step_trigger_millis',
+    # topmost screen name. Changes when mode change, but also inside of a mode
+    # such as the level complete and game over screen.
+    # instructions, gameplay, level_complete
+    'top_screen',
+    # game timer in milliseconds playing this level.
+    # This starts negative for the countdown. Collisions and power-ups become active at 0
+    'level_millis',
+    # name of level JSON file
+    'level_name',
+    # score used for choosing level in game-adaptive mode
+    'adaptive_level_score',
+    # 1 for first attempt at this level, incrementing on each failure of the same level
+    'level_attempt',
+    # countdown, playing, completed or dead
+    'level_state',
+    # number of targets collected in this level
+    'targets_collected',
+    # center position of current target
+    'target_x',
+    'target_y',
+    # the currently active powerup
+    'active_powerup',
+    # on-screen powerup
+    # these shouldn't be trusted while a powerup is active because
+    # active power-ups move around. A shield follows on top of the cursor
+    # and the slow powerup moves offscreen.
+    'powerup_x',
+    'powerup_y',
+    'powerup_diameter',
+    'powerup_type',
+    # adaptive-only multicolor-only score
+    'multicolor_crystal_score',
+
+    'cursor_x',
+    'cursor_y',
+
+    # question on current survey step
+    'survey_prompt',
+    # currently selected answer on current survey step
+    'survey_answer',
+    # 1-based position of currently selected answer on current survey step
+    'survey_answer_number',
+
+    # reaction prompt state
+    # only shows one active reaction prompts in per-frame log
+    # use reaction prompt log for results when reaction prompts overlap in visibility
+    'reaction_prompt_sound',
+    'reaction_prompt_image',
+    # reaction prompt state
+    # blank: no active reaction prompt
+    # "waiting": active reaction prompt is visible
+    # "complete": player pressed button to dismiss reaction prompt
+    # "failed": player pressed the wrong key, and prompt configured with fail_on_wrong_key true
+    # "timeout": player didn't press button in time
+    # "timeout_step_end": player didn't press button in time, and the prompt ended early because the step advanced
+    'reaction_prompt_state',
+    'reaction_prompt_millis',
+    # step_millis of the display flip that first showed the reaction prompt,
+    # to a fraction of a millisecond. Blank without a display (--headless)
+    'reaction_prompt_onset_millis',
+    # step_millis when the reaction prompt sound was handed to the mixer, to a fraction
+    # of a millisecond. Blank without sound (--headless, or no sound for the prompt)
+    'reaction_prompt_sound_onset_millis',
+    # step_millis when the key or mouse button that passed or failed the
+    # reaction prompt was pressed, to about a millisecond
+    'reaction_prompt_response_millis',
+    # true/false/blank for whether reaction prompt was passed
+    'reaction_prompt_passed',
+    # what key passed or failed the reaction prompt
+    'reaction_prompt_pressed_key'
+    ]
+
+# survey response log columns
+SURVEY_LOG_COLUMNS = [
+    # Number for this research participant (subject).
+    # This is specified on the command-line
+    'subject_number',
+    # Run number for this subject (specified on command-line)
+    'subject_run',
+    # milliseconds since application start
+    'total_millis',
+    # number of step in sequence, for example 1 for instructions then 2 for game
+    'step_number',
+    # milliseconds elapsed during this step. This resets to 0 on step change
+    'step_millis',
+    # of times trigger over serial or keyboard has been received on this step
+    'step_trigger_count',
+    # step_millis when the most recent trigger on this step was received, accurate
+    # to about 1.5ms for port triggers. Blank until the first trigger on this step
+    'step_trigger_millis',
+    # topmost screen name. Changes when mode change, but also inside of a mode
+    # such as the level complete and game over screen.
+    # instructions, gameplay, level_complete
+    'top_screen',
+    # question on current survey step
+    'survey_prompt',
+    # currently selected answer on current survey step
+    'survey_answer',
+    # 1-based position of currently selected answer on current survey step
+    'survey_answer_number',
+    ]
+
+# reaction prompt log columns
+REACTION_LOG_COLUMNS = [
+    # Number for this research participant (subject).
+    # This is specified on the command-line
+    'subject_number',
+    # Run number for this subject (specified on command-line)
+    'subject_run',
+    # milliseconds since application start
+    'total_millis',
+    # number of step in sequence, for example 1 for instructions then 2 for game
+    'step_number',
+    # milliseconds elapsed during this step. This resets to 0 on step change
+    'step_millis',
+    # of times trigger over serial or keyboard has been received on this step
+    'step_trigger_count',
+    # step_millis when the most recent trigger on this step was received, accurate
+    # to about 1.5ms for port triggers. Blank until the first trigger on this step
+    'step_trigger_millis',
+    # topmost screen name. Changes when mode change, but also inside of a mode
+    # such as the level complete and game over screen.
+    # instructions, gameplay, level_complete
+    'top_screen',
+    # game timer in milliseconds playing this level.
+    # This starts negative for the countdown. Collisions and power-ups become active at 0
+    'level_millis',
+    # name of level JSON file
+    'level_name',
+    # score used for choosing level in game-adaptive mode
+    'adaptive_level_score',
+    # 1 for first attempt at this level, incrementing on each failure of the same level
+    'level_attempt',
+    # countdown, playing, completed or dead
+    'level_state',
+    
+    # reaction prompt state
+    'reaction_prompt_sound',
+    'reaction_prompt_image',
+    # blank: no active reaction prompt
+    # "waiting": active reaction prompt is visible
+    # "complete": player pressed button to dismiss reaction prompt
+    # "timeout": player didn't press button in time
+    'reaction_prompt_state',
+    'reaction_prompt_millis',
+    # step_millis of the display flip that first showed the reaction prompt,
+    # to a fraction of a millisecond. Blank without a display (--headless)
+    'reaction_prompt_onset_millis',
+    # step_millis when the reaction prompt sound was handed to the mixer, to a fraction
+    # of a millisecond. Blank without sound (--headless, or no sound for the prompt)
+    'reaction_prompt_sound_onset_millis',
+    # step_millis when the key or mouse button that passed or failed the
+    # reaction prompt was pressed, to about a millisecond
+    'reaction_prompt_response_millis',
+    # true/false/blank for whether reaction prompt was passed
+    'reaction_prompt_passed',
+    # what key passed or failed the reaction prompt
+    'reaction_prompt_pressed_key'
+    ]
+
+# frame timing log columns, one row per displayed frame. See frametiming.FrameTimer
+TIMING_LOG_COLUMNS = [
+    # number of this frame since application start
+    'frame',
+    # milliseconds since application start, at the end of the frame's last update
+    'total_millis',
+    # milliseconds since the previous frame started, as measured by the frame clock
+    'real_millis',
+    # number of game updates run this frame. More than 1 when the game fell behind
+    # and caught up by running several 16ms updates in one frame
+    'update_count',
+    # nanoseconds the frame started after it was due on the frame schedule.
+    # blank with --frame-scheduler busy-loop
+    'late_ns',
+    # nanoseconds spent in each phase of the frame, summed over all its updates:
+    # waiting for the frame clock, after the previous frame was shown
+    'wait_ns',
+    # reading input events and input triggers
+    'input_ns',
+    # updating screens and game state
+    'update_ns',
+    # handing the per-frame log row to the logger
+    'log_ns',
+    # sending outbound triggers
+    'triggers_ns',
+    # drawing screens to the screen buffer
+    'draw_ns',
+    # pygame.display.flip() or pygame.display.update()
+    'flip_ns',
+    # total nanoseconds from the start of this frame to the start of the next
+    'frame_ns'
+    ]
+
+def asteroid_log_columns(max_asteroid_count):
+    """Returns per-frame log columns including those for max_asteroid_count asteroids"""
+    columns = list(ASTEROID_LOG_COLUMNS)
+    for i in range(1, max_asteroid_count+1):
+        # asteroid columns
+        prefix = ('asteroid_%d_' % i)
+        columns.append(prefix + 'centerx')
+        columns.append(prefix + 'centery')
+        columns.append(prefix + 'diameter')
+    return columns
+
+# binary log format. See BinaryRowEncoder
+BINARY_LOG_MAGIC = b'AIBINLOG'
+BINARY_LOG_VERSION = 2
+# row count and compressed length before each block of rows
+BINARY_LOG_BLOCK_HEADER = struct.Struct('<II')
+# struct format character for each binary log column type. strings are table indices
+BINARY_LOG_STRUCT_CODES = {'int16': 'h', 'int32': 'i', 'float64': 'd', 'string': 'i'}
+# stored value for a column missing from a row
+BINARY_LOG_MISSING = {'int16': -32768, 'int32': -2147483648, 'float64': float('nan'), 'string': -1}
+BINARY_LOG_INT_RANGES = {'int16': (-32767, 32767), 'int32': (-2147483647, 2147483647)}
+
+# binary log type of AsteroidLogger columns that aren't strings.
+# asteroid_* columns are all int16.
+ASTEROID_LOG_NUMERIC_COLUMN_TYPES = {
+    'total_millis': 'int32',
+    'step_number': 'int16',
+    'step_millis': 'int32',
+    'step_trigger_count': 'int32',
+    'step_trigger_millis': 'float64',
+    'level_millis': 'int32',
+    'adaptive_level_score': 'float64',
+    'level_attempt': 'int16',
+    'targets_collected': 'int16',
+    'target_x': 'int16',
+    'target_y': 'int16',
+    'powerup_x': 'int16',
+    'powerup_y': 'int16',
+    'powerup_diameter': 'int16',
+    'multicolor_crystal_score': 'int32',
+    'cursor_x': 'int16',
+    'cursor_y': 'int16',
+    'survey_answer_number': 'int16',
+    'reaction_prompt_millis': 'int32',
+    'reaction_prompt_onset_millis': 'float64',
+    'reaction_prompt_sound_onset_millis': 'float64',
+    'reaction_prompt_response_millis': 'float64',
+}
+
+def asteroid_log_column_type(column):
+    """Returns binary log type of AsteroidLogger column"""
+    if column.startswith('asteroid_'):
+        return 'int16'
+    return ASTEROID_LOG_NUMERIC_COLUMN_TYPES.get(column, 'string')
 
 def csv_escape(value):
     """return escaped and quoted as needed to be in a comma-separated CSV"""
@@ -18,271 +295,378 @@ def csv_escape(value):
     return value
 
 
+class NoneFile(object):
+    """stub file for logging"""
+    def write(self, data):
+        """write nothing to no log file"""
+        pass
+
+
+def open_log_file(filename, overwrite_file, description, mode='w'):
+    """Returns filename opened for writing, or a NoneFile when filename is blank"""
+    if not filename:
+        return NoneFile()
+    if os.path.exists(filename) and not overwrite_file:
+        print('Error: File "%s" exists and overwrite is not specified'%filename)
+        raise IOError('%s file exists and overwrite not specified'%description)
+    return open(filename, mode)
+
+
+class RowEncoder(object):
+    """
+    Base class for log row encoders.
+
+    Each row is built from a precomputed template with one slot per column, filled in
+    by looking up each key of the row dictionary in a column index. Keys that aren't
+    columns are reported once each, rather than on every row.
+    """
+    def __init__(self, columns, unknown_key_message, missing_values):
+        self.columns = columns
+        self.column_index = {col: i for i, col in enumerate(columns)}
+        self.template = missing_values
+        self.unknown_key_message = unknown_key_message
+        self.reported_unknown_keys = set()
+
+    def report_unknown_key(self, key):
+        """Print warning the first time key is logged"""
+        if key not in self.reported_unknown_keys:
+            self.reported_unknown_keys.add(key)
+            print(self.unknown_key_message%key)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CsvRowEncoder(RowEncoder):
+    """Formats row dictionaries as CSV lines"""
+    def __init__(self, columns, unknown_key_message):
+        RowEncoder.__init__(self, columns, unknown_key_message, [''] * len(columns))
+
+    def header(self):
+        """Returns the CSV header line"""
+        return self.encode_row({col:col for col in self.columns})
+
+    def encode_row(self, rowdict):
+        """Returns CSV line for the values in rowdict"""
+        column_index = self.column_index
+        cells = self.template[:]
+        for key, value in rowdict.items():
+            i = column_index.get(key)
+            if i is None:
+                self.report_unknown_key(key)
+            else:
+                cells[i] = csv_escape(str(value))
+        return ','.join(cells) + '\n'
+
+    def encode(self, batch):
+        """Returns CSV lines for the row dictionaries in batch"""
+        return ''.join([self.encode_row(rowdict) for rowdict in batch])
+
+
+class BinaryRowEncoder(RowEncoder):
+    """
+    Packs batches of row dictionaries into compressed blocks of fixed-width columns.
+
+    The log file starts with BINARY_LOG_MAGIC, a little-endian uint64 header length and
+    a JSON header describing the columns and their types. Blocks of rows follow from the
+    header's ``data_offset``, one per batch. Each block is BINARY_LOG_BLOCK_HEADER, with
+    its row count and compressed length, then the zlib-compressed values of the rows
+    column by column: all the block's values of the first column, then of the second, and
+    so on. Values of one column change little from frame to frame, and unused asteroid
+    columns are all missing, so the blocks compress to a small fraction of the CSV.
+
+    String values are stored as an index into a string table kept in a separate file next
+    to the log, with one JSON-encoded string per line. Missing values are stored as
+    BINARY_LOG_MISSING for the column type.
+
+    binarylog.py reads these files and converts them to CSV.
+    """
+    def __init__(self, logfile, stringsfile, strings_filename, columns, column_types, unknown_key_message):
+        """
+        Write header to logfile for columns. column_types maps column name to a key
+        of BINARY_LOG_STRUCT_CODES.
+        """
+        self.column_types = [column_types[col] for col in columns]
+        RowEncoder.__init__(self, columns, unknown_key_message,
+                            [BINARY_LOG_MISSING[t] for t in self.column_types])
+        self.logfile = logfile
+        self.stringsfile = stringsfile
+        self.struct_codes = [BINARY_LOG_STRUCT_CODES[t] for t in self.column_types]
+        self.string_indices = {}
+        # columns with a value that doesn't fit the column type, reported once each
+        self.mismatched_columns = set()
+
+        header = {
+            'format': 'asteroid_impact_binary_log',
+            'version': BINARY_LOG_VERSION,
+            'columns': [{'name': col, 'type': t} for col, t in zip(columns, self.column_types)],
+            'missing': {t: (None if t == 'float64' else m) for t, m in BINARY_LOG_MISSING.items()},
+            # bytes of one row's values, before compression
+            'record_size': struct.calcsize('<' + ''.join(self.struct_codes)),
+            'strings_filename': os.path.basename(strings_filename),
+            }
+        # records start at a multiple of 8 bytes after the header
+        header['data_offset'] = 0
+        while True:
+            header_bytes = json.dumps(header).encode('utf-8')
+            data_offset = (len(BINARY_LOG_MAGIC) + 8 + len(header_bytes) + 7) // 8 * 8
+            if data_offset == header['data_offset']:
+                break
+            header['data_offset'] = data_offset
+        header_bytes += b' ' * (data_offset - len(BINARY_LOG_MAGIC) - 8 - len(header_bytes))
+        self.logfile.write(BINARY_LOG_MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes)
+
+    def value_for_column(self, value, column_type, key):
+        """Returns value converted for a record field of column_type"""
+        if column_type == 'string':
+            value = str(value)
+            index = self.string_indices.get(value)
+            if index is None:
+                index = len(self.string_indices)
+                self.string_indices[value] = index
+                self.stringsfile.write(json.dumps(value) + '\n')
+            return index
+        if column_type == 'float64':
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return float(value)
+        elif (isinstance(value, int) and not isinstance(value, bool)
+                and BINARY_LOG_INT_RANGES[column_type][0] <= value <= BINARY_LOG_INT_RANGES[column_type][1]):
+            return value
+        if key not in self.mismatched_columns:
+            self.mismatched_columns.add(key)
+            print('value %r for column "%s" does not fit binary log type %s. Logged as missing'%(
+                value, key, column_type))
+        return BINARY_LOG_MISSING[column_type]
+
+    def encode(self, batch):
+        """Returns a compressed block of the row dictionaries in batch"""
+        if not batch:
+            return b''
+        rows = []
+        column_index = self.column_index
+        column_types = self.column_types
+        for rowdict in batch:
+            values = self.template[:]
+            for key, value in rowdict.items():
+                i = column_index.get(key)
+                if i is None:
+                    self.report_unknown_key(key)
+                else:
+                    values[i] = self.value_for_column(value, column_types[i], key)
+            rows.append(values)
+        row_count = len(rows)
+        columns = b''.join([struct.pack('<%d%s' % (row_count, code), *column_values)
+                            for code, column_values in zip(self.struct_codes, zip(*rows))])
+        compressed = zlib.compress(columns)
+        return BINARY_LOG_BLOCK_HEADER.pack(row_count, len(compressed)) + compressed
+
+    def flush(self):
+        """Flush string table file"""
+        self.stringsfile.flush()
+
+    def close(self):
+        self.stringsfile.close()
+
+
+class BackgroundRowWriter(object):
+    """
+    Encodes and writes log rows on a background thread.
+
+    The game thread only appends row dictionaries to a batch, and hands each full batch
+    to the writer thread through a bounded queue. The writer thread does the formatting
+    with encoder and writes each batch with a single large write, so the game thread
+    doesn't wait on disk I/O.
+
+    If writing fails, the writer thread keeps the exception and stops, and the exception
+    is raised on the game thread by the next append(), flush() or close().
+    """
+    def __init__(self, logfile, encoder, batch_rows=60, max_queued_batches=64):
+        """Start writer thread for logfile, formatting rows with encoder"""
+        self.logfile = logfile
+        self.encoder = encoder
+        self.batch_rows = batch_rows
+        self.batch = []
+        # only blocks the game thread if the writer falls max_queued_batches batches behind
+        self.queue = queue.Queue(max_queued_batches)
+        # exception that stopped the writer thread, until it's raised on the game thread
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='BackgroundRowWriter')
+        self.thread.daemon = True
+        self.thread.start()
+        self.closed = False
+        # still write out queued rows if the game exits on an unhandled exception
+        atexit.register(self.close)
+
+    def append(self, rowdict):
+        """Queue rowdict to be written. rowdict must not be modified afterwards"""
+        self.batch.append(rowdict)
+        if len(self.batch) >= self.batch_rows:
+            self.put((self.batch, False))
+            self.batch = []
+
+    def flush(self):
+        """Hand queued rows to the writer thread, and have it flush the file afterwards"""
+        self.put((self.batch, True))
+        self.batch = []
+
+    def close(self):
+        """Write all queued rows, stop the writer thread and close the file"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.thread.is_alive():
+                self.flush()
+                self.put(None)
+                self.thread.join()
+            self.raise_error()
+        finally:
+            self.encoder.close()
+            if hasattr(self.logfile, 'close'):
+                self.logfile.close()
+
+    def put(self, item):
+        """Hand item to the writer thread, raising the exception that stopped it if it stopped"""
+        while True:
+            self.raise_error()
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                # a stopped writer thread would never make room
+                if not self.thread.is_alive():
+                    self.raise_error()
+                    raise IOError('log writer thread stopped')
+
+    def raise_error(self):
+        """Raise the exception that stopped the writer thread, once"""
+        error = self.error
+        if error is not None:
+            self.error = None
+            raise error
+
+    def run(self):
+        """Writer thread: encode and write batches until close()"""
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                batch, flush_file = item
+                if batch:
+                    self.logfile.write(self.encoder.encode(batch))
+                if flush_file:
+                    self.encoder.flush()
+                    if hasattr(self.logfile, 'flush'):
+                        self.logfile.flush()
+        except Exception as e:
+            print('Log writer stopped after error:', e)
+            self.error = e
+
+
 class AsteroidLogger(object):
     """Game state logger for AsteroidImpact game"""
-    def __init__(self, filename, overwrite_file, max_asteroid_count = 12):
-        """Create new AsteroidLogger"""
-        # make output log file
-        class NoneFile(object):
-            """stub file for logging"""
-            def write(self, data):
-                """write nothing to no log file"""
-                pass
-
-        if filename:
-            if os.path.exists(filename) and not overwrite_file:
-                print('Error: File "%s" exists and overwrite is not specified'%filename)
-                raise IOError('CSV Log file exists and overwrite not specified')
-            self.logfile = open(filename, 'w')
+    def __init__(self, filename, overwrite_file, max_asteroid_count = 12, log_format = 'csv'):
+        """
+        Create new AsteroidLogger.
+
+        log_format is 'csv' or 'binary'. See BinaryRowEncoder for the binary format.
+        """
+        if not filename:
+            log_format = 'csv'
+        strings_filename = '%s.strings'%filename
+        if log_format == 'binary' and os.path.exists(strings_filename) and not overwrite_file:
+            print('Error: File "%s" exists and overwrite is not specified'%strings_filename)
+            raise IOError('Binary Log strings file exists and overwrite not specified')
+        self.logfile = open_log_file(filename, overwrite_file, 'CSV Log',
+                                     'wb' if log_format == 'binary' else 'w')
+
+        self.columns = asteroid_log_columns(max_asteroid_count)
+
+        unknown_key_message = 'key "%s" not in known list of columns. Not included in log'
+        if log_format == 'binary':
+            encoder = BinaryRowEncoder(
+                self.logfile,
+                open(strings_filename, 'w'),
+                strings_filename,
+                self.columns,
+                {col: asteroid_log_column_type(col) for col in self.columns},
+                unknown_key_message)
         else:
-            self.logfile = NoneFile()
-
-        self.columns = [
-            # Number for this research participant (subject).
-            # This is specified on the command-line
-            'subject_number',
-            # Run number for this subject (specified on command-line)
-            'subject_run',
-            # milliseconds since application start
-            'total_millis',
-            # number of step in sequence, for example 1 for instructions then 2 for game
-            'step_number',
-            # milliseconds elapsed during this step. This resets to 0 on step change
-            'step_millis',
-            # of times trigger over serial or keyboard has been received on this step
-            'step_trigger_count',
-            # topmost screen name. Changes when mode change, but also inside of a mode
-            # such as the level complete and game over screen.
-            # instructions, gameplay, level_complete
-            'top_screen',
-            # game timer in milliseconds playing this level.
-            # This starts negative for the countdown. Collisions and power-ups become active at 0
-            'level_millis',
-            # name of level JSON file
-            'level_name',
-            # score used for choosing level in game-adaptive mode
-            'adaptive_level_score',
-            # 1 for first attempt at this level, incrementing on each failure of the same level
-            'level_attempt',
-            # countdown, playing, completed or dead
-            'level_state',
-            # number of targets collected in this level
-            'targets_collected',
-            # center position of current target
-            'target_x',
-            'target_y',
-            # the currently active powerup
-            'active_powerup',
-            # on-screen powerup
-            # these shouldn't be trusted while a powerup is active because
-            # active power-ups move around. A shield follows on top of the cursor
-            # and the slow powerup moves offscreen.
-            'powerup_x',
-            'powerup_y',
-            'powerup_diameter',
-            'powerup_type',
-            # adaptive-only multicolor-only score
-            'multicolor_crystal_score',
-
-            'cursor_x',
-            'cursor_y',
-
-            # question on current survey step
-            'survey_prompt',
-            # currently selected answer on current survey step
-            'survey_answer',
-            # 1-based position of currently selected answer on current survey step
-            'survey_answer_number',
-
-            # reaction prompt state
-            # only shows one active reaction prompts in per-frame log
-            # use reaction prompt log for results when reaction prompts overlap in visibility
-            'reaction_prompt_sound',
-            'reaction_prompt_image',
-            # reaction prompt state
-            # blank: no active reaction prompt
-            # "waiting": active reaction prompt is visible
-            # "complete": player pressed button to dismiss reaction prompt
-            # "failed": player pressed the wrong key, and prompt configured with fail_on_wrong_key true
-            # "timeout": player didn't press button in time
-            # "timeout_step_end": player didn't press button in time, and the prompt ended early because the step advanced
-            'reaction_prompt_state',
-            'reaction_prompt_millis',
-            # true/false/blank for whether reaction prompt was passed
-            'reaction_prompt_passed',
-            # what key passed or failed the reaction prompt
-            'reaction_prompt_pressed_key'
-            ]
-            
-        for i in range(1, max_asteroid_count+1):
-            # asteroid columns
-            prefix = ('asteroid_%d_' % i)
-            self.columns.append(prefix + 'centerx')
-            self.columns.append(prefix + 'centery')
-            self.columns.append(prefix + 'diameter')
-
-        self.columns_set = set(self.columns)
+            encoder = CsvRowEncoder(self.columns, unknown_key_message)
+            # write headers
+            self.logfile.write(encoder.header())
 
-        # write headers
-        self.log({col:col for col in self.columns})
+        # rows are formatted and written on a background thread
+        self.writer = BackgroundRowWriter(self.logfile, encoder)
 
     def log(self, rowdict):
-        """Save new log row for values in rowdict"""
-        for i, key in enumerate(self.columns):
-            if i > 0:
-                self.logfile.write(',')
-            if key in rowdict:
-                self.logfile.write(csv_escape(str(rowdict[key])))
-        self.logfile.write('\n')
-
-        # validation: check for keys in rowdict that aren't in columns
-        for key in list(rowdict.keys()):
-            if not key in self.columns_set:
-                print('key "%s" not in known list of columns. Not included in log'%key)
-
-class SurveyLogger(object):
-    """Survey response logger for for AsteroidImpact game"""
-    def __init__(self, filename, overwrite_file):
-        """Create new SurveyLogger"""
-        # make output log file
-        class NoneFile(object):
-            """stub file for logging"""
-            def write(self, data):
-                """write nothing to no log file"""
-                pass
-
-        if filename:
-            if os.path.exists(filename) and not overwrite_file:
-                print('Error: File "%s" exists and overwrite is not specified'%filename)
-                raise IOError('CSV Survey Log file exists and overwrite not specified')
-            self.logfile = open(filename, 'w')
-        else:
-            self.logfile = NoneFile()
-
-        self.columns = [
-            # Number for this research participant (subject).
-            # This is specified on the command-line
-            'subject_number',
-            # Run number for this subject (specified on command-line)
-            'subject_run',
-            # milliseconds since application start
-            'total_millis',
-            # number of step in sequence, for example 1 for instructions then 2 for game
-            'step_number',
-            # milliseconds elapsed during this step. This resets to 0 on step change
-            'step_millis',
-            # of times trigger over serial or keyboard has been received on this step
-            'step_trigger_count',
-            # topmost screen name. Changes when mode change, but also inside of a mode
-            # such as the level complete and game over screen.
-            # instructions, gameplay, level_complete
-            'top_screen',
-            # question on current survey step
-            'survey_prompt',
-            # currently selected answer on current survey step
-            'survey_answer',
-            # 1-based position of currently selected answer on current survey step
-            'survey_answer_number',
-            ]
-
-        self.columns_set = set(self.columns)
+        """
+        Save new log row for values in rowdict.
+
+        The row is written later on a background thread, so rowdict must not be modified
+        after it is logged.
+        """
+        self.writer.append(rowdict)
 
+    def flush(self):
+        """Write out rows logged so far, without waiting for them to be written"""
+        self.writer.flush()
+
+    def close(self):
+        """Write out all logged rows and close the log file"""
+        self.writer.close()
+
+class TimingLogger(object):
+    """Frame timing logger for AsteroidImpact game"""
+    def __init__(self, filename, overwrite_file):
+        """Create new TimingLogger saving TIMING_LOG_COLUMNS to filename"""
+        self.logfile = open_log_file(filename, overwrite_file, 'CSV Timing Log')
+        self.columns = TIMING_LOG_COLUMNS
+        encoder = CsvRowEncoder(
+            self.columns, 'key "%s" not in known list of timing columns. Not included in log')
         # write headers
-        self.log({col:col for col in self.columns})
+        self.logfile.write(encoder.header())
+        self.writer = BackgroundRowWriter(self.logfile, encoder)
 
     def log(self, rowdict):
-        """Save new log row for values in rowdict"""
-        for i, key in enumerate(self.columns):
-            if i > 0:
-                self.logfile.write(',')
-            if key in rowdict:
-                self.logfile.write(csv_escape(str(rowdict[key])))
-        self.logfile.write('\n')
-
-        # validation: check for keys in rowdict that aren't in columns
-        for key in list(rowdict.keys()):
-            if not key in self.columns_set:
-                print('key "%s" not in known list of survey columns. Not included in log'%key)
-
-class ReactionLogger(object):
-    """Reaction prompt logger for AsteroidImpact game"""
-    def __init__(self, filename, overwrite_file):
-        """Create new ReactionLogger"""
-        # make output log file
-        class NoneFile(object):
-            """stub file for logging"""
-            def write(self, data):
-                """write nothing to no log file"""
-                pass
-
-        if filename:
-            if os.path.exists(filename) and not overwrite_file:
-                print('Error: File "%s" exists and overwrite is not specified'%filename)
-                raise IOError('CSV Log file exists and overwrite not specified')
-            self.logfile = open(filename, 'w')
-        else:
-            self.logfile = NoneFile()
-
-        self.columns = [
-            # Number for this research participant (subject).
-            # This is specified on the command-line
-            'subject_number',
-            # Run number for this subject (specified on command-line)
-            'subject_run',
-            # milliseconds since application start
-            'total_millis',
-            # number of step in sequence, for example 1 for instructions then 2 for game
-            'step_number',
-            # milliseconds elapsed during this step. This resets to 0 on step change
-            'step_millis',
-            # of times trigger over serial or keyboard has been received on this step
-            'step_trigger_count',
-            # topmost screen name. Changes when mode change, but also inside of a mode
-            # such as the level complete and game over screen.
-            # instructions, gameplay, level_complete
-            'top_screen',
-            # game timer in milliseconds playing this level.
-            # This starts negative for the countdown. Collisions and power-ups become active at 0
-            'level_millis',
-            # name of level JSON file
-            'level_name',
-            # score used for choosing level in game-adaptive mode
-            'adaptive_level_score',
-            # 1 for first attempt at this level, incrementing on each failure of the same level
-            'level_attempt',
-            # countdown, playing, completed or dead
-            'level_state',
-            
-            # reaction prompt state
-            'reaction_prompt_sound',
-            'reaction_prompt_image',
-            # blank: no active reaction prompt
-            # "waiting": active reaction prompt is visible
-            # "complete": player pressed button to dismiss reaction prompt
-            # "timeout": player didn't press button in time
-            'reaction_prompt_state',
-            'reaction_prompt_millis',
-            # true/false/blank for whether reaction prompt was passed
-            'reaction_prompt_passed',
-            # what key passed or failed the reaction prompt
-            'reaction_prompt_pressed_key'
-            ]
-            
-        self.columns_set = set(self.columns)
+        """Save new log row for values in rowdict. rowdict must not be modified afterwards"""
+        self.writer.append(rowdict)
+
+    def close(self):
+        """Write out all logged rows and close the log file"""
+        self.writer.close()
+
+class RowLogger(object):
+    """CSV logger that writes each row as soon as it is logged"""
+    def __init__(self, filename, overwrite_file, description, columns, unknown_key_message):
+        """Create new RowLogger saving columns to filename"""
+        self.logfile = open_log_file(filename, overwrite_file, description)
+        self.columns = columns
+        self.encoder = CsvRowEncoder(self.columns, unknown_key_message)
 
         # write headers
-        self.log({col:col for col in self.columns})
+        self.logfile.write(self.encoder.header())
 
     def log(self, rowdict):
         """Save new log row for values in rowdict"""
-        for i, key in enumerate(self.columns):
-            if i > 0:
-                self.logfile.write(',')
-            if key in rowdict:
-                self.logfile.write(csv_escape(str(rowdict[key])))
-        self.logfile.write('\n')
-
-        # validation: check for keys in rowdict that aren't in columns
-        for key in list(rowdict.keys()):
-            if not key in self.columns_set:
-                print('key "%s" not in known list of columns. Not included in log'%key)
+        self.logfile.write(self.encoder.encode_row(rowdict))
+
+class SurveyLogger(RowLogger):
+    """Survey response logger for for AsteroidImpact game"""
+    def __init__(self, filename, overwrite_file):
+        """Create new SurveyLogger"""
+        RowLogger.__init__(
+            self, filename, overwrite_file, 'CSV Survey Log', SURVEY_LOG_COLUMNS,
+            'key "%s" not in known list of survey columns. Not included in log')
+
+class ReactionLogger(RowLogger):
+    """Reaction prompt logger for AsteroidImpact game"""
+    def __init__(self, filename, overwrite_file):
+        """Create new ReactionLogger"""
+        RowLogger.__init__(
+            self, filename, overwrite_file, 'CSV Log', REACTION_LOG_COLUMNS,
+            'key "%s" not in known list of columns. Not included in log')
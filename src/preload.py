@@ -0,0 +1,177 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Loading of the images and sounds a script needs before its first step.
+
+``resources.load_image()`` scales an image the first time each size is requested, and
+builds all the power-of-two sizes the first time an image is loaded. During gameplay
+that happens in the frame an asteroid first grows or shrinks through a size, or a
+crystal color or reaction prompt is first shown, and can make that frame late.
+
+Before the first step, the game collects an :class:`AssetManifest` of every image, size,
+opacity and sound the game steps of the script can need, and loads them so they're
+already in the ``resources`` caches when the steps start. Screen backgrounds, fonts and
+the instruction screens aren't included, because they're loaded when the step's screen
+is made, before its first frame.
+"""
+
+import time
+
+import pygame
+
+import makelevel
+import resources
+import virtualdisplay
+
+# diameter of the cursor, in game units
+CURSOR_DIAMETER = 32
+# diameter of reaction prompts without a diameter in the script
+REACTION_PROMPT_DIAMETER = 64
+
+# image and sounds of each type of powerup
+POWERUP_IMAGES = {'shield': 'shield.png', 'slow': 'clock.png'}
+POWERUP_SOUNDS = {
+    'shield': ['shield start.wav', 'shield end.wav'],
+    'slow': ['slow start.wav', 'slow end.wav']}
+
+# named asteroid_sizes of level templates, see makelevel.make_level()
+ASTEROID_SIZES_BY_NAME = {
+    'small': makelevel.SMALL_SIZES,
+    'medium': makelevel.MEDIUM_SIZES,
+    'large': makelevel.LARGE_SIZES,
+    'varied': makelevel.VARIED_SIZES}
+
+
+class AssetManifest(object):
+    """Images and sounds to load before the first step"""
+
+    def __init__(self):
+        # (name, screen size, convert_alpha, opacity) of images
+        self.images = set()
+        # (name, mixing_group) of sounds
+        self.sounds = set()
+
+    def add_image(self, name, gamediameter, opacity=255, quantize=True):
+        """
+        Add image name drawn as a square sprite gamediameter game units wide, at opacity.
+        Game object sprites load their images with quantize, reaction prompts don't.
+        """
+        size = virtualdisplay.screenrect_from_gamerect(pygame.Rect(0, 0, gamediameter, gamediameter)).size
+        if quantize:
+            size = resources.quantize_size(size)
+        self.images.add((name, size, True, 255))
+        if opacity < 255:
+            self.images.add((name, size, True, opacity))
+
+    def add_sound(self, name, mixing_group=None):
+        """Add sound name, as loaded by resources.load_sound()"""
+        self.sounds.add((name, mixing_group))
+
+    def add_reaction_prompts(self, reaction_prompts, opacity):
+        """Add images and sounds of reaction_prompts settings from the script JSON"""
+        for settings in reaction_prompts or []:
+            image = settings.get('image', 'triangle.png')
+            if not image or image == 'none':
+                image = 'transparent.png'
+            self.add_image(image, settings.get('diameter', REACTION_PROMPT_DIAMETER), opacity, quantize=False)
+            sound = settings.get('sound', 'tone440.wav')
+            if sound and sound != 'none':
+                self.add_sound(sound, mixing_group='reaction')
+            if settings.get('pass_fail_sounds'):
+                self.add_sound('prompt_correct.wav', mixing_group='reaction')
+                self.add_sound('prompt_error.wav', mixing_group='reaction')
+
+    def add_game_step(self, step):
+        """Add assets of a "game" step, after its levels were loaded to step['levellist']"""
+        opacity = step_opacity(step)
+        self.add_image('cursor.png', CURSOR_DIAMETER, opacity)
+        self.add_image('crystal.png', makelevel.TARGET_SIZE, opacity)
+        self.add_sound('ring_inventory.wav')
+        self.add_sound('DeathFlash.wav')
+        for level in step['levellist']:
+            for asteroid in level['asteroids']:
+                self.add_image('asteroid.png', asteroid['diameter'], opacity)
+            for powerup in level.get('powerup_list', []):
+                self.add_powerup(powerup['type'], powerup.get('diameter', makelevel.TARGET_SIZE), opacity)
+        self.add_reaction_prompts(step.get('reaction_prompts'), opacity)
+
+    def add_adaptive_step(self, step):
+        """Add assets of a "game-adaptive" step, after its templates were loaded to step['level_templates_list']"""
+        opacity = step_opacity(step)
+        self.add_image('cursor.png', CURSOR_DIAMETER, opacity)
+        if step.get('multicolor_crystal_scoring'):
+            crystal_numbers = step.get('multicolor_crystal_numbers') or [-1]
+            if crystal_numbers[0] == -1:
+                crystal_numbers = [1]
+        else:
+            crystal_numbers = [-1]
+        for number in crystal_numbers:
+            self.add_image('Crystal_%i.png' % number if number >= 1 else 'crystal.png',
+                           makelevel.TARGET_SIZE, opacity)
+        self.add_sound('ring_inventory.wav')
+        self.add_sound('prompt_error.wav')
+        self.add_sound('DeathFlash.wav')
+
+        sizes = []
+        asteroid_counts = set()
+        for template in step['level_templates_list']:
+            asteroid_sizes = template.get('asteroid_sizes', 'large')
+            sizes += ASTEROID_SIZES_BY_NAME.get(asteroid_sizes, asteroid_sizes)
+            asteroid_counts.add(template.get('asteroid_count', 3))
+            powerup_types = template.get('powerup_types', 'all')
+            if powerup_types == 'all':
+                powerup_types = ['shield', 'slow']
+            elif isinstance(powerup_types, str):
+                powerup_types = [powerup_types]
+            for powerup_type in powerup_types:
+                self.add_powerup(powerup_type, makelevel.TARGET_SIZE, opacity)
+        if sizes:
+            # asteroids grow or shrink through every size between their old and new
+            # sizes, and shrink away to 1 when the next level has fewer asteroids
+            smallest = 1 if len(asteroid_counts) > 1 else min(sizes)
+            for diameter in range(smallest, max(sizes) + 1):
+                self.add_image('asteroid.png', diameter, opacity)
+        self.add_reaction_prompts(step.get('reaction_prompts'), opacity)
+
+    def add_powerup(self, powerup_type, gamediameter, opacity):
+        """Add image and sounds of a powerup of type powerup_type from a level"""
+        if powerup_type in POWERUP_IMAGES:
+            self.add_image(POWERUP_IMAGES[powerup_type], gamediameter, opacity)
+        for sound in POWERUP_SOUNDS.get(powerup_type, []):
+            self.add_sound(sound)
+
+
+def step_opacity(step):
+    """Returns game_element_opacity of step, limited to 1-255 the same as the gameplay screens do"""
+    return min(max(1, step.get('game_element_opacity', 255)), 255)
+
+
+def manifest_for_steps(gamesteps):
+    """Returns AssetManifest of the game and game-adaptive steps in list gamesteps"""
+    manifest = AssetManifest()
+    for step in gamesteps:
+        if step['action'] == 'game':
+            manifest.add_game_step(step)
+        elif step['action'] == 'game-adaptive':
+            manifest.add_adaptive_step(step)
+    return manifest
+
+
+def preload(manifest):
+    """
+    Load every image and sound in AssetManifest manifest into the resources caches.
+    Returns (seconds, bytes) taken and the memory the caches grew by.
+    """
+    start = time.perf_counter()
+    bytes_before = resources.cache_memory_bytes()
+    for name, size, convert_alpha, opacity in sorted(manifest.images):
+        resources.load_image(name, size, convert_alpha=convert_alpha, opacity=opacity)
+    for name, mixing_group in sorted(manifest.sounds, key=lambda sound: (sound[0], sound[1] or '')):
+        resources.load_sound(name, mixing_group=mixing_group)
+    return time.perf_counter() - start, resources.cache_memory_bytes() - bytes_before
@@ -0,0 +1,269 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Replay of a recorded session from its per-frame log.
+
+With ``--replay-log`` the game runs headless, as fast as the CPU allows, and re-simulates
+the session recorded in a per-frame log (CSV, or binary written with ``--log-format
+binary``). Every logged row is replayed as one game update of the same duration, with
+the input rebuilt from the log:
+
+ * the mouse is moved so the cursor is where the log has it
+ * input triggers are received when ``step_trigger_count`` goes up, at ``step_trigger_millis``
+ * reaction prompts are passed or failed with the logged ``reaction_prompt_pressed_key``
+ * steps end when the logged ``step_number`` changes, which also covers input that isn't
+   logged, such as survey answers and clicks to continue
+
+Each replayed row is compared to the logged row, and the differences are summarized at
+the end. Selected segments can also be rendered to PNG images, one per frame, to be
+assembled into a video.
+
+A replay needs the same script JSON and level files as the recorded session. Levels of
+``game-adaptive`` steps are seeded from a checksum of their level template, so they're
+the same in every run.
+"""
+
+import collections
+import csv
+import os
+
+import pygame
+
+import binarylog
+import gameinput
+from headless import FRAME_MILLIS, HeadlessInput
+from logger import BINARY_LOG_MAGIC
+
+# columns that can't be replayed headless, and aren't compared
+UNVERIFIED_COLUMNS = set([
+    # needs the display flip that showed the prompt
+    'reaction_prompt_onset_millis',
+    # needs the mixer that played the prompt sound
+    'reaction_prompt_sound_onset_millis',
+    ])
+
+
+def read_rows(filename):
+    """Yields each row of CSV or binary per-frame log filename as a dictionary of CSV cell text"""
+    with open(filename, 'rb') as f:
+        is_binary = f.read(len(BINARY_LOG_MAGIC)) == BINARY_LOG_MAGIC
+    if is_binary:
+        columns = [c['name'] for c in binarylog.read_header(filename)['columns']]
+        for values in binarylog.iter_rows(filename):
+            yield dict(zip(columns, ['' if value is None else str(value) for value in values]))
+    else:
+        with open(filename, 'r') as f:
+            reader = csv.reader(f)
+            columns = next(reader, [])
+            for values in reader:
+                # a log the game didn't close may end in a partly written row
+                if len(values) == len(columns):
+                    yield dict(zip(columns, values))
+
+
+def values_match(logged, replayed):
+    """Returns whether logged and replayed CSV cell text are the same value"""
+    if logged == replayed:
+        return True
+    try:
+        # binary logs save some whole numbers as floats
+        return float(logged) == float(replayed)
+    except ValueError:
+        return False
+
+
+def parse_segments(text):
+    """Returns list of (start, end) total_millis ranges for text like '1000:5000,20000:25000'"""
+    segments = []
+    for segment in text.split(','):
+        start, end = segment.split(':')
+        segments.append((float(start), float(end)))
+    return segments
+
+
+class LogReplay(HeadlessInput):
+    """
+    Replays a per-frame log. Stands in for the frame clock as well as being the
+    headless input, because each frame replays the duration of one logged row.
+    """
+
+    def __init__(self, filename, verify=True, render_dir=None, render_segments=None, max_reported_mismatches=10):
+        """
+        Open per-frame log filename for replay.
+
+        When render_dir is specified, frames are saved to it as PNG images, only during the
+        (start, end) total_millis ranges of render_segments if that isn't None.
+        """
+        HeadlessInput.__init__(self)
+        self.filename = filename
+        self.verify_rows = verify
+        self.render_dir = render_dir
+        self.render_segments = render_segments
+        if render_dir and not os.path.isdir(render_dir):
+            os.makedirs(render_dir)
+        self.max_reported_mismatches = max_reported_mismatches
+
+        # order of steps in the log, from a first pass that only looks at step_number
+        self.step_numbers = []
+        for row in read_rows(filename):
+            if not self.step_numbers or self.step_numbers[-1] != row['step_number']:
+                self.step_numbers.append(row['step_number'])
+
+        self.rows = read_rows(filename)
+        self.previous_row = None
+        self.row = None
+        self.next_row = next(self.rows, None)
+        if self.next_row is None:
+            raise ValueError('log has no rows')
+        self.subject_number = self.next_row.get('subject_number', '')
+        self.subject_run = self.next_row.get('subject_run', '')
+        self.frame_count = 0
+        # mouse buttons pressed by the previous update, which are released on the next
+        self.pressed_buttons = []
+
+        self.compared_rows = 0
+        self.mismatched_rows = 0
+        self.mismatched_columns = collections.Counter()
+        self.forced_step_ends = 0
+
+    def ordered_steps(self, gamesteps):
+        """
+        Returns gamesteps in the order they were played in the log, which may differ from
+        the script JSON when steps were shuffled. Steps that weren't played follow.
+        """
+        steps_by_number = {str(step['stepnumber']): step for step in gamesteps}
+        ordered = []
+        for step_number in self.step_numbers:
+            if step_number not in steps_by_number:
+                raise ValueError('step %s of replayed log is not in the script' % step_number)
+            ordered.append(steps_by_number[step_number])
+        return ordered + [step for step in gamesteps if step not in ordered]
+
+    def tick(self, framerate=0):
+        """Advance to the next logged row. Returns its duration in milliseconds"""
+        self.frame_count += 1
+        self.previous_row = self.row
+        self.row = self.next_row
+        self.next_row = next(self.rows, None)
+        if self.row is None:
+            return FRAME_MILLIS
+        if self.previous_row is None:
+            return int(self.row['total_millis'])
+        return int(self.row['total_millis']) - int(self.previous_row['total_millis'])
+
+    def tick_busy_loop(self, framerate=0):
+        return self.tick(framerate)
+
+    def get_time(self):
+        return FRAME_MILLIS
+
+    def timestamp_ns_at(self, step_millis):
+        """Returns perf_counter_ns() time that gameinput.step_millis_at() converts to step_millis"""
+        return gameinput.frame_tick_ns + int(round((float(step_millis) - gameinput.frame_tick_step_millis) * 1e6))
+
+    def advance(self, total_millis):
+        """Post the input events of the current row. Called after gameinput.set_frame_tick()"""
+        row = self.row
+        if row is None:
+            return
+        for button in self.pressed_buttons:
+            self.press_mouse(button, False)
+        self.pressed_buttons = []
+
+        if row.get('cursor_x') and row.get('cursor_y'):
+            # replays run at the game's own resolution, so game and screen positions are the same
+            self.move_mouse((int(row['cursor_x']), int(row['cursor_y'])))
+
+        pressed_key = row.get('reaction_prompt_pressed_key')
+        # only logged when a reaction prompt was passed or failed, even if another prompt
+        # logged its state on the same row
+        if pressed_key:
+            timestamp_ns = gameinput.perf_counter_ns()
+            if row.get('reaction_prompt_response_millis'):
+                timestamp_ns = self.timestamp_ns_at(row['reaction_prompt_response_millis'])
+            if pressed_key.startswith('K_MOUSE'):
+                button = int(pressed_key[len('K_MOUSE'):])
+                self.mouse.pressed[button - 1] = True
+                pygame.event.post(pygame.event.Event(
+                    pygame.MOUSEBUTTONDOWN, pos=self.mouse.get_pos(), button=button, timestamp_ns=timestamp_ns))
+                self.pressed_buttons.append(button)
+            elif getattr(pygame, pressed_key, None) is not None:
+                pygame.event.post(pygame.event.Event(
+                    pygame.KEYDOWN, key=getattr(pygame, pressed_key), mod=0, unicode='', scancode=0,
+                    timestamp_ns=timestamp_ns))
+
+    def get_trigger_timestamps(self):
+        """Returns perf_counter_ns() times of the input triggers received on the current row"""
+        row = self.row
+        if row is None or not row.get('step_trigger_count'):
+            return []
+        previous_count = 0
+        if self.previous_row is not None and self.previous_row['step_number'] == row['step_number']:
+            previous_count = int(self.previous_row['step_trigger_count'] or 0)
+        count = int(row['step_trigger_count']) - previous_count
+        if count <= 0:
+            return []
+        if row.get('step_trigger_millis'):
+            timestamp_ns = self.timestamp_ns_at(row['step_trigger_millis'])
+        else:
+            timestamp_ns = gameinput.perf_counter_ns()
+        return [timestamp_ns] * count
+
+    def step_ends(self):
+        """Returns whether the current row is the last of its step"""
+        return (self.row is not None and self.next_row is not None
+                and self.next_row['step_number'] != self.row['step_number'])
+
+    def finished(self):
+        """Returns whether the current row is the last row of the log"""
+        return self.next_row is None
+
+    def verify(self, logrowdetails):
+        """Compare replayed log row logrowdetails to the current logged row"""
+        if not self.verify_rows or self.row is None:
+            return
+        self.compared_rows += 1
+        mismatches = []
+        for column, logged in self.row.items():
+            if column in UNVERIFIED_COLUMNS:
+                continue
+            replayed = logrowdetails.get(column)
+            replayed = '' if replayed is None else str(replayed)
+            if not values_match(logged, replayed):
+                mismatches.append((column, logged, replayed))
+        if mismatches:
+            self.mismatched_rows += 1
+            for column, logged, replayed in mismatches:
+                self.mismatched_columns[column] += 1
+            if self.mismatched_rows <= self.max_reported_mismatches:
+                print('replay differs from log at total_millis %s: %s' % (self.row['total_millis'], ', '.join(
+                    ['%s logged %r replayed %r' % mismatch for mismatch in mismatches])))
+
+    def rendering(self):
+        """Returns whether the current frame should be rendered"""
+        if not self.render_dir or self.row is None:
+            return False
+        if self.render_segments is None:
+            return True
+        total_millis = int(self.row['total_millis'])
+        return any([start <= total_millis <= end for start, end in self.render_segments])
+
+    def save_frame(self, screen):
+        """Save screen as the PNG image of the current frame"""
+        pygame.image.save(screen, os.path.join(self.render_dir, 'frame_%09d.png' % int(self.row['total_millis'])))
+
+    def summary(self):
+        """Returns text summary of how the replay compared to the log"""
+        lines = ['Replayed %d rows of "%s". %d steps ended where the log did without their own input' % (
+            self.frame_count, self.filename, self.forced_step_ends)]
+        if self.verify_rows:
+            lines.append('%d of %d replayed rows differ from the log' % (self.mismatched_rows, self.compared_rows))
+            for column, count in self.mismatched_columns.most_common():
+                lines.append('  %s differs on %d rows' % (column, count))
+        return '\n'.join(lines)
@@ -11,7 +11,13 @@ Resource-loading utilities for AsteroidImpact
 """
 
 
+import collections
+import hashlib
+import json
+import mmap
 import os, sys, pygame
+import threading
+import weakref
 import pygame.ftfont
 
 # Changing these only takes effect on newly loaded sounds
@@ -22,9 +28,43 @@ effects_volume = 1.0
 # scaledimage_cache[(some,key)] returns a ScaledImageCache
 # see load_image()
 scaledimage_cache = {}
+# held while looking up and adding to scaledimage_cache, which the level prefetch
+# thread also loads images into
+scaledimage_cache_lock = threading.Lock()
+
+# scaledimage_source[image] is (ScaledImageCache, size) that made image, for as long as
+# image exists, even after its cache evicted it. see image_at_opacity()
+scaledimage_source = weakref.WeakKeyDictionary()
+
+# directory of scaled images saved by earlier runs, or None to always scale them
+# see ImageDiskCache. Only takes effect on images loaded after it's set
+image_cache_dir = None
+
+# ImageDiskCache for image_cache_dir, see get_image_disk_cache()
+image_disk_caches = {}
+
+# sizes of sprites loaded with quantize are rounded down to a multiple of this many pixels,
+# so sprites that grow or shrink share images of nearby sizes. See quantize_size()
+image_size_quantum = 1
+
+# most bytes of scaled images each image file keeps, dropping the least recently used
+# sizes first, or None to keep every size. Power-of-two sizes are always kept.
+# Only takes effect on images loaded after it's set
+image_cache_max_bytes = None
 
 sound_cache = {}
 
+# font_cache[(name, size)] is the font returned by load_font()
+font_cache = {}
+
+# text_caches[(font, color)] is the TextCache for text in that font and color
+# see get_text_cache()
+text_caches = {}
+
+# characters drawn from a glyph atlas instead of rendering the whole string, when
+# the font keeps their ink inside their advance width
+GLYPH_ATLAS_CHARACTERS = '0123456789.,:+-% '
+
 def resource_path(filename):
     """
     Return transformed resource path.
@@ -40,7 +80,13 @@ def resource_path(filename):
 
 #functions to create our resources
 def load_font(name, size):
-    'Load pygame font for specified filename, font size'
+    'Load pygame font for specified filename, font size. Fonts are cached, so the same font object is shared'
+    key = (name, size)
+    if key not in font_cache:
+        font_cache[key] = _load_font(name, size)
+    return font_cache[key]
+
+def _load_font(name, size):
     fullname = resource_path(os.path.join('data', name))
 
     if pygame.ftfont:
@@ -60,41 +106,255 @@ def load_font(name, size):
 
     return NoneFont(fullname, size)
 
+class TextCache(object):
+    """
+    Rendered text in one font and color.
+
+    Text made only of GLYPH_ATLAS_CHARACTERS, optionally after a label ending in a
+    space such as 'Score: ', is laid out from glyphs rendered once, so numbers that
+    change every frame don't render anything. The label and all other text is
+    rendered whole and kept in a least recently used cache of max_strings strings.
+    """
+    def __init__(self, font, color, max_strings=128):
+        self.font = font
+        self.color = color
+        self.max_strings = max_strings
+        # self.strings[text] is text rendered whole, most recently used last
+        self.strings = collections.OrderedDict()
+        # self.glyphs[c] is (surface, advance width) of character c
+        self.glyphs = {}
+        self.glyph_height = None
+        self.hits = 0
+        self.misses = 0
+        self.laid_out = 0
+        if not hasattr(font, 'metrics'):
+            # NoneFont
+            return
+        for c in GLYPH_ATLAS_CHARACTERS:
+            metrics = font.metrics(c)
+            if not metrics or metrics[0] is None:
+                continue
+            minx, maxx, miny, maxy, advance = metrics[0][:5]
+            surface = font.render(c, 1, color)
+            # only glyphs that draw exactly as they do within a whole string
+            if (minx >= 0 and maxx <= advance and surface.get_width() == int(advance)
+                    and surface.get_height() == font.size(c)[1]):
+                self.glyphs[c] = (surface, int(advance))
+                self.glyph_height = surface.get_height()
+
+    def render(self, text):
+        'Return text rendered whole, from the cache when rendered recently'
+        surface = self.strings.get(text)
+        if surface is not None:
+            self.hits += 1
+            # most recently used last
+            del self.strings[text]
+            self.strings[text] = surface
+            return surface
+        self.misses += 1
+        surface = self.font.render(text, 1, self.color)
+        self.strings[text] = surface
+        if len(self.strings) > self.max_strings:
+            self.strings.popitem(last=False)
+        return surface
+
+    def layout(self, text):
+        """
+        Return (size, parts) for drawing text, where parts is a list of (surface, x)
+        to draw left to right at x from the left of the text.
+        """
+        glyphs = self.glyphs
+        # characters after the label are drawn from the glyph atlas
+        start = len(text)
+        while start > 0 and text[start - 1] in glyphs:
+            start -= 1
+        if start > 0:
+            # the label has to end with a space, so none of its ink reaches the glyphs
+            start = text.rfind(' ', start) + 1
+            if start == 0:
+                start = len(text)
+        if start == len(text):
+            surface = self.render(text)
+            return surface.get_size(), [(surface, 0)]
+
+        parts = []
+        x = 0
+        if start > 0:
+            label = self.render(text[:start])
+            if label.get_height() != self.glyph_height:
+                surface = self.render(text)
+                return surface.get_size(), [(surface, 0)]
+            parts.append((label, 0))
+            x = label.get_width()
+        self.laid_out += 1
+        for c in text[start:]:
+            surface, advance = glyphs[c]
+            parts.append((surface, x))
+            x += advance
+        return (x, self.glyph_height), parts
+
+def get_text_cache(font, color):
+    'Return the TextCache for text in font and color'
+    key = (font, tuple(color))
+    if key not in text_caches:
+        text_caches[key] = TextCache(font, tuple(color))
+    return text_caches[key]
+
+def buffer_format(convert_alpha):
+    """
+    Return (format, zero_copy) for saving images converted with convert_alpha() (or
+    convert()) as raw pixel buffers, for pygame.image.tobytes() and frombuffer().
+    zero_copy is whether a buffer in that format can be drawn without converting it.
+    """
+    if convert_alpha:
+        converted = pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha()
+        formats = ['BGRA', 'RGBA', 'ARGB']
+    else:
+        converted = pygame.Surface((1, 1)).convert()
+        formats = ['RGBX']
+    for fmt in formats:
+        if pygame.image.frombuffer(bytearray(4), (1, 1), fmt).get_masks() == converted.get_masks():
+            return fmt, True
+    return formats[0], False
+
+class ImageDiskCache(object):
+    """
+    Directory of scaled images saved as raw pixel buffers by earlier runs.
+
+    Files are named for the SHA-1 hash of the image file, whether it's converted with
+    alpha, and the scaled size, so changed image files and other display resolutions
+    don't use old files. Saved images are memory mapped and drawn straight from the
+    mapping when the display's pixel format allows it.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # self.source_hashes[filename] is the SHA-1 hex digest of image file filename
+        self.source_hashes = {}
+        # self.formats[convert_alpha] is (format, zero_copy) from buffer_format()
+        self.formats = {}
+        self.loaded = 0
+        self.saved = 0
+
+    def source_key(self, filename, convert_alpha):
+        'Return key of the scaled images of image file filename'
+        if filename not in self.source_hashes:
+            with open(filename, 'rb') as f:
+                self.source_hashes[filename] = hashlib.sha1(f.read()).hexdigest()
+        return '%s-%s' % (self.source_hashes[filename], 'alpha' if convert_alpha else 'opaque')
+
+    def buffer_format(self, convert_alpha):
+        if convert_alpha not in self.formats:
+            self.formats[convert_alpha] = buffer_format(convert_alpha)
+        return self.formats[convert_alpha]
+
+    def load_source_size(self, source_key):
+        'Return saved (width, height) of the image file for source_key, or None'
+        try:
+            with open(os.path.join(self.directory, source_key + '.json')) as f:
+                return tuple(json.load(f)['size'])
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def save_source_size(self, source_key, size):
+        self.write(source_key + '.json', json.dumps(dict(size=list(size))).encode('utf-8'))
+
+    def filename(self, source_key, size):
+        return os.path.join(self.directory, '%s-%dx%d.raw' % (source_key, size[0], size[1]))
+
+    def load(self, source_key, size, convert_alpha):
+        'Return saved image for source_key scaled to size, or None'
+        fmt, zero_copy = self.buffer_format(convert_alpha)
+        try:
+            with open(self.filename(source_key, size), 'rb') as f:
+                if os.fstat(f.fileno()).st_size != size[0] * size[1] * 4:
+                    # partly written
+                    return None
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, ValueError):
+            return None
+        # the image keeps the mapping open
+        image = pygame.image.frombuffer(buffer, size, fmt)
+        if not zero_copy:
+            image = image.convert_alpha() if convert_alpha else image.convert()
+        self.loaded += 1
+        return image
+
+    def save(self, source_key, image, convert_alpha):
+        'Save image scaled from the image file for source_key'
+        fmt, zero_copy = self.buffer_format(convert_alpha)
+        self.write(os.path.basename(self.filename(source_key, image.get_size())),
+                   pygame.image.tobytes(image, fmt))
+        self.saved += 1
+
+    def write(self, name, data):
+        # write to a temporary file first, so other runs never load part of a file
+        filename = os.path.join(self.directory, name)
+        temp_filename = '%s.%d.%d.tmp' % (filename, os.getpid(), threading.get_ident())
+        try:
+            with open(temp_filename, 'wb') as f:
+                f.write(data)
+            os.replace(temp_filename, filename)
+        except OSError as e:
+            print('Cannot save to image cache:', filename, e)
+
+def get_image_disk_cache():
+    'Return the ImageDiskCache for image_cache_dir, or None when there is no image_cache_dir'
+    if not image_cache_dir:
+        return None
+    if image_cache_dir not in image_disk_caches:
+        image_disk_caches[image_cache_dir] = ImageDiskCache(image_cache_dir)
+    return image_disk_caches[image_cache_dir]
+
 class ScaledImageCache(object):
     """
     Cache of image resources for different sizes.
     
     Make scaled images available more quickly by scaling them from a closer size to the 
-    requested size than the image on disk. Cache the results for later.
+    requested size than the image on disk. Cache the results for later, and in the
+    ImageDiskCache for later runs when image_cache_dir is set.
     """
     def __init__(self, name, convert_alpha=False, colorkey=None):
         self.convert_alpha = convert_alpha
         self.colorkey = colorkey
-        
-        # load image resource without caching
-        fullname = resource_path(os.path.join('data', name))
-        try:
-            fullsizeimage = pygame.image.load(fullname)
-        except pygame.error as message:
-            print('Cannot load image:', fullname)
-            raise SystemExit(message)
-
-        if self.convert_alpha:
-            fullsizeimage = fullsizeimage.convert_alpha()
-        elif self.colorkey is not None:
-            if self.colorkey is -1:
-                self.colorkey = fullsizeimage.get_at((0, 0))
-            fullsizeimage.set_colorkey(colorkey, pygame.locals.RLEACCEL)
-            fullsizeimage = fullsizeimage.convert()
-        else:
-            fullsizeimage = fullsizeimage.convert()
+        self.fullname = resource_path(os.path.join('data', name))
+        # decoded image file, only loaded when a size isn't in the disk cache
+        self.fullsizeimage = None
+
+        # images with a colorkey aren't saved to the disk cache
+        self.disk_cache = get_image_disk_cache() if colorkey is None else None
+        fullsizeimage_size = None
+        if self.disk_cache is not None:
+            try:
+                self.disk_key = self.disk_cache.source_key(self.fullname, convert_alpha)
+                fullsizeimage_size = self.disk_cache.load_source_size(self.disk_key)
+            except IOError:
+                # load_fullsizeimage() reports the missing file
+                self.disk_cache = None
+        if fullsizeimage_size is None:
+            fullsizeimage_size = self.load_fullsizeimage().get_size()
+            if self.disk_cache is not None:
+                self.disk_cache.save_source_size(self.disk_key, fullsizeimage_size)
 
         # self.cache_by_log2_size[5] is image with size (2**5,2**5)
         self.cache_by_log2_size = []
         # self.cache_by_size[(48,48)] is image with size (48,48)
         self.cache_by_size = {}
+        # self.cache_by_size_opacity[((48,48),128)] is image with size (48,48) at half opacity
+        self.cache_by_size_opacity = {}
+        # self.scaled_bytes[(48,48)] is bytes used by the sizes other than powers of two,
+        # including their opacity copies, least recently used first
+        self.scaled_bytes = collections.OrderedDict()
+        self.total_scaled_bytes = 0
+        # most bytes of scaled_bytes sizes to keep, or None to keep all
+        self.max_bytes = image_cache_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # the prefetch thread of the adaptive game scales images too
+        self.lock = threading.Lock()
 
-        fullsizeimage_size = fullsizeimage.get_size()
         self.fullsizeimage_size = fullsizeimage_size
         maxsize = max(*self.fullsizeimage_size)
         # find log2(maxsize)
@@ -111,18 +371,87 @@ class ScaledImageCache(object):
                 height = 2**log2_size
                 width = int(2**log2_size * fullsizeimage_size[0] / fullsizeimage_size[1])
                 size = (width, height)
-            image_scaled = pygame.transform.smoothscale(fullsizeimage, size)
+            image_scaled = self.scale(self.load_fullsizeimage, size)
             self.cache_by_log2_size[log2_size] = image_scaled
             self.cache_by_size[size] = image_scaled
-        
-    def get(self, size):
+            scaledimage_source[image_scaled] = (self, size)
+
+    def load_fullsizeimage(self):
+        """Returns the image file decoded and converted, loading it the first time"""
+        if self.fullsizeimage is not None:
+            return self.fullsizeimage
+
+        # load image resource without caching
+        fullname = self.fullname
+        try:
+            fullsizeimage = pygame.image.load(fullname)
+        except pygame.error as message:
+            print('Cannot load image:', fullname)
+            raise SystemExit(message)
+
+        if self.convert_alpha:
+            fullsizeimage = fullsizeimage.convert_alpha()
+        elif self.colorkey is not None:
+            if self.colorkey is -1:
+                self.colorkey = fullsizeimage.get_at((0, 0))
+            fullsizeimage.set_colorkey(self.colorkey, pygame.locals.RLEACCEL)
+            fullsizeimage = fullsizeimage.convert()
+        else:
+            fullsizeimage = fullsizeimage.convert()
+        self.fullsizeimage = fullsizeimage
+        return fullsizeimage
+
+    def scale(self, get_source, size):
+        """
+        Returns the image returned by get_source() scaled to size, loaded from the disk
+        cache instead when it has that size.
+        """
+        # empty images can't be memory mapped, and are quick to scale
+        disk_cache = self.disk_cache if size[0] and size[1] else None
+        if disk_cache is not None:
+            image_scaled = disk_cache.load(self.disk_key, size, self.convert_alpha)
+            if image_scaled is not None:
+                return image_scaled
+        image_scaled = pygame.transform.smoothscale(get_source(), size)
+        if disk_cache is not None:
+            disk_cache.save(self.disk_key, image_scaled, self.convert_alpha)
+        return image_scaled
+
+    def get(self, size, opacity=255, quantize=False):
         """
         Return a cached previously scaled image
 
         or scale the image from the most suitable size if the size has not been requested before.
+        With opacity below 255, return a cached copy of the scaled image drawn at that opacity.
+        With quantize, size is first rounded by quantize_size() so nearby sizes share an image.
         """
-        if size in self.cache_by_size:
-            return self.cache_by_size[size]
+        if quantize:
+            size = quantize_size(size)
+        with self.lock:
+            if opacity < 255:
+                image = self.cache_by_size_opacity.get((size, opacity))
+            else:
+                image = self.cache_by_size.get(size)
+            if image is None:
+                self.misses += 1
+                image = self.make(size, opacity)
+            else:
+                self.hits += 1
+            if size in self.scaled_bytes:
+                # most recently used last
+                self.scaled_bytes.move_to_end(size)
+            return image
+
+    def make(self, size, opacity=255):
+        """Scale the image to size, or copy it at opacity, and cache the result"""
+        if opacity < 255:
+            image = self.cache_by_size.get(size)
+            if image is None:
+                image = self.make(size)
+            faded = image_with_opacity(image, opacity)
+            self.cache_by_size_opacity[(size, opacity)] = faded
+            self.add_scaled_bytes(size, faded)
+            return faded
 
         # find next larger log2 of diameter
         target_dia = 1
@@ -133,17 +462,73 @@ class ScaledImageCache(object):
             log2_size += 1
         if log2_size >= len(self.cache_by_log2_size): log2_size = len(self.cache_by_log2_size)-1
         larger_img = self.cache_by_log2_size[log2_size]
-        image_scaled = pygame.transform.smoothscale(larger_img, size)
+        image_scaled = self.scale(lambda: larger_img, size)
         self.cache_by_size[size] = image_scaled
+        scaledimage_source[image_scaled] = (self, size)
+        self.scaled_bytes[size] = 0
+        self.add_scaled_bytes(size, image_scaled)
 
         return image_scaled
 
-def load_image(name, size=None, convert_alpha=False, colorkey=None):
+    def add_scaled_bytes(self, size, image):
+        """Count image made for size towards max_bytes, dropping other sizes if it's exceeded"""
+        if size not in self.scaled_bytes:
+            # power-of-two sizes are always kept
+            return
+        image_bytes = surface_bytes(image)
+        self.scaled_bytes[size] += image_bytes
+        self.total_scaled_bytes += image_bytes
+        if self.max_bytes is None:
+            return
+        while self.total_scaled_bytes > self.max_bytes and len(self.scaled_bytes) > 1:
+            # least recently used first
+            evicted_size, evicted_bytes = self.scaled_bytes.popitem(last=False)
+            # sprites still drawing the evicted image find this cache from scaledimage_source,
+            # and get the image at opacity made again once instead of faded every frame
+            del self.cache_by_size[evicted_size]
+            for key in [key for key in self.cache_by_size_opacity if key[0] == evicted_size]:
+                del self.cache_by_size_opacity[key]
+            self.total_scaled_bytes -= evicted_bytes
+            self.evictions += 1
+
+def image_with_opacity(image, opacity):
+    """
+    Return a copy of image that draws at opacity (0-255) over the background.
+
+    Per-pixel alpha is multiplied by opacity once here, so drawing the copy
+    looks like drawing image and then blending the background back over it.
+    """
+    faded = image.copy()
+    if faded.get_flags() & pygame.SRCALPHA:
+        faded.fill((255, 255, 255, opacity), special_flags=pygame.BLEND_RGBA_MULT)
+    else:
+        faded.set_alpha(opacity)
+    return faded
+
+def image_at_opacity(image, opacity):
+    """
+    Return image as drawn at opacity (0-255).
+
+    Images returned by load_image() use the opacity variants cached in their
+    ScaledImageCache. Other images are faded on every call.
+    """
+    if opacity >= 255:
+        return image
+    source = scaledimage_source.get(image)
+    if source is None:
+        return image_with_opacity(image, opacity)
+    cache, size = source
+    return cache.get(size, opacity)
+
+def load_image(name, size=None, convert_alpha=False, colorkey=None, opacity=255, quantize=False):
     """
     Load image, scaling to desired size if specified.
     
     Results are cached to make future loading of the same resource instant, but
     this means you shouldn't draw on returned surfaces.
+
+    With quantize, size is rounded to a multiple of image_size_quantum pixels, for
+    sprites that change size often and don't need to be drawn at exactly their size.
     """
 
     if size == None:
@@ -151,11 +536,51 @@ def load_image(name, size=None, convert_alpha=False, colorkey=None):
 
     # Look up image in cache
     cache_key = (name, convert_alpha, colorkey)
-    if cache_key in scaledimage_cache:
-        return scaledimage_cache[cache_key].get(size)
+    with scaledimage_cache_lock:
+        cache = scaledimage_cache.get(cache_key)
+        if cache is None:
+            cache = scaledimage_cache[cache_key] = ScaledImageCache(name, convert_alpha, colorkey)
+    return cache.get(size, opacity, quantize)
 
-    scaledimage_cache[cache_key] = ScaledImageCache(name, convert_alpha, colorkey)
-    return scaledimage_cache[cache_key].get(size)
+def quantize_size(size):
+    """
+    Return (width, height) size rounded down to a multiple of image_size_quantum pixels.
+    Sizes smaller than image_size_quantum are kept, so the result is never larger.
+    """
+    quantum = image_size_quantum
+    if quantum <= 1:
+        return size
+    return tuple([n // quantum * quantum if n >= quantum else n for n in size])
+
+def image_cache_stats():
+    'Return (hits, misses, evictions) of scaled image lookups, summed over all images'
+    caches = list(scaledimage_cache.values())
+    return (sum([cache.hits for cache in caches]),
+            sum([cache.misses for cache in caches]),
+            sum([cache.evictions for cache in caches]))
+
+def surface_bytes(surface):
+    """Returns bytes of pixel memory used by surface"""
+    return surface.get_pitch() * surface.get_height()
+
+def cache_memory_bytes():
+    """
+    Returns approximate bytes of memory used by the cached images and sounds.
+
+    Sounds are counted as decoded samples in the mixer's format.
+    """
+    total = 0
+    for cache in scaledimage_cache.values():
+        for image in cache.cache_by_size.values():
+            total += surface_bytes(image)
+        for image in cache.cache_by_size_opacity.values():
+            total += surface_bytes(image)
+    mixer_init = pygame.mixer and pygame.mixer.get_init()
+    if mixer_init:
+        frequency, size, channels = mixer_init
+        for sound in sound_cache.values():
+            total += int(sound.get_length() * frequency) * channels * abs(size) // 8
+    return total
 
 class NoneSound:
     '''Stub sound object that responds to same methods but plays no audio'''
@@ -168,6 +593,94 @@ class NoneSound:
     def set_volume(self, volume): self.volume = volume
     def get_volume(self): return self.volume
 
+class MixingGroups(object):
+    """
+    Counts of the MixedSounds playing in each mixing group, to set their volumes.
+
+    Each playing sound is at default_volume * (times it's playing) / (sounds playing in
+    its group). Plays are counted when they start, and uncounted when their mixer
+    channel posts its end event, which handle_events() is given every frame. Starting or
+    ending a sound only sets the volumes of the sounds playing in its group, instead of
+    looking at every mixer channel. Sounds can be played from the audioscheduler thread,
+    so the counts are changed while holding a lock.
+    """
+    def __init__(self):
+        # self.playing[mixing_group][sound] is the number of channels playing sound
+        self.playing = collections.defaultdict(collections.Counter)
+        # self.channel_sounds[channel number] is the MixedSound last played on that channel,
+        # until its end is handled
+        self.channel_sounds = {}
+        # self.channel_numbers[event type] is the number of the channel that posts that end event
+        self.channel_numbers = {}
+        self.lock = threading.Lock()
+
+    def set_channel_endevents(self):
+        'Give each mixer channel its own end event type, so a played channel can be told apart'
+        for number in range(pygame.mixer.get_num_channels()):
+            if number not in self.channel_numbers.values():
+                event_type = pygame.event.custom_type()
+                pygame.mixer.Channel(number).set_endevent(event_type)
+                self.channel_numbers[event_type] = number
+
+    def play(self, sound):
+        'Play MixedSound sound, setting the volumes of the sounds playing in its group'
+        with self.lock:
+            return self.play_locked(sound)
+
+    def play_locked(self, sound):
+        group = self.playing[sound.mixing_group]
+        group[sound] += 1
+        self.set_volumes(group)
+        channel = pygame.mixer.Sound.play(sound)
+        if channel is None:
+            # no free channel
+            self.ended(sound)
+            return None
+        number = self.channel_numbers.get(channel.get_endevent())
+        if number is None:
+            # first play, or more channels than before
+            self.set_channel_endevents()
+            number = self.channel_numbers.get(channel.get_endevent())
+        if number is None:
+            return channel
+        previous_sound = self.channel_sounds.get(number)
+        if previous_sound is not None:
+            # the channel was free, so the previous sound ended even if its event hasn't arrived
+            self.ended(previous_sound)
+        self.channel_sounds[number] = sound
+        return channel
+
+    def handle_events(self, events):
+        'Uncount sounds that ended, from the channel end events in list events'
+        for event in events:
+            number = self.channel_numbers.get(event.type)
+            if number is None:
+                continue
+            with self.lock:
+                if number not in self.channel_sounds:
+                    continue
+                sound = self.channel_sounds[number]
+                channel = pygame.mixer.Channel(number)
+                if channel.get_busy() and channel.get_sound() is sound:
+                    # late event of an earlier play on this channel
+                    continue
+                del self.channel_sounds[number]
+                self.ended(sound)
+
+    def ended(self, sound):
+        group = self.playing[sound.mixing_group]
+        group[sound] -= 1
+        if group[sound] <= 0:
+            del group[sound]
+        self.set_volumes(group)
+
+    def set_volumes(self, group):
+        total = sum(group.values())
+        for sound, count in group.items():
+            sound.set_volume(sound.default_volume * count / total)
+
+mixing_groups = MixingGroups()
+
 class MixedSound(pygame.mixer.Sound):
     '''Sound object that reduces volume when self or other sounds in same group are played at simultaneously.'''
     def __init__(self, filename, mixing_group, default_volume):
@@ -177,37 +690,7 @@ class MixedSound(pygame.mixer.Sound):
         self.default_volume = default_volume
         self.set_volume(self.default_volume)
     def play(self):
-        # how many sounds in the current mixing group will be playing?
-        # unfortunately s.get_num_channels() doesn't return only PLAYING channels
-
-        playing_count_total = 0
-        # find total playing count for mixing group:
-        playing_count_by_filename = {}
-        for i in range(pygame.mixer.get_num_channels()):
-            channel = pygame.mixer.Channel(i)
-            if channel.get_busy():
-                s = channel.get_sound()
-                if isinstance(s, MixedSound) and s.mixing_group == self.mixing_group:
-                    if s.filename not in playing_count_by_filename:
-                        playing_count_by_filename[s.filename] = (s, 1)
-                    else:
-                        playing_count_by_filename[s.filename] = (s, playing_count_by_filename[s.filename][1]+1)
-                    playing_count_total += 1
-        
-        playing_count_total += 1 # me once I start playing
-        # increment play count for me:
-        if self.filename not in playing_count_by_filename:
-            playing_count_by_filename[self.filename] = (self, 1)
-        else:
-            playing_count_by_filename[self.filename] = (self, playing_count_by_filename[self.filename][1]+1)
-
-        # adjust volume of myself and others for number of times playing
-        for filename,packed_val in playing_count_by_filename.items():
-            s, playing_count_this = packed_val
-            s.set_volume(s.default_volume * playing_count_this / playing_count_total)
-
-        channel = pygame.mixer.Sound.play(self)
-        # todo: register on sound ending to adjust volume again
+        return mixing_groups.play(self)
 
 def load_sound(name, mixing_group=None):
     """
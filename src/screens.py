@@ -12,13 +12,25 @@ Game screens for AsteroidImpact
 
 import random
 import string
+import threading
+import zlib
+
+try:
+    import queue
+except ImportError:
+    # python 2.7
+    import Queue as queue
 
 from pygame.locals import *
 
+import asteroidfield
+import gameinput
 import parallelportwrapper
+import spritepool
 import virtualdisplay
+from collision import ASTEROID, POWERUP, TARGET, CollisionGrid
 from makelevel import make_level, TARGET_SIZE
-from resources import load_font, load_image, mute_music, unmute_music
+from resources import image_at_opacity, load_font, load_image, mute_music, unmute_music
 from sprites import *
 
 
@@ -46,6 +58,17 @@ class GameScreen(object):
         """Draw the game screen to the physical screen buffer"""
         pass
 
+    def draw_dirty(self):
+        """
+        Draw the game screen to the physical screen buffer, where this screen was also the
+        only screen drawn last frame.
+
+        Returns the list of screen rectangles that changed, or None if the whole screen
+        may have changed. Screens that can't track what changed redraw everything.
+        """
+        self.draw()
+        return None
+
     def after_close(self, logrowdetails, reactionlogger, surveylogger):
         """Clean up after screen is closed, and perform additional logging"""
         pass
@@ -83,10 +106,18 @@ class BlackScreen(GameScreen):
 
 def font_find_fitting_string_length(font, line, line_width_screenpx):
     """return the length (in characters) of the string that fits within lineWidth"""
-    for i in range(len(line), -1, -1):
+    if font.size(line)[0] <= line_width_screenpx:
+        return len(line)
+    # binary search for the longest prefix that fits. font.size() is slow for long
+    # strings, so checking every prefix length takes many seconds for long survey prompts
+    fits, doesnt_fit = 0, len(line)
+    while doesnt_fit - fits > 1:
+        i = (fits + doesnt_fit) // 2
         if font.size(line[0:i])[0] <= line_width_screenpx:
-            return i
-    return len(line)
+            fits = i
+        else:
+            doesnt_fit = i
+    return fits
 
 
 def valid_breakpoint_character(c):
@@ -229,7 +260,7 @@ class UserTextScreen(GameScreen):
             if event.type == MOUSEBUTTONDOWN:
                 if self.click_to_continue:
                     # position cursor at the center
-                    pygame.mouse.set_pos([
+                    gameinput.set_mouse_pos([
                         virtualdisplay.screenarea.centerx,
                         virtualdisplay.screenarea.centery])
                     # end the instructions screen:
@@ -265,11 +296,11 @@ class SurveyButton:
         self.onclick = onclick
 
     def update(self, milliseconds):
-        pos = pygame.mouse.get_pos()
+        pos = gameinput.get_mouse_pos()
         overlapping_me = False
         self.screenrect.collidepoint(pos)
 
-        mouse_button_down = pygame.mouse.get_pressed()[0]
+        mouse_button_down = gameinput.get_mouse_pressed()[0]
 
         '''
         states:
@@ -335,10 +366,9 @@ class SurveyQuestionScreen(GameScreen):
         self.blackbackground.fill((0, 0, 0))
 
         self.sprites = pygame.sprite.OrderedUpdates()
-        s = Cursor(game_bounds=virtualdisplay.GAME_AREA)
-        s.gamerect.topleft = (120, 120)
-        s.update_rect()
-        self.sprites.add(s)
+        self.cursor = Cursor(game_bounds=virtualdisplay.GAME_AREA)
+        self.cursor.gamerect.topleft = (120, 120)
+        self.sprites.add(GameObjectSprite(self.cursor))
 
         self.textsprites = []
 
@@ -419,6 +449,8 @@ class SurveyQuestionScreen(GameScreen):
         for textsprite in self.textsprites:
             textsprite.draw(self.screen)
 
+        for sprite in self.sprites:
+            sprite.sync()
         self.sprites.draw(self.screen)
 
     def update_frontmost(self, millis, logrowdetails, frame_outbound_triggers, events, step_trigger_count,
@@ -428,7 +460,7 @@ class SurveyQuestionScreen(GameScreen):
             # don't play music:
             mute_music()
 
-        self.sprites.update(millis)
+        self.cursor.update(millis)
 
         logrowdetails['survey_answer'] = 'MISSING'
         for b in self.option_buttons:
@@ -499,8 +531,7 @@ class AsteroidImpactInstructionsScreen(GameScreen):
 
         s = Cursor()
         s.gamerect.topleft = (120, 120)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         self.textsprites.append(
             TextSprite(
                 self.font,
@@ -509,18 +540,16 @@ class AsteroidImpactInstructionsScreen(GameScreen):
 
         s = Target()
         s.gamerect.topleft = (120, 240)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         self.textsprites.append(TextSprite(
             self.font, "Pick up all the crystals", black,
             left=240, top=240))
 
         s = Asteroid(diameter=32)
         s.gamerect.topleft = (120, 360)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         asteroidgamebounds = pygame.Rect(120, 400, 960 - 120 - 120, 160)
-        self.asteroids = pygame.sprite.Group([
+        self.asteroids = [
             Asteroid(diameter=64,
                      dx=1.5,
                      dy=1.0,
@@ -538,7 +567,8 @@ class AsteroidImpactInstructionsScreen(GameScreen):
                      dy=-3,
                      top=asteroidgamebounds.top + 40,
                      left=asteroidgamebounds.left + 600,
-                     area=asteroidgamebounds)])
+                     area=asteroidgamebounds)]
+        self.sprite_views = SpriteViews()
         self.textsprites.append(
             TextSprite(
                 self.font,
@@ -547,8 +577,7 @@ class AsteroidImpactInstructionsScreen(GameScreen):
 
         s = ShieldPowerup()
         s.gamerect.topleft = (120, 600)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         self.textsprites.append(TextSprite(
             self.font,
             "Pick up a shield to pass through asteroids for a few seconds",
@@ -556,8 +585,7 @@ class AsteroidImpactInstructionsScreen(GameScreen):
 
         s = SlowPowerup()
         s.gamerect.topleft = (120, 720)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         self.textsprites.append(TextSprite(
             self.font,
             "Pick up a clock to slow asteroids for a few seconds",
@@ -578,7 +606,7 @@ class AsteroidImpactInstructionsScreen(GameScreen):
         for textsprite in self.textsprites:
             textsprite.draw(self.screen)
         self.sprites.draw(self.screen)
-        self.asteroids.draw(self.screen)
+        draw_sprites_at_opacity(self.sprite_views.sync(self.asteroids), self.screen, 255)
 
     def update_frontmost(self, millis, logrowdetails, frame_outbound_triggers, events, step_trigger_count,
                          reactionlogger):
@@ -591,7 +619,7 @@ class AsteroidImpactInstructionsScreen(GameScreen):
             if event.type == MOUSEBUTTONDOWN:
                 if self.click_to_continue:
                     # position cursor at the center
-                    pygame.mouse.set_pos([
+                    gameinput.set_mouse_pos([
                         virtualdisplay.screenarea.centerx,
                         virtualdisplay.screenarea.centery])
                     # end the instructions screen:
@@ -641,8 +669,7 @@ class AsteroidImpactInstructionsScreenAlt(GameScreen):
 
         s = Cursor()
         s.gamerect.topleft = (120, 120)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         self.textsprites.append(
             TextSprite(
                 self.font,
@@ -651,18 +678,16 @@ class AsteroidImpactInstructionsScreenAlt(GameScreen):
 
         s = Target()
         s.gamerect.topleft = (120, 200)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         self.textsprites.append(TextSprite(
             self.font, "Pick up all the crystals", black,
             left=240, top=200))
 
         s = Asteroid(diameter=32)
         s.gamerect.topleft = (120, 280)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         asteroidgamebounds = pygame.Rect(240, 340, 960 - 120 - 120, 160)
-        self.asteroids = pygame.sprite.Group([
+        self.asteroids = [
             Asteroid(diameter=64,
                      dx=1.5,
                      dy=1.0,
@@ -680,7 +705,8 @@ class AsteroidImpactInstructionsScreenAlt(GameScreen):
                      dy=-3,
                      top=asteroidgamebounds.top + 40,
                      left=asteroidgamebounds.left + 600,
-                     area=asteroidgamebounds)])
+                     area=asteroidgamebounds)]
+        self.sprite_views = SpriteViews()
         self.textsprites.append(
             TextSprite(
                 self.font,
@@ -689,8 +715,7 @@ class AsteroidImpactInstructionsScreenAlt(GameScreen):
 
         s = ShieldPowerup()
         s.gamerect.topleft = (120, 500)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         self.textsprites.append(TextSprite(
             self.font,
             "Pick up a shield to pass through asteroids for a few seconds",
@@ -698,8 +723,7 @@ class AsteroidImpactInstructionsScreenAlt(GameScreen):
 
         s = SlowPowerup()
         s.gamerect.topleft = (120, 580)
-        s.update_rect()
-        self.sprites.add(s)
+        self.sprites.add(GameObjectSprite(s))
         self.textsprites.append(TextSprite(
             self.font,
             "Pick up a clock to slow asteroids for a few seconds",
@@ -738,7 +762,7 @@ class AsteroidImpactInstructionsScreenAlt(GameScreen):
         for textsprite in self.textsprites:
             textsprite.draw(self.screen)
         self.sprites.draw(self.screen)
-        self.asteroids.draw(self.screen)
+        draw_sprites_at_opacity(self.sprite_views.sync(self.asteroids), self.screen, 255)
 
     def update_frontmost(self, millis, logrowdetails, frame_outbound_triggers, events, step_trigger_count,
                          reactionlogger):
@@ -751,7 +775,7 @@ class AsteroidImpactInstructionsScreenAlt(GameScreen):
             if event.type == MOUSEBUTTONDOWN:
                 if self.click_to_continue:
                     # position cursor at the center
-                    pygame.mouse.set_pos([
+                    gameinput.set_mouse_pos([
                         virtualdisplay.screenarea.centerx,
                         virtualdisplay.screenarea.centery])
                     # end the instructions screen:
@@ -866,20 +890,21 @@ class GameOverOverlayScreen(GameScreen):
                 pass
 
 
-def circularspritesoverlap(a, b):
-    """
-    Returns true if two circular game sprites overlap.
+def drawn_sprite_rects(sprites, screen_rect):
+    """Returns screen rectangles covered by drawing the visible sprites in sprites, clipped to screen_rect"""
+    rects = [s.rect.clip(screen_rect) for s in sprites if s.visible]
+    return [r for r in rects if r.width and r.height]
 
-    The sprite overlap is checked using their ``gamerect`` to find the sprite position and diameter.
-    """
-    x1 = a.gamerect.centerx
-    y1 = a.gamerect.centery
-    d1 = a.gamerect.width
-    x2 = b.gamerect.centerx
-    y2 = b.gamerect.centery
-    d2 = b.gamerect.width
-    # x1, y1, d1, x2, y2, d2
-    return ((x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1)) < (.25 * (d1 + d2) * (d1 + d2))
+
+def draw_sprites_at_opacity(sprites, surface, opacity):
+    """Draw the visible sprites in sprites (a list or sprite group) to surface in order, at opacity (0-255)"""
+    for sprite in sprites:
+        if not sprite.visible:
+            continue
+        if opacity >= 255:
+            surface.blit(sprite.image, sprite.rect)
+        else:
+            surface.blit(image_at_opacity(sprite.image, opacity), sprite.rect)
 
 
 def make_powerup(powerup_dict):
@@ -890,11 +915,11 @@ def make_powerup(powerup_dict):
     powerup_dict = dict(powerup_dict)
     powerup_type = powerup_dict.pop('type')
     if powerup_type == 'shield':
-        return ShieldPowerup(**powerup_dict)
+        return spritepool.acquire(ShieldPowerup, **powerup_dict)
     if powerup_type == 'slow':
-        return SlowPowerup(**powerup_dict)
+        return spritepool.acquire(SlowPowerup, **powerup_dict)
     if powerup_type == 'none':
-        return NonePowerup(**powerup_dict)
+        return spritepool.acquire(NonePowerup, **powerup_dict)
     print('ERROR: Unknown type of powerup in level: ', powerup_type)
 
 
@@ -922,6 +947,8 @@ class AsteroidImpactGameplayScreen(GameScreen):
         self.blackbackground = pygame.Surface(self.screen.get_size())
         self.blackbackground = self.blackbackground.convert()
         self.blackbackground.fill((0, 0, 0))
+        # screen rectangles drawn last frame, to erase for dirty rectangle rendering
+        self.drawn_rects = []
 
         self.gamebackground = load_image('background4x3.jpg', size=virtualdisplay.screenplayarea.size)
         # draw game background on black background to only have to draw black/game once per frame:
@@ -970,6 +997,10 @@ class AsteroidImpactGameplayScreen(GameScreen):
             raise QuitGame
         self.level_index = 0
         self.level_attempt = -1
+        # game objects of the current level, released to spritepool when the next starts
+        self.level_objects = []
+        # sprites drawing the game objects
+        self.sprite_views = SpriteViews()
         self.setup_level()
 
         self.first_update = True
@@ -983,22 +1014,31 @@ class AsteroidImpactGameplayScreen(GameScreen):
         leveldetails = self.level_list[self.level_index]
         self.level_millis = -2000  # for the 'get ready' and level countdown
 
-        self.cursor = Cursor(game_bounds=virtualdisplay.GAME_PLAY_AREA)
+        spritepool.release(self.level_objects)
+        self.cursor = spritepool.acquire(Cursor, game_bounds=virtualdisplay.GAME_PLAY_AREA)
         self.target_positions = leveldetails['target_positions']
         self.target_index = 0
-        self.target = Target(
+        self.target = spritepool.acquire(
+            Target,
             diameter=32,
             left=self.target_positions[0][0],
             top=self.target_positions[0][1])
-        self.asteroids = [Asteroid(**d) for d in leveldetails['asteroids']]
+        self.asteroids = [spritepool.acquire(Asteroid, **d) for d in leveldetails['asteroids']]
+        if asteroidfield.NUMPY_AVAILABLE:
+            self.asteroid_field = asteroidfield.AsteroidField(self.asteroids)
+        else:
+            self.asteroid_field = None
         self.powerup_list = [make_powerup(d) for d in leveldetails['powerup_list']]
         self.powerup = self.powerup_list[0]
         self.next_powerup_list_index = 1 % len(self.powerup_list)
-        self.mostsprites = pygame.sprite.OrderedUpdates(
-            self.asteroids + [self.cursor, self.target])
-        self.powerupsprites = pygame.sprite.Group()
-        if self.powerup.image:
-            self.powerupsprites.add(self.powerup)
+        self.level_objects = [self.cursor, self.target] + self.asteroids + self.powerup_list
+        # game objects updated and drawn every frame, in order
+        self.mostobjects = self.asteroids + [self.cursor, self.target]
+        self.collision_grid = CollisionGrid()
+        self.collision_grid.add_list(self.asteroids, ASTEROID)
+        # the target moves to its next position when picked up
+        self.collision_grid.add(self.target, TARGET)
+        self.collision_grid.add(self.powerup, POWERUP)
         self.update_status_text()
         self.update_notice_text(self.level_millis, -10000)
         self.level_attempt += 1
@@ -1066,27 +1106,37 @@ class AsteroidImpactGameplayScreen(GameScreen):
         if self.level_millis < 0:
             # get ready countdown
             # only update asteroids, cursor
-            self.mostsprites.update(millis)
+            if self.asteroid_field is not None:
+                self.asteroid_field.update(millis)
+            for gameobject in self.mostobjects:
+                gameobject.update(millis)
         else:
             # game is running (countdown to level start is over)
-            self.mostsprites.update(millis)
+            if self.asteroid_field is not None:
+                self.asteroid_field.update(millis)
+            for gameobject in self.mostobjects:
+                gameobject.update(millis)
 
             # update powerups
             # if current power-up has been used completely:
             if self.powerup.used:
                 # switch to and get ready next one:
+                self.collision_grid.remove(self.powerup)
                 self.powerup = self.powerup_list[self.next_powerup_list_index]
+                self.collision_grid.add(self.powerup, POWERUP)
                 self.powerup.used = False
-                self.powerupsprites.empty()
-                if self.powerup.image:
-                    self.powerupsprites.add(self.powerup)
+                self.powerup.visible = 1
                 self.next_powerup_list_index = \
                     (1 + self.next_powerup_list_index) % len(self.powerup_list)
                 # print 'new available powerup is', self.powerup, 'at', self.powerup.gamerect
             self.powerup.update(millis, frame_outbound_triggers, self.cursor, self.asteroids)
 
+            # find everything the cursor overlaps:
+            self.collision_grid.update()
+            collisions = self.collision_grid.collisions(self.cursor)
+
             # Check target collision:
-            if circularspritesoverlap(self.cursor, self.target):
+            if self.target in collisions.targets:
                 # hit.
                 self.target.pickedup()
                 # increment counter of targets hit
@@ -1104,30 +1154,29 @@ class AsteroidImpactGameplayScreen(GameScreen):
                     # position for next crystal target:
                     self.target.gamerect.left = self.target_positions[self.target_index][0]
                     self.target.gamerect.top = self.target_positions[self.target_index][1]
-                    self.target.update_rect()
 
             # Check powerup collision
             if self.powerup != None \
-                    and circularspritesoverlap(self.cursor, self.powerup) \
+                    and self.powerup in collisions.powerups \
                     and not self.powerup.active \
                     and not self.powerup.used:
                 print('activating powerup:', self.powerup)
                 self.powerup.activate(self.cursor, self.asteroids, frame_outbound_triggers)
 
             # Check asteroid collision:
-            for asteroid in self.asteroids:
-                if circularspritesoverlap(self.cursor, asteroid):
-                    # todo: find a cleaner way to have the shield powerup do this work:
-                    if not (self.powerup != None
-                            and isinstance(self.powerup, ShieldPowerup)
-                            and self.powerup.active):
-                        self.sound_death.play()
-                        print('dead', self.cursor.rect.left, self.cursor.rect.top)
-                        levelstate = 'dead'
-                        self.screenstack.append(
-                            GameOverOverlayScreen(self.screen, self.screenstack))
-                        frame_outbound_triggers.append('game_death')
-                        break
+            for asteroid in collisions.asteroids:
+                # todo: find a cleaner way to have the shield powerup do this work:
+                if not (self.powerup != None
+                        and isinstance(self.powerup, ShieldPowerup)
+                        and self.powerup.active):
+                    self.sound_death.play()
+                    cursor_rect = virtualdisplay.screenrect_from_gamerect(self.cursor.gamerect)
+                    print('dead', cursor_rect.left, cursor_rect.top)
+                    levelstate = 'dead'
+                    self.screenstack.append(
+                        GameOverOverlayScreen(self.screen, self.screenstack))
+                    frame_outbound_triggers.append('game_death')
+                    break
 
         self.update_status_text()
         logrowdetails['level_millis'] = self.level_millis
@@ -1162,10 +1211,9 @@ class AsteroidImpactGameplayScreen(GameScreen):
 
     def after_close(self, logrowdetails, reactionlogger, surveylogger):
         # halt all pending sounds
-        for s in self.mostsprites:
-            s.stop_audio()
-        for s in self.powerupsprites:
+        for s in self.mostobjects:
             s.stop_audio()
+        self.powerup.stop_audio()
         for s in self.reaction_prompts:
             s.step_end_deactivate(logrowdetails, reactionlogger)
 
@@ -1173,19 +1221,43 @@ class AsteroidImpactGameplayScreen(GameScreen):
         """draw game to ``self.screen``"""
         self.screen.blit(self.blackbackground, (0, 0))
 
-        self.mostsprites.draw(self.screen)
-        self.powerupsprites.draw(self.screen)
-        self.reaction_prompts.draw(self.screen)
-
-        if self.game_element_opacity < 255:
-            # overlay the background over game elements to easily simulate dropping their opacity:
-            self.blackbackground.set_alpha(255 - self.game_element_opacity)
-            self.screen.blit(self.blackbackground, (0, 0))
-            self.blackbackground.set_alpha(None)  # another way to be opaque
-
-        # draw all text blocks:
+        self.draw_sprites()
+
+        self.draw_text()
+
+    def draw_dirty(self):
+        """draw only the changed parts of the game to ``self.screen``, returning changed rectangles"""
+        # erase everything drawn last frame by restoring the background under it
+        previous_drawn_rects = self.drawn_rects
+        for rect in previous_drawn_rects:
+            self.screen.blit(self.blackbackground, rect, rect)
+
+        self.draw_sprites()
+        self.draw_text()
+        return previous_drawn_rects + self.drawn_rects
+
+    def draw_sprites(self):
+        """draw game sprites to ``self.screen`` at game element opacity, and remember where they were drawn"""
+        # sprite images are faded to the game element opacity, so they blend with the background
+        # as if drawn opaque and then partly covered by it
+        mostsprites = self.sprite_views.sync(self.mostobjects)
+        powerupsprites = self.sprite_views.sync([self.powerup] if self.powerup.imagefile else [])
+        draw_sprites_at_opacity(mostsprites, self.screen, self.game_element_opacity)
+        draw_sprites_at_opacity(powerupsprites, self.screen, self.game_element_opacity)
+        draw_sprites_at_opacity(self.reaction_prompts, self.screen, self.game_element_opacity)
+
+        screen_rect = self.screen.get_rect()
+        self.drawn_rects = (
+            drawn_sprite_rects(mostsprites, screen_rect)
+            + drawn_sprite_rects(powerupsprites, screen_rect)
+            + drawn_sprite_rects(self.reaction_prompts, screen_rect))
+
+    def draw_text(self):
+        """draw all text blocks to ``self.screen``, and remember where they were drawn"""
+        screen_rect = self.screen.get_rect()
         for textsprite in self.textsprites:
             textsprite.draw(self.screen)
+            self.drawn_rects.append(textsprite.textrect.clip(screen_rect))
 
 
 class AsteroidImpactInfiniteLevelMaker(object):
@@ -1204,6 +1276,7 @@ class AsteroidImpactInfiniteLevelMaker(object):
             show_advance_countdown=False,
             multicolor_crystal_scoring=False,
             multicolor_crystal_numbers=[-1],
+            image_opacity=255,
             **kwargs_ignored):
         print(start_level, level_completion_increment, level_death_decrement)
         self.level_score = start_level
@@ -1229,17 +1302,58 @@ class AsteroidImpactInfiniteLevelMaker(object):
 
         self.level_index_previous = -1
 
+        # levels made ahead of time on a background thread, so starting the next level
+        # doesn't wait for make_level(). Keyed by (level_index, used_count)
+        self.prefetched_levels = {}
+        self.prefetch_pending = set()
+        self.prefetch_lock = threading.Lock()
+        self.prefetch_queue = queue.Queue()
+        self.prefetch_thread = None
+        # opacity prefetched asteroid images are drawn at
+        self.image_opacity = image_opacity
+
     # must act like a list?
     def __len__(self):
         return 2000000000
 
+    def level_index_for_score(self, level_score):
+        """Returns index into level templates for level_score"""
+        level_index = int(level_score + 0.001)  # add some fudge to round correctly
+        return min(level_index, len(self.level_args_list) - 1)
+
     def __getitem__(self, index):
-        level_index = int(self.level_score + 0.001)  # add some fudge to round correctly
-        level_index = min(level_index, len(self.level_args_list) - 1)
-        level_args = self.level_args_list[level_index]
+        level_index = self.level_index_for_score(self.level_score)
+        used_count = self.level_used_count_list[level_index]
         print('generating new level for index', level_index, ' # times previously generated:',
-              self.level_used_count_list[level_index])
+              used_count)
+
+        with self.prefetch_lock:
+            level = self.prefetched_levels.pop((level_index, used_count), None)
+        if level is None:
+            # not prefetched yet
+            level = self.make_level_for_index(level_index, used_count)
+        self.level_used_count_list[level_index] += 1
+
+        # debug print
+        # print 'previous level_index', self.level_index_previous, 'new', level_index
+        level['level_index_changed_from_previous'] = (level_index != self.level_index_previous)
+
+        self.level_index_previous = level_index
+
+        # the next level is for the same score, or the score after completing or dying
+        # on this level
+        self.prefetch([self.level_index_for_score(score) for score in (
+            self.level_score,
+            self.clamp_level_score(self.level_score + self.level_completion_increment),
+            self.clamp_level_score(self.level_score - self.level_death_decrement))])
 
+        return level
+
+    def make_level_for_index(self, level_index, used_count):
+        """
+        Returns new level from level template level_index, after it was used used_count
+        times. The same arguments always make the same level.
+        """
         # create random from level args
         def make_level_hash(
                 seed=None,
@@ -1257,20 +1371,22 @@ class AsteroidImpactInfiniteLevelMaker(object):
             if isinstance(asteroid_sizes, list): asteroid_sizes = tuple(asteroid_sizes)
             if isinstance(asteroid_speeds, list): asteroid_speeds = tuple(asteroid_speeds)
             if isinstance(powerup_types, list): powerup_types = tuple(powerup_types)
-            return hash((
+            # crc32 rather than hash(), which is randomized for strings in each process,
+            # so the same template makes the same levels in every run and in replays
+            return zlib.crc32(repr((
                 target_count,
                 asteroid_count,
                 asteroid_speeds,
                 asteroid_sizes,
                 powerup_count,
                 powerup_initial_delay,
-                powerup_types))
+                powerup_types)).encode('utf-8'))
 
         level_hash = make_level_hash(**self.level_args_list[level_index])
 
         # advance random some multiple of times of # level has been played
         rnd = random.Random(level_hash)
-        for i in range(100 * self.level_used_count_list[level_index]):
+        for i in range(100 * used_count):
             rnd.random()
 
         level_args = self.level_args_list[level_index].copy()
@@ -1280,7 +1396,6 @@ class AsteroidImpactInfiniteLevelMaker(object):
             # override target count so we get enough to show in multiple colors and having them disappear
             level_args['target_count'] = 5 * (level_args['target_count'] + len(self.multicolor_crystal_numbers))
         level = make_level(**level_args)
-        self.level_used_count_list[level_index] += 1
         level['level_name'] = 'dynamic-' + str(level_index)
 
         # reset target count
@@ -1294,15 +1409,56 @@ class AsteroidImpactInfiniteLevelMaker(object):
                                           diameter=TARGET_SIZE,
                                           color=rnd.choice(self.multicolor_crystal_numbers)))
         level['level_target_list'] = level_target_list
-
-        # debug print
-        # print 'previous level_index', self.level_index_previous, 'new', level_index
-        level['level_index_changed_from_previous'] = (level_index != self.level_index_previous)
-
-        self.level_index_previous = level_index
-
         return level
 
+    def prefetch(self, level_indices):
+        """Make the next level of each of level_indices on the prefetch thread"""
+        keys = set([(i, self.level_used_count_list[i]) for i in level_indices])
+        with self.prefetch_lock:
+            # levels for other indices or already used won't be needed
+            for key in list(self.prefetched_levels.keys()):
+                if key not in keys:
+                    del self.prefetched_levels[key]
+            for key in sorted(keys):
+                if key not in self.prefetched_levels and key not in self.prefetch_pending:
+                    self.prefetch_pending.add(key)
+                    self.prefetch_queue.put(key)
+        if self.prefetch_thread is None:
+            self.prefetch_thread = threading.Thread(target=self.run_prefetch, name='LevelPrefetchThread')
+            self.prefetch_thread.daemon = True
+            self.prefetch_thread.start()
+
+    def stop(self):
+        """Stop the prefetch thread, after the level it's making"""
+        if self.prefetch_thread is not None:
+            self.prefetch_queue.put(None)
+            self.prefetch_thread.join()
+            self.prefetch_thread = None
+
+    def run_prefetch(self):
+        """Prefetch thread: make levels requested by prefetch() until stop()"""
+        while True:
+            key = self.prefetch_queue.get()
+            if key is None:
+                return
+            level = self.make_level_for_index(*key)
+            # scale asteroid images to the new sizes now, instead of in the frame
+            # the level starts, at the quantized sizes GameObjectSprite loads
+            for asteroid in level['asteroids']:
+                diameter = asteroid['diameter']
+                size = virtualdisplay.screenrect_from_gamerect(pygame.Rect(0, 0, diameter, diameter)).size
+                load_image('asteroid.png', size, convert_alpha=True, quantize=True)
+                if self.image_opacity < 255:
+                    load_image('asteroid.png', size, convert_alpha=True, opacity=self.image_opacity,
+                               quantize=True)
+            with self.prefetch_lock:
+                self.prefetch_pending.discard(key)
+                self.prefetched_levels[key] = level
+
+    def clamp_level_score(self, level_score):
+        "Returns level_score kept from going below 0 or too high"
+        return min(max(0.0, level_score), len(self.level_args_list) + 1)
+
     def level_completed(self, level_millis, frame_outbound_triggers):
         "Increment level score based on level completion"
         level_index_old = int(self.level_score + 0.001)  # add some fudge to round correctly
@@ -1310,7 +1466,7 @@ class AsteroidImpactInfiniteLevelMaker(object):
         # increment difficulty
         self.level_score += self.level_completion_increment
         # keep from going too high
-        self.level_score = min(max(0.0, self.level_score), len(self.level_args_list) + 1)
+        self.level_score = self.clamp_level_score(self.level_score)
 
         level_index_new = int(self.level_score + 0.001)  # add some fudge to round correctly
         if level_index_old < level_index_new:
@@ -1324,7 +1480,7 @@ class AsteroidImpactInfiniteLevelMaker(object):
         # decrement difficulty
         self.level_score -= self.level_death_decrement
         # keep at or above 0
-        self.level_score = min(max(0.0, self.level_score), len(self.level_args_list) + 1)
+        self.level_score = self.clamp_level_score(self.level_score)
 
         level_index_new = int(self.level_score + 0.001)  # add some fudge to round correctly
         if level_index_new < level_index_old:
@@ -1394,6 +1550,8 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
         self.blackbackground = pygame.Surface(self.screen.get_size())
         self.blackbackground = self.blackbackground.convert()
         self.blackbackground.fill((0, 0, 0))
+        # screen rectangles drawn last frame, to erase for dirty rectangle rendering
+        self.drawn_rects = []
 
         self.gamebackground = load_image('background4x3.jpg', size=virtualdisplay.screenplayarea.size)
         # draw gamebackground on blackbackground to only have to draw black/game once per frame:
@@ -1462,9 +1620,16 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
         if len(level_templates_list) == 0:
             print('ERROR: Level list is empty')
             raise QuitGame
-        levellist = AsteroidImpactInfiniteLevelMaker(level_templates_list, **kwargs)
+        levellist = AsteroidImpactInfiniteLevelMaker(level_templates_list, image_opacity=self.game_element_opacity,
+                                                     **kwargs)
         self.level_list = levellist
         self.level_attempt = -1
+        # released to spritepool when no longer needed by the next level
+        self.target_list = []
+        self.powerup_list = []
+        self.shrunken_asteroids = []
+        # sprites drawing the game objects
+        self.sprite_views = SpriteViews()
         self.setup_level(first=True)
 
         self.first_update = True
@@ -1497,40 +1662,48 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
         self.target_collection_target = self.current_level['target_count']
         self.target_next_index = 0
 
-        # all target sprites are created/positioned at load time! just not shown
-        target_list_new = []
-        for t in self.current_level['level_target_list']:
-            sprite = ScoredTarget(diameter=t['diameter'],
-                                  left=t['left'],
-                                  top=t['top'],
-                                  # when acting like "classic" behavior, use 'crystal.png'
-                                  imagefile='Crystal_%i.png' % t['color'] if t['color'] >= 1 else 'crystal.png',
-                                  number=t['color'],
-                                  lifetime_millis_max=self.multicolor_crystal_lifetime_ms,
-                                  play_buzzer_on_negative_score=self.multicolor_crystal_negative_score_buzzer)
-            target_list_new.append(sprite)
-
+        spritepool.release(self.shrunken_asteroids)
+        self.shrunken_asteroids = []
         if first or died_previously:
             # I'm not sure the LayeredDirty group is ordered so its its own thing
-            self.target_list = target_list_new
+            spritepool.release(self.target_list)
+            self.target_list = []
         else:
             # include existing active targets in front of new list
+            spritepool.release([t for t in self.target_list if not t.active])
             self.target_list = [t for t in self.target_list if t.active]
-            self.target_list.extend(target_list_new)
-        self.targetsprites = pygame.sprite.LayeredDirty(self.target_list)
+
+        # all target sprites are created/positioned at load time! just not shown
+        for t in self.current_level['level_target_list']:
+            sprite = spritepool.acquire(
+                ScoredTarget,
+                diameter=t['diameter'],
+                left=t['left'],
+                top=t['top'],
+                # when acting like "classic" behavior, use 'crystal.png'
+                imagefile='Crystal_%i.png' % t['color'] if t['color'] >= 1 else 'crystal.png',
+                number=t['color'],
+                lifetime_millis_max=self.multicolor_crystal_lifetime_ms,
+                play_buzzer_on_negative_score=self.multicolor_crystal_negative_score_buzzer)
+            self.target_list.append(sprite)
+        self.targetobjects = list(self.target_list)
         self.show_required_targets()
 
         if first or died_previously:
             self.score = 0
 
         if first:
-            self.asteroids = [Asteroid(**d) for d in self.current_level['asteroids']]
+            self.asteroids = [spritepool.acquire(Asteroid, **d) for d in self.current_level['asteroids']]
+            if asteroidfield.NUMPY_AVAILABLE:
+                self.asteroid_field = asteroidfield.AsteroidField()
+            else:
+                self.asteroid_field = None
             self.target_previously_collected_number = 'x'
         else:
             if (self.current_level['level_index_changed_from_previous']
                     or (not self.level_list.continuous_asteroids_on_same_level)):
                 # update asteroid speeds and sizes:
-                new_asteroids = [Asteroid(**d) for d in self.current_level['asteroids']]
+                new_asteroids = [spritepool.acquire(Asteroid, **d) for d in self.current_level['asteroids']]
                 # transition existing asteroid list into new asteroid list
                 prev_asteroid_count = len(self.asteroids)
                 if (len(new_asteroids) < len(self.asteroids)):
@@ -1546,7 +1719,7 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
                 elif (len(self.asteroids) < len(new_asteroids)):
                     # duplicate asteroids to increase count
                     for i in range(len(self.asteroids), len(new_asteroids)):
-                        new_asteroid = Asteroid()
+                        new_asteroid = spritepool.acquire(Asteroid)
                         new_asteroid.copy_from(self.asteroids[i % prev_asteroid_count])
                         self.asteroids.append(new_asteroid)
 
@@ -1567,6 +1740,8 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
                         asteroid.gamediameternew_transition_remaining_millis = 2000
                     asteroid.dxnew = newasteroid.dx
                     asteroid.dynew = newasteroid.dy
+                # only needed for their sizes and directions
+                spritepool.release(new_asteroids)
 
         if first:
             prevpowerup = None
@@ -1575,6 +1750,11 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
         if died_previously:
             prevpowerup = None
 
+        if not first and not died_previously and prevpowerup.active:
+            # keep it around
+            spritepool.release([p for p in self.powerup_list if p is not prevpowerup])
+        else:
+            spritepool.release(self.powerup_list)
         self.powerup_list = [make_powerup(d) for d in self.current_level['powerup_list']]
         self.powerup = self.powerup_list[0]
         self.next_powerup_list_index = 1 % len(self.powerup_list)
@@ -1582,10 +1762,12 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
             # keep it around
             self.powerup_list.insert(0, prevpowerup)
             self.powerup = prevpowerup
-        self.mostsprites = pygame.sprite.LayeredDirty(self.asteroids + [self.cursor])
-        self.powerupsprites = pygame.sprite.Group()
-        if self.powerup.image:
-            self.powerupsprites.add(self.powerup)
+        # game objects updated and drawn every frame, in order. Includes asteroids that
+        # shrink away during this level
+        self.mostobjects = self.asteroids + [self.cursor]
+        if self.asteroid_field is not None:
+            self.asteroid_field.set_asteroids(self.asteroids)
+        self.rebuild_collision_grid()
         self.update_status_text()
         self.update_notice_text(self.level_millis, -10000)
         self.level_attempt += 1
@@ -1677,40 +1859,52 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
         if self.level_millis < 0:
             # get ready countdown
             # only update asteroids, cursor
-            self.mostsprites.update(millis)
-            self.targetsprites.update(millis)
+            if self.asteroid_field is not None:
+                self.asteroid_field.update(millis)
+            for gameobject in self.mostobjects:
+                gameobject.update(millis)
+            for target in self.targetobjects:
+                target.update(millis)
 
             # update shield with zero duration so it continues to follow cursor
             if self.powerup.active:
                 self.powerup.update(0, frame_outbound_triggers, self.cursor, self.asteroids)
         else:
             # game is running (countdown to level start is over)
-            self.mostsprites.update(millis)
-            self.targetsprites.update(millis)
+            if self.asteroid_field is not None:
+                self.asteroid_field.update(millis)
+            for gameobject in self.mostobjects:
+                gameobject.update(millis)
+            for target in self.targetobjects:
+                target.update(millis)
 
             # update powerups
             # if current power-up has been used completely:
             if self.powerup.used:
                 # switch to and get ready next one:
+                self.collision_grid.remove(self.powerup)
                 self.powerup = self.powerup_list[self.next_powerup_list_index]
+                self.collision_grid.add(self.powerup, POWERUP)
                 self.powerup.used = False
-                self.powerupsprites.empty()
-                if self.powerup.image:
-                    self.powerupsprites.add(self.powerup)
+                self.powerup.visible = 1
                 self.next_powerup_list_index = \
                     (1 + self.next_powerup_list_index) % len(self.powerup_list)
                 # print 'new available powerup is', self.powerup, 'at', self.powerup.gamerect
             self.powerup.update(millis, frame_outbound_triggers, self.cursor, self.asteroids)
 
+            # find everything the cursor overlaps:
+            self.collision_grid.update()
+            collisions = self.collision_grid.collisions(self.cursor)
+
             # Check target collision:
-            for target in self.target_list:
-                if target.active and circularspritesoverlap(self.cursor, target):
+            for target in collisions.targets:
+                if target.active:
                     # hit.
                     target.pickedup()
 
                     # increment score
+                    scoreincrement = 0
                     if self.multicolor_crystal_scoring:
-                        scoreincrement = 0
                         if isinstance(target.number, int) and target.number > 0:
                             if isinstance(self.target_previously_collected_number, int):
                                 # use "nth" column
@@ -1752,33 +1946,37 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
                         # showing next target happens at end of update_frontmost() now
                         pass
 
+            if levelstate == 'completed':
+                # next level has new asteroids and power-up
+                collisions = self.collision_grid.collisions(self.cursor)
+
             # Check powerup collision
             if self.powerup != None \
-                    and circularspritesoverlap(self.cursor, self.powerup) \
+                    and self.powerup in collisions.powerups \
                     and not self.powerup.active \
                     and not self.powerup.used:
                 # print 'activating powerup:', self.powerup
                 self.powerup.activate(self.cursor, self.asteroids, frame_outbound_triggers)
 
             # Check asteroid collision:
-            for asteroid in self.asteroids:
-                if circularspritesoverlap(self.cursor, asteroid):
-                    # todo: find a cleaner way to have the shield powerup do this work:
-                    if not (self.powerup != None
-                            and isinstance(self.powerup, ShieldPowerup)
-                            and self.powerup.active):
-                        self.sound_death.play()
-                        print('dead', self.cursor.rect.left, self.cursor.rect.top)
-                        self.level_list.level_death(self.level_millis, frame_outbound_triggers)
-                        levelstate = 'dead'
-                        self.screenstack.append(
-                            GameOverOverlayScreen(self.screen, self.screenstack))
-                        frame_outbound_triggers.append('game_death')
-
-                        if self.powerup.active:
-                            self.powerup.deactivate(self.cursor, self.asteroids, frame_outbound_triggers)
-
-                        break
+            for asteroid in collisions.asteroids:
+                # todo: find a cleaner way to have the shield powerup do this work:
+                if not (self.powerup != None
+                        and isinstance(self.powerup, ShieldPowerup)
+                        and self.powerup.active):
+                    self.sound_death.play()
+                    cursor_rect = virtualdisplay.screenrect_from_gamerect(self.cursor.gamerect)
+                    print('dead', cursor_rect.left, cursor_rect.top)
+                    self.level_list.level_death(self.level_millis, frame_outbound_triggers)
+                    levelstate = 'dead'
+                    self.screenstack.append(
+                        GameOverOverlayScreen(self.screen, self.screenstack))
+                    frame_outbound_triggers.append('game_death')
+
+                    if self.powerup.active:
+                        self.powerup.deactivate(self.cursor, self.asteroids, frame_outbound_triggers)
+
+                    break
 
         self.update_status_text()
 
@@ -1827,12 +2025,26 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
             logrowdetails[prefix + 'diameter'] = asteroid.gamediameter
 
         # remove shrunken asteroids
-        self.asteroids = [asteroid for asteroid in self.asteroids if asteroid.gamediameter >= 10]
+        shrunken_asteroids = [asteroid for asteroid in self.asteroids if asteroid.gamediameter < 10]
+        if shrunken_asteroids:
+            self.asteroids = [asteroid for asteroid in self.asteroids if asteroid.gamediameter >= 10]
+            if self.asteroid_field is not None:
+                self.asteroid_field.set_asteroids(self.asteroids)
+            self.rebuild_collision_grid()
+            # still drawn until the next level starts
+            self.shrunken_asteroids.extend(shrunken_asteroids)
 
         self.show_required_targets()
 
         self.overlay.update(millis)
 
+    def rebuild_collision_grid(self):
+        """Make a new collision grid with the current asteroids, targets and power-up"""
+        self.collision_grid = CollisionGrid()
+        self.collision_grid.add_list(self.asteroids, ASTEROID)
+        self.collision_grid.add_list(self.target_list, TARGET, moving=False)
+        self.collision_grid.add(self.powerup, POWERUP)
+
     def show_required_targets(self):
         # show targets if not enough are visible
         visible_target_count = len([t for t in self.target_list if t.active])
@@ -1846,32 +2058,59 @@ class AsteroidImpactInfiniteGameplayScreen(GameScreen):
 
     def after_close(self, logrowdetails, reactionlogger, surveylogger):
         # halt all pending sounds
-        for s in self.mostsprites:
+        for s in self.mostobjects:
             s.stop_audio()
-        for s in self.targetsprites:
-            s.stop_audio()
-        for s in self.powerupsprites:
+        for s in self.targetobjects:
             s.stop_audio()
+        self.powerup.stop_audio()
         for s in self.reaction_prompts:
             s.stop_audio()
+        self.level_list.stop()
 
     def draw(self):
         """draw game to ``self.screen``"""
         self.screen.blit(self.blackbackground, (0, 0))
 
-        self.mostsprites.draw(self.screen)
-        self.targetsprites.draw(self.screen)
-        self.powerupsprites.draw(self.screen)
-        self.reaction_prompts.draw(self.screen)
-
-        if self.game_element_opacity < 255:
-            if self.overlay.visible == 1:
-                self.overlay.draw(self.screen)
-                self.overlay.image.set_alpha(255 - self.game_element_opacity)
-
-        # draw all text blocks:
+        self.draw_sprites()
+
+        self.draw_text()
+
+    def draw_dirty(self):
+        """draw only the changed parts of the game to ``self.screen``, returning changed rectangles"""
+        # erase everything drawn last frame by restoring the background under it
+        previous_drawn_rects = self.drawn_rects
+        for rect in previous_drawn_rects:
+            self.screen.blit(self.blackbackground, rect, rect)
+
+        self.draw_sprites()
+        self.draw_text()
+        return previous_drawn_rects + self.drawn_rects
+
+    def draw_sprites(self):
+        """draw game sprites to ``self.screen`` at game element opacity, and remember where they were drawn"""
+        # sprite images are faded to the game element opacity, so they blend with the background
+        # as if drawn opaque and then partly covered by it
+        mostsprites = self.sprite_views.sync(self.mostobjects)
+        targetsprites = self.sprite_views.sync(self.targetobjects)
+        powerupsprites = self.sprite_views.sync([self.powerup] if self.powerup.imagefile else [])
+        draw_sprites_at_opacity(mostsprites, self.screen, self.game_element_opacity)
+        draw_sprites_at_opacity(targetsprites, self.screen, self.game_element_opacity)
+        draw_sprites_at_opacity(powerupsprites, self.screen, self.game_element_opacity)
+        draw_sprites_at_opacity(self.reaction_prompts, self.screen, self.game_element_opacity)
+
+        screen_rect = self.screen.get_rect()
+        self.drawn_rects = (
+            drawn_sprite_rects(mostsprites, screen_rect)
+            + drawn_sprite_rects(targetsprites, screen_rect)
+            + drawn_sprite_rects(powerupsprites, screen_rect)
+            + drawn_sprite_rects(self.reaction_prompts, screen_rect))
+
+    def draw_text(self):
+        """draw all text blocks to ``self.screen``, and remember where they were drawn"""
+        screen_rect = self.screen.get_rect()
         for textsprite in self.textsprites:
             textsprite.draw(self.screen)
+            self.drawn_rects.append(textsprite.textrect.clip(screen_rect))
 
 
 class ParallelPortTestScreen(GameScreen):
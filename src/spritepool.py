@@ -0,0 +1,74 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Reuse of game objects across levels.
+
+Starting a level, or restarting it after dying, needs a new set of asteroids, crystals
+and power-ups. Instead of constructing new game objects and leaving the old ones to the
+garbage collector, the gameplay screens release the old objects to a pool when they're
+done with them, and acquire objects from the pool for the next level. An acquired
+object is reset in place with the same arguments its constructor takes, so it's in
+the same state as a newly created one.
+
+Pooled classes, such as the gamestate classes, have a ``reset()`` method taking their
+constructor arguments. Pooled pygame sprites are removed from their groups when released.
+"""
+
+# SpritePool for each sprite class
+pools = {}
+
+
+class SpritePool(object):
+    """Released sprites of one class, to reuse instead of creating new sprites"""
+
+    def __init__(self, sprite_class):
+        self.sprite_class = sprite_class
+        self.free = []
+        # sprites created because none were free, and sprites reused
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, *args, **kwargs):
+        """Returns a sprite in the state sprite_class(*args, **kwargs) would be in"""
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args, **kwargs)
+            self.reused += 1
+        else:
+            sprite = self.sprite_class(*args, **kwargs)
+            self.created += 1
+        sprite.pooled = False
+        return sprite
+
+    def release(self, sprite):
+        """Remove sprite from all groups (if it's a pygame sprite) and keep it for reuse"""
+        if getattr(sprite, 'pooled', False):
+            # already released
+            return
+        if hasattr(sprite, 'kill'):
+            sprite.kill()
+        sprite.pooled = True
+        self.free.append(sprite)
+
+
+def acquire(sprite_class, *args, **kwargs):
+    """Returns a sprite_class(*args, **kwargs) sprite, reused from its pool when one is free"""
+    pool = pools.get(sprite_class)
+    if pool is None:
+        pool = pools[sprite_class] = SpritePool(sprite_class)
+    return pool.acquire(*args, **kwargs)
+
+
+def release(sprites):
+    """Release each sprite in list sprites to the pool for its class"""
+    for sprite in sprites:
+        pool = pools.get(type(sprite))
+        if pool is None:
+            pool = pools[type(sprite)] = SpritePool(type(sprite))
+        pool.release(sprite)
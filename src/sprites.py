@@ -8,10 +8,17 @@
 # work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>. 
 """
 AsteroidImpact game sprites including sprite-specific behaviors.
+
+The game objects of the gameplay screens (cursor, crystals, asteroids and power-ups) are
+in gamestate.py, and imported here. They are drawn with GameObjectSprite views.
 """
 
 import pygame
-from resources import load_image, load_sound, NoneSound
+from resources import get_text_cache, load_image, load_sound, NoneSound
+from gamestate import (Cursor, Target, ScoredTarget, Asteroid, BasePowerup, SlowPowerup, ShieldPowerup,
+                       NonePowerup, clamp_range, map_range)
+import audioscheduler
+import gameinput
 import virtualdisplay
 import math
 
@@ -41,461 +48,82 @@ class VirtualGameSprite(pygame.sprite.DirtySprite):
         pygame.sprite.DirtySprite.__init__(self)  # call Sprite initializer
         self.dirty = 2  # always redraw
         self.gamerect = pygame.Rect(0, 0, 1, 1)
+        # updated in place, so it's the same Rect for the life of the sprite
+        self.rect = pygame.Rect(0, 0, 1, 1)
 
     def stop_audio(self):
         # override in derived classes
         pass
 
     def update_rect(self):
-        self.rect = virtualdisplay.screenrect_from_gamerect(self.gamerect)
-
-
-# classes for our game objects
-class Cursor(VirtualGameSprite):
-    """The Player's ship is moved around using the mouse cursor"""
-
-    def __init__(self, game_bounds=virtualdisplay.GAME_PLAY_AREA):
-        VirtualGameSprite.__init__(self)  # call Sprite initializer
-        # find screen diameter
-        self.gamediameter = 32
-        self.gamerect = pygame.Rect(0, 0, self.gamediameter, self.gamediameter)
-        self.game_bounds = game_bounds
-        self.update_rect()
-        self.image = load_image(
-            'cursor.png',
-            (self.rect.width, self.rect.height),
-            convert_alpha=True)
-
-    def update(self, millis):
-        """Move the cursor based on the mouse position"""
-        pos = pygame.mouse.get_pos()
-        game_pos = virtualdisplay.gamepoint_from_screenpoint(pos)
-
-        # if the cursor is outside of the game area, move it back
-        if not self.game_bounds.collidepoint(game_pos):
-            game_pos = (
-                max(
-                    min(game_pos[0], self.game_bounds.right),
-                    self.game_bounds.left),
-                max(
-                    min(game_pos[1], self.game_bounds.bottom),
-                    self.game_bounds.top))
-            pos = virtualdisplay.screenpoint_from_gamepoint(game_pos)
-            pygame.mouse.set_pos(pos)
-
-        self.gamerect.center = game_pos
-        self.update_rect()
-
-
-class Target(VirtualGameSprite):
-    """Targets (Crystals) don't move, but do play a sound when collected"""
-
-    def __init__(self, diameter=32, left=20, top=20):
-        VirtualGameSprite.__init__(self)  # call Sprite initializer
-        self.gamediameter = diameter
-        self.gamerect = pygame.Rect(left, top, diameter, diameter)
-        self.update_rect()
-        self.image = load_image(
-            'crystal.png',
-            (self.rect.width, self.rect.height),
-            convert_alpha=True)
-        self.pickup_sound = load_sound('ring_inventory.wav')
+        virtualdisplay.update_screenrect_inplace(self.gamerect, self.rect)
 
-    def stop_audio(self):
-        self.pickup_sound.stop()
-
-    def pickedup(self):
-        """Play pick up sound"""
-        self.pickup_sound.play()
-
-    def update(self, millis):
-        # hit test done in AsteroidImpactGameplayScreen
-        pass
 
+class GameObjectSprite(VirtualGameSprite):
+    """
+    Sprite view of a gamestate game object. The game object's state is copied to the
+    sprite by sync(), which the screens call just before drawing.
+    """
 
-class ScoredTarget(VirtualGameSprite):
-    """Targets (Crystals) don't move, but do play a sound when collected"""
-
-    def __init__(self,
-                 diameter=32,
-                 left=20,
-                 top=20,
-                 imagefile='crystal.png',
-                 number='x',
-                 # None or milliseconds until crystal disappears on its own:
-                 lifetime_millis_max=None,
-                 play_buzzer_on_negative_score=True):
-        # todo: options for start/fadeout/end times
-        # todo: option for scoring-number
+    def __init__(self, gameobject):
         VirtualGameSprite.__init__(self)  # call Sprite initializer
-        self.gamediameter = diameter
-        self.gamerect = pygame.Rect(left, top, diameter, diameter)
-        self.update_rect()
-        self.image = load_image(
-            imagefile,
-            (self.rect.width, self.rect.height),
-            convert_alpha=True)
-        self.number = number
-        self.visible = 0
-        self.active = False
-        self.pickup_sound = load_sound('ring_inventory.wav')
-        self.pickup_sound_negative = load_sound('prompt_error.wav')
-        self.flashing = False
-        self.flashing_counter = 0
-
-        # max time this crystal remains active
-        self.lifetime_millis_max = lifetime_millis_max
-        # current elapsed millis this crystal has been active
-        self.lifetime_millis_elapsed = 0
-
-        self.play_buzzer_on_negative_score = play_buzzer_on_negative_score
-
-    def activate(self, life_multiplier=1):
-        self.active = True
-        self.visible = 1
-        self.lifetime_millis_elapsed = 0
-        if life_multiplier > 1 and self.lifetime_millis_max != None:
-            # make this one appearance last n times as long by offsetting start of life
-            self.lifetime_millis_elapsed -= int((life_multiplier - 1) * self.lifetime_millis_max)
-        self.flashing = False
-        self.flashing_counter = 0
-
-    def deactivate(self):
-        self.active = False
-        self.visible = 0
-
-    def stop_audio(self):
-        self.pickup_sound.stop()
-        self.pickup_sound_negative.stop()
-
-    def pickedup(self, score=1):
-        """Play pick up sound"""
-        if self.play_buzzer_on_negative_score and score < 0:
-            self.pickup_sound_negative.play()
-        else:
-            self.pickup_sound.play()
-        self.deactivate()
-
-    def update(self, millis):
-        # hit test done in AsteroidImpactGameplayScreen
-        if self.active:
-            self.lifetime_millis_elapsed += millis
-
-            # start flashing before end of self.lifetime_millis_max
-            if (not self.flashing
-                    and self.lifetime_millis_max != None
-                    and self.lifetime_millis_max < self.lifetime_millis_elapsed + 2000):
-                self.flashing = True
-
-            if self.flashing:
-                self.flashing_counter = (self.flashing_counter + 1) % 8
-                self.visible = 1 if self.flashing_counter < 4 else 0
-            elif self.active:
-                self.flashing_counter = 0
-                self.visible = 1
-
-            if self.lifetime_millis_max != None and self.lifetime_millis_elapsed > self.lifetime_millis_max:
-                # deactivate myself
-                self.deactivate()
-
-
-def map_range(value, from_low, from_high, to_low, to_high):
-    'return value in range [from_low, from_high] mapped to range [to_low, to_high]'
-    return to_low + (to_high - to_low) * (value - from_low) / (from_high - from_low)
-
-
-def clamp_range(value, limit_low, limit_high):
-    'return limit_low if value < limit_low, limit_high if value > limit_high, otherwise value'
-    if (value < limit_low): return limit_low
-    if (limit_high < value): return limit_high
-    return value
-
-
-class Asteroid(VirtualGameSprite):
-    """Asteroids move in straight lines, bouncing off the edges of the game play area"""
-
-    def __init__(self, diameter=200, dx=4, dy=10, left=20, top=20, area=None):
-        VirtualGameSprite.__init__(self)  # call Sprite intializer
-        self.gamediameter = diameter
-        self.gamerect = pygame.Rect(left, top, diameter, diameter)
-        self.update_rect()
-        self.image = load_image(
-            'asteroid.png',
-            (self.rect.width, self.rect.height),
-            convert_alpha=True)
+        self.gameobject = gameobject
+        # (imagefile, width, height) of the loaded image
+        self.image_key = None
+        self.image = None
+        self.sync()
 
-        if area:
-            self.GAME_PLAY_AREA = area
-        else:
-            self.GAME_PLAY_AREA = virtualdisplay.GAME_PLAY_AREA
-        # rect uses integer positions but I need to handle fractional pixel/frame speeds.
-        # store float x/y positions here:
-        self.gametopfloat = float(top)
-        self.gameleftfloat = float(left)
-        self.dx = dx
-        self.dy = dy
-        self.speedfactor = 1.0
-        self.gamediameternew_start_diameter = diameter
-        self.gamediameternew_end_diameter = diameter
-        self.gamediameternew_transition_duration_millis = 0
-        self.gamediameternew_transition_remaining_millis = 0
-        self.dxnew = self.dx
-        self.dynew = self.dy
-
-    def copy_from(self, asteroid):
-        self.gamediameter = asteroid.gamediameter
-        self.gamerect = asteroid.gamerect.copy()
+    def sync(self):
+        """Copy position, size, visibility and image of the game object"""
+        self.gamerect = self.gameobject.gamerect
         self.update_rect()
-        self.image = load_image(
-            'asteroid.png',
-            (self.rect.width, self.rect.height),
-            convert_alpha=True)
-        self.GAME_PLAY_AREA = asteroid.GAME_PLAY_AREA
-        self.gametopfloat = asteroid.gametopfloat
-        self.gameleftfloat = asteroid.gameleftfloat
-        self.dx = asteroid.dx
-        self.dy = asteroid.dy
-        self.gamediameternew_start_diameter = asteroid.gamediameter
-        self.gamediameternew_end_diameter = asteroid.gamediameter
-        self.gamediameternew_transition_duration_millis = 0
-        self.gamediameternew_transition_remaining_millis = 0
-        self.dxnew = self.dx
-        self.dynew = self.dy
-
-    def update(self, millis):
-        """Update the position and direction of the Asteroid to move, and bounce"""
-
-        # handle size transition:
-        if (self.gamediameternew_transition_remaining_millis > 0):
-            self.gamediameternew_transition_remaining_millis -= millis
-            if (self.gamediameternew_transition_remaining_millis < 0):
-                self.gamediameternew_transition_remaining_millis = 0
-
-            # Transition diameter
-            newdiameter = int(round(
-                map_range(self.gamediameternew_transition_remaining_millis,
-                          self.gamediameternew_transition_duration_millis,
-                          0,
-                          self.gamediameternew_start_diameter,
-                          self.gamediameternew_end_diameter)))
-
-            center = self.gamerect.center
-            if (newdiameter != self.gamediameter):
-                self.gamediameter = newdiameter
-                self.gamerect.size = (newdiameter, newdiameter)
-                self.gamerect.center = center
-                self.update_rect()
-                # resample image
-                # TODO: is this too slow?
-                # Yep, until the images are cached this is super slow
+        self.sync_image()
+
+    def sync_image(self):
+        """Copy visibility and image of the game object, after rect has been updated"""
+        gameobject = self.gameobject
+        self.visible = gameobject.visible
+        image_key = (gameobject.imagefile, self.rect.width, self.rect.height)
+        if image_key != self.image_key:
+            self.image_key = image_key
+            if gameobject.imagefile:
                 self.image = load_image(
-                    'asteroid.png',
+                    gameobject.imagefile,
                     (self.rect.width, self.rect.height),
-                    convert_alpha=True)
-
-        # when bouncing, change from expected X or Y speed towards
-        # new speed by at most +/-4px/frame
-        adjusted_abs_dx = clamp_range(abs(self.dxnew), max(abs(self.dx) - 4, 1), abs(self.dx) + 4)
-        adjusted_abs_dy = clamp_range(abs(self.dynew), max(abs(self.dy) - 4, 1), abs(self.dy) + 4)
-
-        # bounce by setting sign of x or y speed if off of corresponding side of screen
-        if self.gamerect.left < self.GAME_PLAY_AREA.left:
-            self.dx = adjusted_abs_dx
-        if self.gamerect.right > self.GAME_PLAY_AREA.right:
-            self.dx = -adjusted_abs_dx
-        if self.gamerect.top < self.GAME_PLAY_AREA.top:
-            self.dy = adjusted_abs_dy
-        if self.gamerect.bottom > self.GAME_PLAY_AREA.bottom:
-            self.dy = -adjusted_abs_dy
-
-        self.gameleftfloat += self.dx * self.speedfactor
-        self.gametopfloat += self.dy * self.speedfactor
-        self.gamerect.left = self.gameleftfloat
-        self.gamerect.top = self.gametopfloat
-        self.update_rect()
-
-
-class BasePowerup(VirtualGameSprite):
-    """Base class for power-ups so they share common expiration behavior"""
-
-    def __init__(self, diameter=16, left=50, top=50, maxduration=5.0):
-        VirtualGameSprite.__init__(self)  # call Sprite initializer
-        self.gamediameter = diameter
-        # likely overwritten in derived class:
-        self.gamerect = pygame.Rect(left, top, diameter, diameter)
-        self.update_rect()
-
-        self.maxduration = maxduration  # seconds
-        self.active = False
-        self.duration = 0
-
-        self.used = False
-
-    def update(self, millis, frame_outbound_triggers, cursor, asteroids):
-        """Deactivate power-up if duration has expired"""
-        if self.active:
-            self.duration += millis / 1000.
-
-            if self.duration > self.maxduration:
-                # deactivate:
-                self.deactivate(cursor, asteroids, frame_outbound_triggers)
-
-    def activate(self, cursor, asteroids, frame_outbound_triggers, *args):
-        """Activate power-up because it was picked up"""
-        self.oldgamerect = self.gamerect.copy()
-        self.active = True
-        self.duration = 0
-        self.used = False
-
-    def deactivate(self, cursor, asteroids, frame_outbound_triggers):
-        """Deactivate power-up"""
-        self.active = False
-        self.gamerect = self.oldgamerect
-        self.update_rect()
-        self.used = True
-        self.kill()
-
-
-class SlowPowerup(BasePowerup):
-    """While active, the SlowPowerup slows the asteroids to a crawl"""
-
-    def __init__(self, diameter=32, left=100, top=100):
-        BasePowerup.__init__(self, diameter=diameter, left=left, top=top, maxduration=5.0)
-        self.type = 'slow'
-        self.gamerect = pygame.Rect(left, top, diameter, diameter)
-        self.update_rect()
-        self.image = load_image(
-            'clock.png',
-            (self.rect.width, self.rect.height),
-            convert_alpha=True)
-
-        self.sound_begin = load_sound('slow start.wav')
-        self.sound_end = load_sound('slow end.wav')
-        # these let me start the ending sound to end overlapping when the effect ends:
-        self.sound_end_duration = self.sound_end.get_length() - 0.5
-        self.sound_end_started = False
-
-        self.speedfactor = 0.25
-
-    def stop_audio(self):
-        self.sound_end.stop()
-        self.sound_begin.stop()
-
-    def update(self, millis, frame_outbound_triggers, cursor, asteroids):
-        """ Play effect end sound if due"""
-        BasePowerup.update(self, millis, frame_outbound_triggers, cursor, asteroids)
-
-        if self.active:
-            # start the end effect sound to end when powerup ends:
-            if (self.maxduration - self.duration < self.sound_end_duration
-                    and not self.sound_end_started):
-                self.sound_end_started = True
-                self.sound_end.play()
-            for asteroid in asteroids:
-                asteroid.speedfactor = self.speedfactor
-
-    def activate(self, cursor, asteroids, frame_outbound_triggers, *args):
-        """Play start sound. Slow asteroids to a crawl"""
-        BasePowerup.activate(self, cursor, asteroids, frame_outbound_triggers, *args)
-
-        # adjust speed of asteroids
-        for asteroid in asteroids:
-            asteroid.speedfactor = self.speedfactor
-
-        # disappear offscreen
-        self.gamerect.top = -10000
-        self.gamerect.left = -10000
-        self.update_rect()
-
-        self.sound_begin.play()
-
-        self.sound_end_started = False
-
-        frame_outbound_triggers.append('game_slow_activate')
-
-    def deactivate(self, cursor, asteroids, frame_outbound_triggers, *args):
-        """Restore normal speed of asteroids"""
-        BasePowerup.deactivate(self, cursor, asteroids, frame_outbound_triggers, *args)
-
-        # restore speed of asteroids
-        for asteroid in asteroids:
-            asteroid.speedfactor = 1.0
-
-
-class ShieldPowerup(BasePowerup):
-    """
-    While active, the ShieldPowerup prevents the player from dying due to
-    collisions with asteroids.
-    """
-
-    def __init__(self, diameter=32, left=80, top=80):
-        BasePowerup.__init__(self, diameter=diameter, left=left, top=top, maxduration=5.0)
-        self.type = 'shield'
-        self.gamerect = pygame.Rect(left, top, diameter, diameter)
-        self.update_rect()
-        self.image = load_image(
-            'shield.png',
-            (self.rect.width, self.rect.height),
-            convert_alpha=True)
-        self.image = pygame.transform.smoothscale(
-            self.image, (self.rect.width, self.rect.height))
-
-        self.sound_begin = load_sound('shield start.wav')
-        self.sound_end = load_sound('shield end.wav')
-        # these let me start the ending sound to end overlapping when the effect ends:
-        self.sound_end_duration = self.sound_end.get_length() - 1.0
-        self.sound_end_started = False
-
-    def stop_audio(self):
-        self.sound_begin.stop()
-        self.sound_end.stop()
-
-    def activate(self, cursor, asteroids, frame_outbound_triggers, *args):
-        """Play activation sound"""
-        BasePowerup.activate(self, cursor, asteroids, frame_outbound_triggers, *args)
-
-        self.sound_begin.play()
-
-        self.sound_end_started = False
-
-        frame_outbound_triggers.append('game_shield_activate')
-
-    def update(self, millis, frame_outbound_triggers, cursor, asteroids):
-        """Follow cursor. Play effect end sound if due"""
-        BasePowerup.update(self, millis, frame_outbound_triggers, cursor, asteroids)
-        if self.active:
-            # follow on top of cursor:
-            self.gamerect.center = cursor.gamerect.center
-            self.update_rect()
-
-            # "ignore collisions" logic happens in Game Screen
-
-            # start the end effect sound to end when powerup ends:
-            if (self.maxduration - self.duration < self.sound_end_duration
-                    and not self.sound_end_started):
-                self.sound_end_started = True
-                self.sound_end.play()
+                    convert_alpha=True,
+                    quantize=True)
+            else:
+                self.image = None
+        if self.image is not None:
+            # a quantized image can be smaller, and is drawn centered in the exact rect
+            width, height = self.image.get_size()
+            if width != self.rect.width or height != self.rect.height:
+                self.rect.inflate_ip(width - self.rect.width, height - self.rect.height)
 
 
-class NonePowerup(BasePowerup):
-    """This power-up has no effect except delaying the next power-up from spawning"""
+class SpriteViews(object):
+    """GameObjectSprite views of game objects, made when a game object is first drawn and then reused"""
 
-    def __init__(self, duration=10.0):
-        # configure as a circle completely covering the screen so I get picked up
-        # as soon as available
-        diameter = 10 * virtualdisplay.GAME_PLAY_AREA.width
-        self.gamerect = pygame.Rect(0, 0, diameter, diameter)
-        self.gamerect.centerx = virtualdisplay.GAME_PLAY_AREA.width // 2
-        self.gamerect.centery = virtualdisplay.GAME_PLAY_AREA.height // 2
-        BasePowerup.__init__(
-            self,
-            diameter=diameter,
-            left=self.gamerect.left,
-            top=self.gamerect.top,
-            maxduration=duration)
-        self.type = 'none'
-        self.image = None
-        self.update_rect()
+    def __init__(self):
+        self.views = {}
+
+    def sync(self, gameobjects):
+        """Returns list of synced views of the game objects in list gameobjects"""
+        views = []
+        for gameobject in gameobjects:
+            view = self.views.get(gameobject)
+            if view is None:
+                view = self.views[gameobject] = GameObjectSprite(gameobject)
+            else:
+                view.gamerect = gameobject.gamerect
+            views.append(view)
+        # transform all screen rectangles together
+        virtualdisplay.update_screenrects_inplace(
+            [gameobject.gamerect for gameobject in gameobjects],
+            [view.rect for view in views])
+        for view in views:
+            view.sync_image()
+        return views
 
 
 class ReactionTimePrompt(VirtualGameSprite):
@@ -566,6 +194,12 @@ class ReactionTimePrompt(VirtualGameSprite):
         self.visible = False
         self.total_elapsed = 0
         self.showtime_last = 0  # millis when shown
+        # display flip count when shown, and step millis of the flip that showed it
+        self.onset_flip_count = 0
+        self.onset_millis = None
+        # audioscheduler.Cue of the prompt sound, and step millis the sound was started
+        self.sound_cue = None
+        self.sound_onset_millis = None
         self.step_trigger_count_last = 0
         if input_key.startswith('K_MOUSE'):
             mousebutton_index = 0
@@ -579,7 +213,7 @@ class ReactionTimePrompt(VirtualGameSprite):
                 raise QuitGame('mouse button for input_key for reaction prompt of %s is not recognized' % input_key)
                 raise QuitGame()
 
-            self.dismiss_test = lambda evt: evt.type == pygame.MOUSEBUTTONDOWN and pygame.mouse.get_pressed()[
+            self.dismiss_test = lambda evt: evt.type == pygame.MOUSEBUTTONDOWN and gameinput.get_mouse_pressed()[
                 mousebutton_index]
         else:
             # input_key should correspond to actual key
@@ -599,7 +233,7 @@ class ReactionTimePrompt(VirtualGameSprite):
                 self.active and
                 self.dismiss_test(event))
 
-    def activate_and_show(self):
+    def activate_and_show(self, due_step_millis):
         # prepare for next position:
         self.position_index = (self.position_index + 1) % len(self.position_list)
         left, top = self.position_list[self.position_index]
@@ -609,13 +243,19 @@ class ReactionTimePrompt(VirtualGameSprite):
         self.update_rect()
         self.active = True
         self.visible = True
-        self.prompt_sound.play()
+        self.sound_cue = audioscheduler.play(self.prompt_sound, due_step_millis)
+        self.sound_onset_millis = None
+        # onset is the next display flip
+        self.onset_flip_count = gameinput.display_flip_count
+        self.onset_millis = None
 
     def deactivate_and_hide(self):
         self.gamerect = self.gamerect_hidden
         self.update_rect()
         self.active = False
         self.visible = False
+        if self.sound_cue:
+            self.sound_cue.cancelled = True
 
         # fadeout avoids "click" at end, but I wish I could do shorter duration
         self.prompt_sound.fadeout(100)
@@ -644,18 +284,27 @@ class ReactionTimePrompt(VirtualGameSprite):
                         showtime <= self.total_elapsed):
                     # show
                     self.showtime_last = self.total_elapsed
-                    self.activate_and_show()
+                    self.activate_and_show(logrowdetails['step_millis'] - (self.total_elapsed - showtime))
             if (not self.visible
                     and self.step_trigger_count_last != step_trigger_count
                     and self.showtimes_trigger_counts
                     and step_trigger_count in self.showtimes_trigger_counts):
                 # show
                 self.showtime_last = self.total_elapsed
-                self.activate_and_show()
+                self.activate_and_show(logrowdetails['step_millis'])
         else:
             visible_ms = self.total_elapsed - self.showtime_last
+            if self.onset_millis is None and gameinput.display_flip_count > self.onset_flip_count:
+                # the display has flipped since the prompt was shown
+                self.onset_millis = gameinput.step_millis_at(gameinput.display_flip_ns)
+            if self.sound_onset_millis is None:
+                self.sound_onset_millis = self.sound_cue.onset_millis()
             logrowdetails['reaction_prompt_state'] = 'waiting'
             logrowdetails['reaction_prompt_millis'] = visible_ms
+            if self.onset_millis is not None:
+                logrowdetails['reaction_prompt_onset_millis'] = self.onset_millis
+            if self.sound_onset_millis is not None:
+                logrowdetails['reaction_prompt_sound_onset_millis'] = self.sound_onset_millis
             logrowdetails['reaction_prompt_sound'] = self.sound_name
             logrowdetails['reaction_prompt_image'] = self.image_name
 
@@ -668,6 +317,8 @@ class ReactionTimePrompt(VirtualGameSprite):
                         logrowdetails['reaction_prompt_millis'] = visible_ms
                         logrowdetails['reaction_prompt_passed'] = 'true'
                         logrowdetails['reaction_prompt_pressed_key'] = self.key_from_event(event)
+                        logrowdetails['reaction_prompt_response_millis'] = gameinput.step_millis_at(
+                            event.timestamp_ns)
 
                         if self.stay_visible:
                             # just deactivate, don't hide or stop playing sounds until timeout
@@ -687,6 +338,8 @@ class ReactionTimePrompt(VirtualGameSprite):
                         logrowdetails['reaction_prompt_millis'] = visible_ms
                         logrowdetails['reaction_prompt_passed'] = 'false'
                         logrowdetails['reaction_prompt_pressed_key'] = self.key_from_event(event)
+                        logrowdetails['reaction_prompt_response_millis'] = gameinput.step_millis_at(
+                            event.timestamp_ns)
 
                         if self.stay_visible:
                             # just deactivate, don't hide or stop playing sounds until timeout
@@ -727,6 +380,7 @@ class ReactionTimePrompt(VirtualGameSprite):
 
     def step_end_deactivate(self, logrowdetails, reactionlogger):
         if self.visible:
+            self.sound_cue.cancelled = True
             self.prompt_sound.stop()
             # log timeout_step_end
             visible_ms = self.total_elapsed - self.showtime_last
@@ -734,6 +388,12 @@ class ReactionTimePrompt(VirtualGameSprite):
             logrowdetails['reaction_prompt_image'] = self.image_name
             logrowdetails['reaction_prompt_state'] = 'timeout_step_end'
             logrowdetails['reaction_prompt_millis'] = visible_ms
+            if self.onset_millis is not None:
+                logrowdetails['reaction_prompt_onset_millis'] = self.onset_millis
+            if self.sound_onset_millis is None:
+                self.sound_onset_millis = self.sound_cue.onset_millis()
+            if self.sound_onset_millis is not None:
+                logrowdetails['reaction_prompt_sound_onset_millis'] = self.sound_onset_millis
             self.logme(logrowdetails, reactionlogger)
 
     def logme(self, logrowdetails, reactionlogger):
@@ -833,6 +493,9 @@ class TextSprite(object):
     """
     Sprite-like object for text that helps positioning text in game coordinates, and
     keeping text in position when text changes.
+
+    Text is drawn from a resources.TextCache, so numbers that change every frame are
+    drawn from cached glyphs instead of being rendered again.
     """
 
     def __init__(self, font, text, color, **kwargs):
@@ -844,35 +507,53 @@ class TextSprite(object):
         """
         self.font = font
         self.color = color
+        self.textcache = get_text_cache(font, color)
         self.text = None
-        self.textsurf = None
+        # (surface, x) parts that draw the text, and the size of the text
+        self.textparts = None
+        self.textsize = None
+        # game space keyword arguments of the current position
+        self.position = None
         self.set_position(**kwargs)
         self.set_text(text)
 
     def set_position(self, **kwargs):
+        if kwargs == self.position:
+            # already there
+            return
+        self.position = dict(kwargs)
         for arg in list(kwargs.keys()):
             # convert some args from game coordinate space to screen coordinate space
             if arg == 'x' or arg == 'left' or arg == 'right' or arg == 'centerx':
-                kwargs[arg] = virtualdisplay.screenpoint_from_gamepoint((kwargs[arg], 0))[0]
+                kwargs[arg] = virtualdisplay.screenx_from_gamex(kwargs[arg])
             elif arg == 'y' or arg == 'top' or arg == 'bottom' or arg == 'centery':
-                kwargs[arg] = virtualdisplay.screenpoint_from_gamepoint((0, kwargs[arg]))[1]
+                kwargs[arg] = virtualdisplay.screeny_from_gamey(kwargs[arg])
             else:
                 raise ValueError(
                     "TextSprite() doesn't implement support for rect keword arg '%s'" % arg)
         self.textsurf_get_rect_args = kwargs
-        if self.textsurf:
-            self.textrect = self.textsurf.get_rect(**self.textsurf_get_rect_args)
+        if self.textsize:
+            self.update_textrect()
 
     def set_text(self, text):
         """Set and render new text"""
         if text != self.text:
             self.text = text
-            self.textsurf = self.font.render(self.text, 1, self.color)
-        self.textrect = self.textsurf.get_rect(**self.textsurf_get_rect_args)
+            self.textsize, self.textparts = self.textcache.layout(self.text)
+            # set_position() moves textrect when the text doesn't change
+            self.update_textrect()
+
+    def update_textrect(self):
+        """Position textrect like Surface.get_rect() with the position keyword arguments"""
+        self.textrect = pygame.Rect((0, 0), self.textsize)
+        for arg, value in self.textsurf_get_rect_args.items():
+            setattr(self.textrect, arg, value)
 
     def draw(self, screen):
         """Draw text on screen"""
-        screen.blit(self.textsurf, self.textrect)
+        left, top = self.textrect.topleft
+        for surface, x in self.textparts:
+            screen.blit(surface, (left + x, top))
 
 
 class Overlay(VirtualGameSprite):
@@ -882,6 +563,7 @@ class Overlay(VirtualGameSprite):
             w=virtualdisplay.screenplayarea.width,
             h=virtualdisplay.screenplayarea.height,
             visible=0,
+            image='transparent.png',
             **kwargs_extra):
         # if kwargs_extra: print 'extra arguments:', kwargs_extra
         VirtualGameSprite.__init__(self)  # call Sprite initializer
@@ -0,0 +1,121 @@
+# Asteroid Impact (c) Media Neuroscience Lab, Rene Weber
+# Authored by Nick Winters
+#
+# Asteroid Impact is licensed under a
+# Creative Commons Attribution-ShareAlike 4.0 International License.
+#
+# You should have received a copy of the license along with this
+# work. If not, see <http://creativecommons.org/licenses/by-sa/4.0/>.
+"""
+Serial and parallel port trigger input for Asteroid Impact.
+
+Checking for triggers only once per frame would timestamp a trigger up to a frame
+late, and could miss a parallel port pulse that starts and ends within one frame.
+Instead a TriggerInputThread polls the port about 1000 times per second and records
+the perf_counter_ns() time of each trigger it receives. The game loop collects these
+timestamps every update with get_trigger_timestamps().
+
+The polling thread needs the GIL to read the clock after each poll, and waits for it up
+to the thread switch interval while the main thread updates or draws. While it runs the
+interval is lowered to frametiming.TIMING_SWITCH_INTERVAL (0.5ms), which bounds how late
+a trigger is timestamped, along with the 1ms polling period.
+"""
+
+import collections
+import threading
+import time
+
+from framescheduler import perf_counter
+from frametiming import perf_counter_ns, start_timing_thread, stop_timing_thread
+
+
+class SerialTriggerPoller(object):
+    """Counts trigger bytes received on a serial port"""
+    def __init__(self, serialport, trigger_byte_value):
+        """serialport must be opened with a read timeout of 0"""
+        self.serialport = serialport
+        self.trigger_byte_value = trigger_byte_value
+
+    def poll(self):
+        """Returns the number of trigger bytes received since the previous poll"""
+        count = 0
+        while True:
+            serial_input = self.serialport.read()
+            if not serial_input:
+                return count
+            for c in bytearray(serial_input):
+                if c == self.trigger_byte_value:
+                    count += 1
+
+
+class ParallelTriggerPoller(object):
+    """Counts changes of a parallel port status value from off_value to on_value"""
+    def __init__(self, read_status_value, off_value, on_value):
+        """read_status_value is a function returning the current status value"""
+        self.read_status_value = read_status_value
+        self.off_value = off_value
+        self.on_value = on_value
+        self.prev_status_value = 0xFF  # an impossible value
+
+    def poll(self):
+        """Returns 1 if the status value changed from off to on since the previous poll, otherwise 0"""
+        status_value = self.read_status_value()
+        triggered = self.prev_status_value == self.off_value and status_value == self.on_value
+        self.prev_status_value = status_value
+        return 1 if triggered else 0
+
+
+class TriggerInputThread(object):
+    """
+    Polls a SerialTriggerPoller or ParallelTriggerPoller on a background thread.
+
+    The timestamps of received triggers are handed to the game loop through a
+    collections.deque. Appending and popping from opposite ends of a deque are atomic,
+    so neither thread waits on a lock.
+    """
+    def __init__(self, poller, poll_hz=1000):
+        """Start polling poller poll_hz times per second"""
+        self.poller = poller
+        self.poll_seconds = 1.0 / poll_hz
+        self.timestamps = collections.deque()
+        self.running = True
+        start_timing_thread()
+        self.thread = threading.Thread(target=self.run, name='TriggerInputThread')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def get_trigger_timestamps(self):
+        """Returns perf_counter_ns() times of triggers received since the previous call, oldest first"""
+        timestamps = []
+        while True:
+            try:
+                timestamps.append(self.timestamps.popleft())
+            except IndexError:
+                return timestamps
+
+    def stop(self):
+        """Stop polling"""
+        self.running = False
+        self.thread.join()
+        stop_timing_thread()
+
+    def run(self):
+        """Polling thread: poll and timestamp triggers until stop()"""
+        next_poll = perf_counter()
+        while self.running:
+            poll_ns = perf_counter_ns()
+            try:
+                count = self.poller.poll()
+            except Exception as e:
+                print('Trigger input stopped after error reading port:', e)
+                return
+            for i in range(count):
+                self.timestamps.append(poll_ns)
+
+            next_poll += self.poll_seconds
+            delay = next_poll - perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # fell behind. Poll again right away instead of trying to catch up
+                next_poll = perf_counter()
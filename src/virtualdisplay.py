@@ -86,6 +86,39 @@ def screenrect_from_gamerect(gamerect):
         gamerect.width * s_f_g_w,
         gamerect.height * s_f_g_h)
 
+def update_screenrect_inplace(gamerect, out_rect):
+    """Sets Rect out_rect to the screen space rectangle for the supplied rectangle in
+    game-space, the same as screenrect_from_gamerect() but without making a new Rect.
+    Returns out_rect"""
+    out_rect.update(
+        s_f_g_x + gamerect.x * s_f_g_w,
+        s_f_g_y + gamerect.y * s_f_g_h,
+        gamerect.width * s_f_g_w,
+        gamerect.height * s_f_g_h)
+    return out_rect
+
+def update_screenrects_inplace(gamerects, out_rects):
+    """update_screenrect_inplace() for each game-space rectangle in gamerects and the
+    Rect at the same index in out_rects"""
+    x = s_f_g_x
+    y = s_f_g_y
+    w = s_f_g_w
+    h = s_f_g_h
+    for gamerect, out_rect in zip(gamerects, out_rects):
+        out_rect.update(
+            x + gamerect.x * w,
+            y + gamerect.y * h,
+            gamerect.width * w,
+            gamerect.height * h)
+
+def screenx_from_gamex(gamex):
+    """Returns the screen space x coordinate for x coordinate gamex in game-space"""
+    return s_f_g_x + gamex * s_f_g_w
+
+def screeny_from_gamey(gamey):
+    """Returns the screen space y coordinate for y coordinate gamey in game-space"""
+    return s_f_g_y + gamey * s_f_g_h
+
 def screenpoint_from_gamepoint(gamepoint):
     """Returns the corresponding (transformed) screen space point for the supplied
     point in game-space"""